@@ -0,0 +1,107 @@
+"""
+Runtime of Thompson sampling against the number of bandits.
+
+Every bandit gets a posterior as if it had been shown to 20,000 examples
+at a return between 0.001 and 0.01. For each number of bandits the script
+times the weighted lottery, a full bandit_batch with and without pruning,
+the win probabilities of 20 such simulations in the vectorized runner
+with and without pruning, and a short run of the vectorized runner.
+
+Usage:
+    python -m benchmarks.many_arms [--arms 10 100 1000 10000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from features.algorithms.sampling import candidate_bandits
+from features.algorithms.thompson import ThompsonSampling, ThompsonSamplingRunner
+
+
+def timed(function, repeat: int=3) -> float:
+    """
+    Times a function.
+
+    Args:
+        function: Function without arguments to be timed.
+        repeat: Number of calls, the fastest one is reported.
+    Returns:
+        The fastest wall time in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_test(n_bandits: int, seed: int=0, **kwargs) -> ThompsonSampling:
+    """
+    Builds a ThompsonSampling test whose bandits have already seen 20,000 examples each.
+
+    Args:
+        n_bandits: Number of bandits.
+        seed: Seed of the test.
+        kwargs: Further arguments of ThompsonSampling.
+    Returns:
+        The test.
+    """
+    rng = np.random.default_rng(seed)
+    ts = ThompsonSampling(sample_size=1000, batch_size=50000, seed=seed, **kwargs)
+    examples = 20000
+    for positive_examples in rng.binomial(examples, rng.uniform(0.001, 0.01, n_bandits)):
+        ts.add_bandit(int(positive_examples), examples - int(positive_examples))
+    return ts
+
+
+def vectorized_posteriors(n_bandits: int, simulations: int=20, seed: int=0) -> (np.ndarray, np.ndarray):
+    """
+    Builds the alpha and beta parameters of simulations whose bandits have already seen 20,000 examples each.
+
+    Args:
+        n_bandits: Number of bandits.
+        simulations: Number of simulations.
+        seed: Seed of the draws.
+    Returns:
+        Arrays of shape (simulations, bandits) with the alpha and beta parameters.
+    """
+    rng = np.random.default_rng(seed)
+    examples = 20000
+    positive_examples = rng.binomial(examples, rng.uniform(0.001, 0.01, n_bandits), (simulations, n_bandits))
+    return 1. + positive_examples, 1. + examples - positive_examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arms', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f'{"bandits":>8} {"lottery_us":>11} {"batch_s":>9} {"pruned_batch_s":>15} {"sampled_bandits":>16} '
+          f'{"vectorized_s":>13} {"pruned_vectorized_s":>20} {"runner_s":>9}')
+    for n_bandits in args.arms:
+        ts = make_test(n_bandits)
+        ts.generate_relative_frequencies()
+        lottery = timed(lambda: [ts.weighted_choice() for _ in range(10000)]) / 10000 * 1e6
+        batch = timed(ts.bandit_batch)
+
+        pruned = make_test(n_bandits, prune=1e-4)
+        pruned_batch = timed(pruned.bandit_batch)
+        kept = int(candidate_bandits(pruned.arms['alpha'], pruned.arms['beta'], pruned.prune).sum())
+
+        returns = list(np.linspace(0.001, 0.01, n_bandits))
+        alpha, beta = vectorized_posteriors(n_bandits)
+        vectorized = dict()
+        for prune in (0., 1e-4):
+            runner = ThompsonSamplingRunner(returns, sample_size=1000, simulations=len(alpha), seed=0, prune=prune)
+            vectorized[prune] = timed(lambda: runner.win_probabilities(alpha, beta))
+
+        runner = ThompsonSamplingRunner(returns, sample_size=1000, batch_size=50000, batches=5, simulations=4, seed=0, prune=1e-4)
+        runner_time = timed(runner.run, repeat=1)
+        print(f'{n_bandits:>8} {lottery:>11.2f} {batch:>9.3f} {pruned_batch:>15.3f} {kept:>16} '
+              f'{vectorized[0.]:>13.3f} {vectorized[1e-4]:>20.3f} {runner_time:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Benchmark suite for the runners and hot paths.
+
+Every case is run once to warm up, timed over several repeats without
+tracing, then run once more under tracemalloc to get its peak memory. One JSON object per case is written as a line to
+stdout or to --output, so results of different commits can be compared.
+
+Usage:
+    python -m benchmarks.run [--profile quick|full] [--filter thompson] [--repeats 5] [--output results.jsonl]
+"""
+import argparse
+import functools
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+from features.algorithms.engine import StrategyRunner
+from features.algorithms.split import SplitTestRunner
+from features.algorithms.epsilon import EpsilonGreedyRunner
+from features.algorithms.policies import SoftmaxStrategy, SuccessiveEliminationStrategy, UCB1Strategy
+from features.algorithms.thompson import ThompsonSamplingRunner
+from features.helpers import sample_required
+from features.plotting import stacked_plot
+
+# Parameter grids per profile. Every runner is benchmarked for every
+# combination of arms, batch size and simulations.
+PROFILES = {
+    'quick': {
+        'arms': [2, 5, 20],
+        'batch_size': [1000, 5000],
+        'simulations': [10, 100],
+        'batches': 20,
+        'repeats': 5,
+    },
+    'full': {
+        'arms': [2, 5, 20, 100],
+        'batch_size': [1000, 5000, 50000],
+        'simulations': [10, 100, 1000],
+        'batches': 100,
+        'repeats': 3,
+    },
+}
+
+RUNNERS = {
+    'split': SplitTestRunner,
+    'epsilon': EpsilonGreedyRunner,
+    'thompson': ThompsonSamplingRunner,
+    'ucb1': functools.partial(StrategyRunner, strategy=UCB1Strategy()),
+    'softmax': functools.partial(StrategyRunner, strategy=SoftmaxStrategy()),
+    'elimination': functools.partial(StrategyRunner, strategy=SuccessiveEliminationStrategy()),
+}
+
+
+def returns_for(arms: int) -> List[float]:
+    """
+    Builds evenly spaced returns between 0.001 and 0.01.
+
+    Args:
+        arms: Number of bandits.
+    Returns:
+        List of average returns per bandit.
+    """
+    return list(np.linspace(0.001, 0.01, arms))
+
+
+def cases(profile: Dict) -> Iterator[Tuple[str, Dict, Callable, int]]:
+    """
+    Generates the benchmark cases of a profile.
+
+    Args:
+        profile: One of PROFILES.
+    Returns:
+        Iterator over (name, parameters, function, simulated examples) tuples.
+    """
+    batches = profile['batches']
+    for name, runner_class in RUNNERS.items():
+        for arms, batch_size, simulations in itertools.product(profile['arms'], profile['batch_size'], profile['simulations']):
+            parameters = {'arms': arms, 'batch_size': batch_size, 'simulations': simulations, 'batches': batches}
+
+            def run(runner_class=runner_class, parameters=parameters):
+                runner_class(returns_for(parameters['arms']),
+                             batch_size=parameters['batch_size'],
+                             batches=parameters['batches'],
+                             simulations=parameters['simulations'],
+                             seed=0).run()
+
+            yield name, parameters, run, batch_size * batches * simulations
+
+    for p1, p2, alpha in [(0.01, 0.02, 0.01), (0.004, 0.0042, 0.002)]:
+        def required(p1=p1, p2=p2, alpha=alpha):
+            sample_required.cache_clear()
+            sample_required(p1, p2, alpha)
+
+        yield 'sample_required', {'p1': p1, 'p2': p2, 'alpha': alpha}, required, 0
+
+    for arms, batches in itertools.product(profile['arms'], [batches, 10 * batches]):
+        df = pd.DataFrame(np.random.default_rng(0).integers(1, 1000, (batches, arms)).cumsum(axis=0))
+
+        def plot(df=df):
+            stacked_plot(df, title='', x_label='', y_label='')
+            plt.close('all')
+
+        yield 'stacked_plot', {'arms': arms, 'batches': batches}, plot, 0
+
+
+def measure(function: Callable, memory: bool=True, repeats: int=5) -> Dict:
+    """
+    Measures the wall time and the peak traced memory of a function. The
+    function is called once to warm up caches and lazy imports, then timed
+    repeats times.
+
+    Args:
+        function: Function without arguments.
+        memory: Whether to run the function once more to trace its memory.
+        repeats: Number of timed calls.
+    Returns:
+        Dictionary with the fastest and the median wall time in seconds, the
+        number of timed calls and the peak memory in bytes.
+    """
+    function()
+    wall_times = timeit.repeat(function, number=1, repeat=repeats)
+
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'wall_time_s': min(wall_times), 'median_wall_time_s': statistics.median(wall_times), 'repeats': repeats,
+            'peak_memory_bytes': peak_memory}
+
+
+def environment() -> Dict:
+    """
+    Collects the information needed to compare results of different runs.
+
+    Returns:
+        Dictionary with the git commit, Python and NumPy versions and the machine.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick')
+    parser.add_argument('--filter', default=None, help='Only run benchmarks whose name contains this string.')
+    parser.add_argument('--output', default=None, help='File the JSON lines are appended to, stdout if not set.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory.')
+    parser.add_argument('--repeats', type=int, default=None, help='Number of timed calls per case, the profile\'s number if not set.')
+    args = parser.parse_args()
+
+    output = open(args.output, 'a') if args.output else sys.stdout
+    info = environment()
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    try:
+        for name, parameters, function, examples in cases(PROFILES[args.profile]):
+            if args.filter and args.filter not in name:
+                continue
+            result = measure(function, memory=not args.no_memory, repeats=args.repeats or PROFILES[args.profile]['repeats'])
+            record = {
+                'benchmark': name,
+                'parameters': parameters,
+                **result,
+                'examples_per_s': examples / result['wall_time_s'] if examples else None,
+                'timestamp': timestamp,
+                **info,
+            }
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+import math
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from features.algorithms.results import BatchResult
+
+
+def resize_rows(array: np.ndarray, rows: int, fill) -> np.ndarray:
+    """
+    Gets a copy of an array with a different number of rows, cut off or
+    padded with fill.
+    """
+    resized = np.full((rows,) + array.shape[1:], fill, dtype=array.dtype)
+    kept = min(rows, len(array))
+    resized[:kept] = array[:kept]
+    return resized
+
+
+class QuantileSketch:
+    """
+    Mergeable fixed-memory sketch of the distribution of values in every
+    cell of an array, with logarithmically spaced buckets in the style of
+    DDSketch. Quantiles have a relative error of at most relative_accuracy
+    for values between min_value and max_value. Values below min_value
+    count as zero, values above max_value as max_value.
+
+    Attributes:
+        min_value: Smallest value that is told apart from zero.
+        gamma: Ratio of the bounds of a bucket.
+        counts: Array of shape (*shape, buckets) with the number of values per bucket.
+
+    Methods:
+        add: Adds an array of values per cell of a row.
+        merge: Adds the values of another sketch with the same buckets.
+        resize: Changes the number of rows, keeping the values of the remaining ones.
+        quantile: Gets the q-quantile of every cell.
+        cdf: Gets the fraction of values of every cell at or below a value.
+    """
+
+    def __init__(self, shape: tuple, relative_accuracy: float=0.01, min_value: float=1e-4, max_value: float=1.):
+        """
+        Initializes a new empty QuantileSketch.
+
+        Args:
+            shape: Shape of the cells, e.g. (batches, bandits).
+            relative_accuracy: Relative error of the quantiles.
+            min_value: Smallest value that is told apart from zero.
+            max_value: Largest value that is told apart from larger ones.
+        """
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        buckets = 2 + math.ceil(math.log(max_value / min_value) / math.log(self.gamma))
+        self.counts = np.zeros(tuple(shape) + (buckets,), dtype=np.int64)
+
+    def buckets(self, values: np.ndarray) -> np.ndarray:
+        """
+        Gets the bucket of every value. Bucket 0 holds zero, bucket k > 0
+        the values in (min_value gamma^(k-2), min_value gamma^(k-1)].
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = np.ceil(np.log(values / self.min_value) / math.log(self.gamma))
+        buckets = np.where(values < self.min_value, 0, np.nan_to_num(k, nan=0.) + 1)
+        return np.clip(buckets, 0, self.counts.shape[-1] - 1).astype(np.int64)
+
+    def add(self, row: int, values: np.ndarray):
+        """
+        Adds values to the cells of a row.
+
+        Args:
+            row: Index of the row, e.g. the batch.
+            values: Array of shape (n, *cells) with n values per cell of the row.
+        """
+        cells = int(np.prod(values.shape[1:]))
+        n_buckets = self.counts.shape[-1]
+        # Offset the buckets of each cell so one bincount counts all of them.
+        flat = self.buckets(values).reshape(len(values), cells) + n_buckets * np.arange(cells)
+        self.counts[row] += np.bincount(flat.ravel(), minlength=cells * n_buckets).reshape(self.counts.shape[1:])
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        Adds the values of another sketch with the same buckets.
+        """
+        self.counts += other.counts
+
+    def resize(self, rows: int):
+        """
+        Changes the number of rows, keeping the values of the remaining ones.
+        """
+        self.counts = resize_rows(self.counts, rows, 0)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """
+        Gets the q-quantile of every cell.
+
+        Args:
+            q: Quantile between 0 and 1.
+        Returns:
+            Array with the estimated quantile per cell, nan for empty cells.
+        """
+        cumulative = self.counts.cumsum(axis=-1)
+        total = cumulative[..., -1]
+        rank = q * (total - 1)
+        bucket = (cumulative > rank[..., None]).argmax(axis=-1)
+        values = np.where(bucket == 0, 0., self.min_value * self.gamma ** (bucket - 1) * 2 / (1 + self.gamma))
+        return np.where(total > 0, values, np.nan)
+
+    def cdf(self, value: float) -> np.ndarray:
+        """
+        Gets the fraction of values of every cell at or below a value,
+        up to the resolution of the buckets.
+
+        Args:
+            value: Value to compare with.
+        Returns:
+            Array with the fraction per cell, nan for empty cells.
+        """
+        bucket = int(self.buckets(np.asarray(value, dtype=np.float64)))
+        total = self.counts.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, self.counts[..., :bucket + 1].sum(axis=-1) / total, np.nan)
+
+
+class StreamingStatistics:
+    """
+    Count, mean, variance, minimum, maximum and quantile sketch of the
+    values in every cell of an array, accumulated a block of values at a
+    time without keeping the values. Means and variances are combined
+    with Chan's parallel form of Welford's algorithm, so accumulators of
+    shards can be merged exactly.
+
+    Attributes:
+        count: Number of values per cell.
+        means: Mean per cell.
+        m2: Sum of squared deviations from the mean per cell.
+        minimum: Minimum per cell.
+        maximum: Maximum per cell.
+        sketch: QuantileSketch of the values.
+
+    Methods:
+        add: Adds a block of values to the cells of a row.
+        merge: Adds the values of another accumulator.
+        resize: Changes the number of rows, keeping the values of the remaining ones.
+        mean: Gets the mean per cell.
+        variance: Gets the sample variance per cell.
+        quantile: Gets the q-quantile per cell.
+    """
+
+    def __init__(self, shape: tuple, relative_accuracy: float=0.01, min_value: float=1e-4, max_value: float=1.):
+        """
+        Initializes new empty StreamingStatistics.
+
+        Args:
+            shape: Shape of the cells, e.g. (batches, bandits).
+            relative_accuracy: Relative error of the quantiles.
+            min_value: Smallest value the quantiles tell apart from zero.
+            max_value: Largest value the quantiles tell apart from larger ones.
+        """
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.means = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.minimum = np.full(shape, np.inf)
+        self.maximum = np.full(shape, -np.inf)
+        self.sketch = QuantileSketch(shape, relative_accuracy, min_value, max_value)
+
+    def combine(self, index, count: np.ndarray, means: np.ndarray, m2: np.ndarray):
+        """
+        Combines the moments of a block of values into the cells at index.
+        """
+        total = self.count[index] + count
+        delta = means - self.means[index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(total > 0, count / total, 0.)
+        self.m2[index] += m2 + delta ** 2 * self.count[index] * share
+        self.means[index] += delta * share
+        self.count[index] = total
+
+    def add(self, row: int, values: np.ndarray):
+        """
+        Adds a block of values to the cells of a row.
+
+        Args:
+            row: Index of the row, e.g. the batch.
+            values: Array of shape (n, *cells) with n values per cell of the row.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        means = values.mean(axis=0)
+        self.combine(row, len(values), means, ((values - means) ** 2).sum(axis=0))
+        self.minimum[row] = np.minimum(self.minimum[row], values.min(axis=0))
+        self.maximum[row] = np.maximum(self.maximum[row], values.max(axis=0))
+        self.sketch.add(row, values)
+
+    def merge(self, other: 'StreamingStatistics'):
+        """
+        Adds the values of another accumulator of the same shape.
+        """
+        self.combine(slice(None), other.count, other.means, other.m2)
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+    def resize(self, rows: int):
+        """
+        Changes the number of rows, keeping the values of the remaining ones.
+        """
+        self.count = resize_rows(self.count, rows, 0)
+        self.means = resize_rows(self.means, rows, 0.)
+        self.m2 = resize_rows(self.m2, rows, 0.)
+        self.minimum = resize_rows(self.minimum, rows, np.inf)
+        self.maximum = resize_rows(self.maximum, rows, -np.inf)
+        self.sketch.resize(rows)
+
+    def mean(self) -> np.ndarray:
+        """
+        Gets the mean per cell, nan for empty cells.
+        """
+        return np.where(self.count > 0, self.means, np.nan)
+
+    def variance(self) -> np.ndarray:
+        """
+        Gets the sample variance per cell, nan for cells with less than two values.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """
+        Gets the q-quantile per cell, kept within the observed minimum and maximum.
+        """
+        return np.clip(self.sketch.quantile(q), self.minimum, self.maximum)
+
+
+class RunStatistics:
+    """
+    Distribution across simulations of the results of every batch and
+    bandit of a run: the share of examples each bandit got so far
+    ('allocation') and its cumulative positive examples ('clicks').
+
+    Attributes:
+        bandit_returns: List of average returns per bandit, used as column names.
+        accumulators: Dictionary with the StreamingStatistics of each quantity.
+
+    Methods:
+        add: Adds the results of a batch.
+        merge: Adds the results of another RunStatistics, e.g. of a shard.
+        resize: Changes the number of batches.
+        frame: Gets a statistic of a quantity as a DataFrame.
+    """
+
+    def __init__(self, bandit_returns: List[float], batches: int, batch_size: int, relative_accuracy: float=0.01):
+        """
+        Initializes new empty RunStatistics.
+
+        Args:
+            bandit_returns: List of average returns per bandit.
+            batches: Number of batches.
+            batch_size: Number of examples per batch.
+            relative_accuracy: Relative error of the quantiles.
+        """
+        self.bandit_returns = bandit_returns
+        shape = (batches, len(bandit_returns))
+        self.accumulators = {
+            'allocation': StreamingStatistics(shape, relative_accuracy, min_value=1e-4, max_value=1.),
+            'clicks': StreamingStatistics(shape, relative_accuracy, min_value=1., max_value=max(1., batches * batch_size)),
+        }
+
+    def add(self, result: BatchResult, batch: int=None):
+        """
+        Adds the results of a batch for every simulation.
+
+        Args:
+            result: Results of the batch.
+            batch: Batch the results are added to. If None, the batch of the result.
+        """
+        batch = result.batch if batch is None else batch
+        examples = result.total_bids.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            allocation = np.where(examples > 0, result.total_bids / examples, 0.)
+        self.accumulators['allocation'].add(batch, allocation)
+        self.accumulators['clicks'].add(batch, result.total_clicks)
+
+    def merge(self, other: 'RunStatistics'):
+        """
+        Adds the results of another RunStatistics of the same shape.
+        """
+        for name, accumulator in self.accumulators.items():
+            accumulator.merge(other.accumulators[name])
+
+    def resize(self, batches: int):
+        """
+        Changes the number of batches, keeping the results of the remaining ones.
+        """
+        for accumulator in self.accumulators.values():
+            accumulator.resize(batches)
+
+    def frame(self, quantity: str='allocation', statistic: Union[str, float]='mean') -> pd.DataFrame:
+        """
+        Gets a statistic of a quantity per batch and bandit.
+
+        Args:
+            quantity: Either 'allocation' or 'clicks'.
+            statistic: One of 'mean', 'variance', 'std', 'min' and 'max', or a
+                quantile between 0 and 1.
+        Returns:
+            DataFrame with a row per batch and a column per bandit.
+        """
+        accumulator = self.accumulators[quantity]
+        if isinstance(statistic, str):
+            values = {'mean': accumulator.mean,
+                      'variance': accumulator.variance,
+                      'std': lambda: np.sqrt(accumulator.variance()),
+                      'min': lambda: accumulator.minimum,
+                      'max': lambda: accumulator.maximum}[statistic]()
+        else:
+            values = accumulator.quantile(statistic)
+        return pd.DataFrame(values, columns=self.bandit_returns)
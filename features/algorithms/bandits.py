@@ -2,10 +2,14 @@ import math
 
 import numpy as np
 
+from features.algorithms.schedules import Forgetting
+
 
 class BetaBandit:
     """
-    Bandit class that is used in Thompson sampling.
+    Bandit class of Thompson sampling. ThompsonSampling keeps its bandits
+    column-wise in an ArmTable, BetaBandit is kept as public API for
+    working with a single posterior.
 
     Attributes:
         alpha: Alpha parameter of the beta distribution (number of positive examples).
@@ -15,6 +19,8 @@ class BetaBandit:
         update: Updates alpha and beta priors of the BetaBandit.
         sample: Samples the BetaBandit's distribution n times.
     """
+    __slots__ = ('alpha', 'beta')
+
     def __init__(self, alpha: int=0, beta: int=0, alpha_prior: float=1., beta_prior: float=1.):
         """
         Initializes new BetaBandit with passed parameters.
@@ -39,22 +45,94 @@ class BetaBandit:
         self.alpha += positive_examples
         self.beta += negative_examples
     
-    def sample(self, n: int) -> np.ndarray:
+    def sample(self, n: int, rng: np.random.Generator=None) -> np.ndarray:
         """
         Samples the BetaBandit's distribution n times.
 
         Args:
             n: Sample size.
+            rng: Random number generator to sample with, e.g. the one of the run,
+                so that seeded runs are reproducible. If None, a new unseeded one is used.
         Returns:
             An array filled with n examples sampled
             from the BetaBandit's distribution.
         """
-        return np.random.beta(self.alpha, self.beta, n)
+        if rng is None:
+            rng = np.random.default_rng()
+        return rng.beta(self.alpha, self.beta, n)
+
+
+class DiscountedBetaBandit(BetaBandit):
+    """
+    BetaBandit that forgets old examples: before every update the examples
+    seen so far are multiplied by discount, so the posterior follows
+    returns that drift over time.
+
+    Attributes:
+        alpha_prior: The prior for alpha parameter.
+        beta_prior: The prior for beta parameter.
+        forgetting: Forgetting with the examples of the bandit.
+    """
+    __slots__ = ('alpha_prior', 'beta_prior', 'forgetting')
+
+    def __init__(self, alpha: int=0, beta: int=0, alpha_prior: float=1., beta_prior: float=1., discount: float=0.95,
+                 window: int=None):
+        """
+        Initializes a new DiscountedBetaBandit.
+
+        Args:
+            alpha: Alpha parameter of the beta distribution (number of positive examples).
+            beta: Beta parameter of the beta distribution (number of negative examples).
+            alpha_prior: The prior for alpha parameter.
+            beta_prior: The prior for beta parameter.
+            discount: Factor the examples are multiplied by before every update.
+            window: If set, only the examples of the last window updates are kept.
+        """
+        super().__init__(alpha, beta, alpha_prior, beta_prior)
+        self.alpha_prior = alpha_prior
+        self.beta_prior = beta_prior
+        self.forgetting = Forgetting(discount, window, alpha=(), beta=())
+        self.forgetting.evidence['alpha'] += alpha
+        self.forgetting.evidence['beta'] += beta
+
+    def update(self, positive_examples: int=0, negative_examples: int=0):
+        """
+        Forgets old examples and adds the new ones.
+
+        Args:
+            positive_examples: Number of positive examples.
+            negative_examples: Number of negative examples.
+        """
+        evidence = self.forgetting.step(alpha=positive_examples, beta=negative_examples)
+        self.alpha = self.alpha_prior + float(evidence['alpha'])
+        self.beta = self.beta_prior + float(evidence['beta'])
+
+
+class SlidingWindowBetaBandit(DiscountedBetaBandit):
+    """
+    BetaBandit that only keeps the examples of its last window updates.
+    """
+    __slots__ = ()
+
+    def __init__(self, alpha: int=0, beta: int=0, alpha_prior: float=1., beta_prior: float=1., window: int=10):
+        """
+        Initializes a new SlidingWindowBetaBandit.
+
+        Args:
+            alpha: Alpha parameter of the beta distribution (number of positive examples).
+            beta: Beta parameter of the beta distribution (number of negative examples).
+            alpha_prior: The prior for alpha parameter.
+            beta_prior: The prior for beta parameter.
+            window: Number of most recent updates that are kept.
+        """
+        super().__init__(alpha, beta, alpha_prior, beta_prior, discount=1., window=window)
 
 
 class EpsilonBandit:
     """
-    Bandit class that is used in Epsilon-greedy multi-armed bandits.
+    Bandit class of Epsilon-greedy multi-armed bandits. EpsilonGreedy keeps
+    its bandits column-wise in an ArmTable, EpsilonBandit is kept as public
+    API for working with a single bandit.
 
     Attributes:
         positive_examples: Number of positive examples.
@@ -63,6 +141,8 @@ class EpsilonBandit:
         update: Updates the number of positive examples of the EpsilonBandit.
         get_value: Gets the number of positive examples of the EpsilonBandit.
     """
+    __slots__ = ('positive_examples',)
+
     def __init__(self, positive_examples: int=0):
         """
         Initializes a new EpsilonBandit and sets its positive examples.
@@ -89,3 +169,124 @@ class EpsilonBandit:
             The number of positive examples of the EpsilonBandit.
         """
         return self.positive_examples
+
+
+class DiscountedEpsilonBandit(EpsilonBandit):
+    """
+    EpsilonBandit that forgets old examples: before every update the
+    positive examples seen so far are multiplied by discount.
+
+    Attributes:
+        forgetting: Forgetting with the positive examples of the bandit.
+    """
+    __slots__ = ('forgetting',)
+
+    def __init__(self, positive_examples: float=0, discount: float=0.95, window: int=None):
+        """
+        Initializes a new DiscountedEpsilonBandit.
+
+        Args:
+            positive_examples: Number of positive examples.
+            discount: Factor the positive examples are multiplied by before every update.
+            window: If set, only the positive examples of the last window updates are kept.
+        """
+        super().__init__(positive_examples)
+        self.forgetting = Forgetting(discount, window, positive_examples=())
+        self.forgetting.evidence['positive_examples'] += positive_examples
+
+    def update(self, positive_examples: int=0):
+        """
+        Forgets old positive examples and adds the new ones.
+
+        Args:
+            positive_examples: Number of positive examples.
+        """
+        self.positive_examples = float(self.forgetting.step(positive_examples=positive_examples)['positive_examples'])
+
+
+class SlidingWindowEpsilonBandit(DiscountedEpsilonBandit):
+    """
+    EpsilonBandit that only keeps the positive examples of its last window updates.
+    """
+    __slots__ = ()
+
+    def __init__(self, positive_examples: int=0, window: int=10):
+        """
+        Initializes a new SlidingWindowEpsilonBandit.
+
+        Args:
+            positive_examples: Number of positive examples.
+            window: Number of most recent updates that are kept.
+        """
+        super().__init__(positive_examples, discount=1., window=window)
+
+
+class ArmTable:
+    """
+    State of a set of bandits stored column-wise in contiguous NumPy arrays,
+    one array per field, so that all bandits can be read and updated at once.
+
+    Attributes:
+        fields: Names of the fields.
+        size: Number of bandits in the table.
+
+    Methods:
+        append: Adds a new bandit to the table.
+        update: Adds values to the fields of the bandit at index idx.
+    """
+    __slots__ = ('fields', 'size', 'columns')
+
+    def __init__(self, capacity: int=16, **fields: np.dtype):
+        """
+        Initializes a new empty ArmTable.
+
+        Args:
+            capacity: Number of bandits space is reserved for. The table grows as needed.
+            fields: Names of the fields and their dtypes.
+        """
+        self.fields = tuple(fields)
+        self.size = 0
+        self.columns = {name: np.zeros(max(1, capacity), dtype=dtype) for name, dtype in fields.items()}
+
+    def __len__(self) -> int:
+        """
+        Returns the number of bandits in the table.
+        """
+        return self.size
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """
+        Gets the values of a field for all bandits as a view that can be updated in place.
+        """
+        return self.columns[field][:self.size]
+
+    def append(self, **values) -> int:
+        """
+        Adds a new bandit to the table.
+
+        Args:
+            values: Values of the fields, missing fields are zero.
+        Returns:
+            The index of the new bandit.
+        """
+        capacity = len(self.columns[self.fields[0]])
+        if self.size == capacity:
+            for name, column in self.columns.items():
+                grown = np.zeros(2 * capacity, dtype=column.dtype)
+                grown[:capacity] = column
+                self.columns[name] = grown
+        for name, value in values.items():
+            self.columns[name][self.size] = value
+        self.size += 1
+        return self.size - 1
+
+    def update(self, idx: int, **values):
+        """
+        Adds values to the fields of the bandit at index idx.
+
+        Args:
+            idx: Index of the bandit to be updated.
+            values: Values to add per field.
+        """
+        for name, value in values.items():
+            self.columns[name][idx] += value
@@ -0,0 +1,84 @@
+from typing import Sequence
+
+import numpy as np
+
+
+def geometric_delays(mean: float, max_delay: int) -> np.ndarray:
+    """
+    Gets the distribution of a geometric delay, truncated at max_delay
+    batches. The probability of the truncated tail is added to max_delay.
+
+    Args:
+        mean: Mean delay in batches of the untruncated distribution.
+        max_delay: Largest delay in batches.
+    Returns:
+        Array with the probability of a delay of 0 to max_delay batches.
+    """
+    p = 1. / (1. + mean)
+    delays = p * (1. - p) ** np.arange(max_delay + 1)
+    delays[-1] += 1. - delays.sum()
+    return delays
+
+
+class DelayedFeedback:
+    """
+    Positive examples of (simulations, bandits) arrays that are only
+    reported some batches after the examples were made. Pending positive
+    examples are kept in a ring buffer with one slot per possible delay,
+    so adding and releasing a batch costs one multinomial draw and one
+    slot, however many examples are pending.
+
+    Attributes:
+        delays: Probability of a delay of 0, 1, ... batches.
+        pending: Ring buffer of shape (len(delays), simulations, bandits) with the pending positive examples.
+        position: Slot of the ring buffer that is released next.
+
+    Methods:
+        add: Schedules the positive examples of a batch.
+        release: Gets the positive examples that are reported in the current batch.
+    """
+
+    def __init__(self, delays: Sequence[float], shape: tuple):
+        """
+        Initializes a new DelayedFeedback without pending positive examples.
+
+        Args:
+            delays: Probability of a delay of 0, 1, ... batches, e.g. from geometric_delays.
+            shape: Shape of the arrays of positive examples.
+        """
+        delays = np.asarray(delays, dtype=np.float64)
+        if delays.ndim != 1 or len(delays) == 0 or (delays < 0).any() or not np.isclose(delays.sum(), 1.):
+            raise ValueError(f'delays must be a probability distribution, got {delays}.')
+        self.delays = delays / delays.sum()
+        self.pending = np.zeros((len(delays),) + tuple(shape), dtype=np.int64)
+        self.position = 0
+
+    def add(self, positive_examples: np.ndarray, rng: np.random.Generator):
+        """
+        Schedules the positive examples of a batch: each of them is
+        reported after a delay drawn from delays.
+
+        Args:
+            positive_examples: Positive examples of the batch.
+            rng: Random number generator to draw the delays with.
+        """
+        if len(self.delays) == 1:
+            self.pending[self.position] += positive_examples
+            return
+        # One multinomial draw splits every count over the delays, last axis is the delay.
+        split = rng.multinomial(positive_examples, self.delays)
+        slots = (self.position + np.arange(len(self.delays))) % len(self.delays)
+        self.pending[slots] += np.moveaxis(split, -1, 0)
+
+    def release(self) -> np.ndarray:
+        """
+        Gets the positive examples that are reported in the current batch
+        and moves on to the next batch.
+
+        Returns:
+            Array with the reported positive examples.
+        """
+        released = self.pending[self.position].copy()
+        self.pending[self.position] = 0
+        self.position = (self.position + 1) % len(self.delays)
+        return released
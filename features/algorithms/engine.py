@@ -0,0 +1,452 @@
+from typing import Callable, Iterator, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from features.algorithms.accumulators import RunStatistics
+from features.algorithms.delay import DelayedFeedback
+from features.algorithms.outcomes import BinomialOutcomes, CommonOutcomes
+from features.algorithms.results import BatchResult
+from features.algorithms.schedules import ReturnSchedule
+from features.algorithms.stopping import StoppingRule
+from features.checkpoint import RunState, grow_batches, load_checkpoint, save_checkpoint
+from features.instrumentation import Instrument, NULL_INSTRUMENT
+
+# Upper bound on the number of draws held in memory at once by the vectorized
+# runners. 2**24 int64 or float64 values take 128 MB.
+MAX_CHUNK_ELEMENTS = 2**24
+
+
+class Strategy:
+    """
+    Allocation policy run by a StrategyRunner. Every batch, the strategy
+    gets the arrays of all simulations at once and returns how many examples
+    each bandit gets in each of them, then it is updated with the positive
+    examples those examples made.
+
+    A strategy only holds its configuration. Everything that changes during
+    a run is kept in the run's RunState, which is what lets the runner shard,
+    checkpoint and resume any strategy. The runner is passed to every method
+    for its rng, instrument, batch_size and n_bandits.
+
+    Attributes:
+        stages: Number of allocations per batch. The positive examples of a stage
+            are drawn before the next stage is allocated, e.g. Epsilon-greedy explores
+            and then exploits in the same batch.
+
+    Methods:
+        start: Adds the strategy's arrays to the state of a new run.
+        allocate: Gets the examples per bandit of the active simulations.
+        update: Updates the strategy's arrays with the results of a stage.
+        report: Gets the best bandit and win probabilities of every simulation, if the strategy has them.
+        sequential: Checks whether the simulations can also be run one after another.
+        sequential_test: Creates the test that runs one simulation of a sequential run.
+        sequential_batch: Runs one batch of one simulation of a sequential run.
+    """
+    stages = 1
+
+    def __repr__(self):
+        parameters = ', '.join(f'{name}={value!r}' for name, value in vars(self).items())
+        return f'{type(self).__name__}({parameters})'
+
+    def start(self, runner: 'StrategyRunner', state: RunState):
+        """
+        Adds the strategy's arrays to the state of a new run. The state already
+        holds total_examples, positive_examples, stopped and delayed.
+
+        Args:
+            runner: Runner of the run.
+            state: RunState of the new run.
+        """
+        pass
+
+    def allocate(self, runner: 'StrategyRunner', state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Gets the examples per bandit of the active simulations.
+
+        Args:
+            runner: Runner of the run.
+            state: RunState of the run.
+            batch: Index of the batch.
+            stage: Index of the stage within the batch.
+            active: Indices of the simulations that have not stopped.
+        Returns:
+            Integer array of shape (len(active), bandits) with the examples per bandit.
+        """
+        raise NotImplementedError
+
+    def update(self, runner: 'StrategyRunner', state: RunState, batch: int, stage: int, examples: np.ndarray, positives: np.ndarray):
+        """
+        Updates the strategy's arrays with the results of a stage. The totals
+        of the state already include them.
+
+        Args:
+            runner: Runner of the run.
+            state: RunState of the run.
+            batch: Index of the batch.
+            stage: Index of the stage within the batch.
+            examples: Array of shape (simulations, bandits) with the examples of the stage.
+            positives: Array of shape (simulations, bandits) with the positive examples of the stage.
+        """
+        pass
+
+    def report(self, runner: 'StrategyRunner', state: RunState) -> (np.ndarray, np.ndarray):
+        """
+        Gets the bandit every simulation considers best and the probability of
+        each bandit being the best one, which stopping rules decide on.
+
+        Args:
+            runner: Runner of the run.
+            state: RunState of the run.
+        Returns:
+            The best bandits and the win probabilities, None for what the strategy does not know.
+        """
+        return None, None
+
+    def sequential(self) -> bool:
+        """
+        Checks whether the simulations can also be run one after another,
+        with sequential_test and sequential_batch, instead of in lockstep.
+
+        Returns:
+            Whether the strategy supports sequential runs.
+        """
+        return False
+
+    def sequential_test(self, runner: 'StrategyRunner'):
+        """
+        Creates the test that runs one simulation of a sequential run, e.g. a ThompsonSampling.
+
+        Args:
+            runner: Runner of the run.
+        Returns:
+            The test of the simulation.
+        """
+        raise NotImplementedError
+
+    def sequential_batch(self, runner: 'StrategyRunner', test, batch: int, returns: np.ndarray,
+                         total_examples: List[int], positive_examples: List[int]):
+        """
+        Runs one batch of one simulation of a sequential run, drawing its
+        positive examples with the runner's rng.
+
+        Args:
+            runner: Runner of the run.
+            test: Test of the simulation, created by sequential_test.
+            batch: Index of the batch.
+            returns: Average returns per bandit of the batch.
+            total_examples: Examples per bandit of the simulation, the batch's are added to it.
+            positive_examples: Positive examples per bandit of the simulation, the batch's are added to it.
+        """
+        raise NotImplementedError
+
+
+def report_positives(runner: 'StrategyRunner', state: RunState, positives: np.ndarray) -> np.ndarray:
+    """
+    Passes the positive examples of a stage through the delayed feedback of
+    the run, for strategies that learn from them.
+
+    Args:
+        runner: Runner of the run.
+        state: RunState of the run.
+        positives: Positive examples of the stage.
+    Returns:
+        The positive examples that are reported in this batch, all of them without delays.
+    """
+    if state.delayed is None:
+        return positives
+    state.delayed.add(positives, runner.rng)
+    return state.delayed.release()
+
+
+class StrategyRunner:
+    """
+    Class that is used to run simulations of any Strategy. All simulations
+    are advanced in lockstep as (simulations, bandits) arrays, and the
+    runner takes care of the outcomes, stopping rules, statistics,
+    checkpoints and accumulated results, so that a strategy only decides
+    the allocation.
+
+    Attributes:
+        bandit_returns: List of average returns per bandit.
+        strategy: Strategy that allocates the examples.
+        batch_size: Number of examples per batch.
+        batches: Number of batches.
+        simulations: Number of simulations.
+        vectorized: Whether all simulations are advanced in lockstep as arrays.
+        return_schedule: ReturnSchedule with the average returns per bandit of every batch.
+        delays: Probability that positive examples are reported 0, 1, ... batches late.
+        outcomes: Source of the positive examples, e.g. CommonOutcomes to compare strategies on the same outcomes.
+        simulation_clicks: Total positive examples of every simulation at the end of the run.
+        collect_statistics: Whether the distribution of the results across simulations is collected.
+        statistics: RunStatistics of the last run, if collected.
+        stopping_rule: Rule that decides when a simulation stops.
+        stopping_batches: Batch at which each simulation stopped, -1 if it did not.
+        state: RunState of the last vectorized run.
+        instrument: Instrument that records the time spent in each phase of the run.
+        rng: Random number generator used for all draws of the run.
+
+    Methods:
+        init_bandits: Prepares everything for a new simulation of a sequential run.
+        run: Runs the simulations and tracks performance.
+        run_sequential: Runs the simulations one after another with the tests of the strategy.
+        run_vectorized: Runs all simulations in lockstep as arrays.
+        resume: Continues a run from a checkpoint or extends a finished run.
+        iter_batches: Runs all simulations in lockstep and yields the results of every batch.
+        build_frames: Builds df_bids and df_clicks from the accumulated totals.
+    """
+
+    def __init__(self, bandit_returns: List[float], strategy: Strategy, batch_size: int=1000, batches: int=10, simulations: int=100,
+                 seed: Union[int, np.random.Generator]=None, stopping_rule: StoppingRule=None,
+                 instrument: Instrument=None, return_schedule: Union[np.ndarray, Callable[[int], Sequence[float]]]=None,
+                 delays: Sequence[float]=None, outcomes: Union[BinomialOutcomes, CommonOutcomes]=None,
+                 collect_statistics: bool=False, vectorized: bool=True):
+        """
+        Initializes a new StrategyRunner with the passed parameters.
+
+        Args:
+            bandit_returns: List of average returns per bandit.
+            strategy: Strategy that allocates the examples, e.g. a UCB1Strategy.
+            batch_size: Number of examples per batch.
+            batches: Number of batches.
+            simulations: Number of simulations.
+            seed: Seed or random number generator used for all draws of the run.
+            stopping_rule: Rule that decides when a simulation stops. Once stopped, a
+                simulation gets no more examples. Needs vectorized runs, and rules that
+                decide on win probabilities, like BestArmProbability, need a strategy
+                that reports them.
+            instrument: Instrument that records the time spent in each phase of the run,
+                e.g. a Recorder. Nothing is recorded by default.
+            return_schedule: Average returns per bandit of every batch, as an array of shape
+                (batches, bandits) or a callable that maps a batch index to the returns of
+                that batch, e.g. a Diurnal. If None, bandit_returns are used for every batch.
+            delays: Probability that positive examples are reported 0, 1, ... batches after
+                their examples were made, e.g. from geometric_delays. If None, they are
+                reported in the same batch. Needs vectorized runs.
+            outcomes: Source of the positive examples. CommonOutcomes with the same seed give
+                every strategy the same outcomes per replica. If None, they are independent
+                binomial draws. Needs vectorized runs.
+            collect_statistics: If True, the variance, extremes and quantiles of the results of
+                every batch and bandit across simulations are collected in statistics. Needs
+                vectorized runs.
+            vectorized: Whether all simulations are advanced in lockstep as arrays. If False,
+                they are run one after another, which the strategy has to support.
+        """
+
+        if not vectorized:
+            if stopping_rule is not None:
+                raise ValueError('Stopping rules are only supported for vectorized runs.')
+            if delays is not None:
+                raise ValueError('Delayed feedback is only supported for vectorized runs.')
+            if outcomes is not None:
+                raise ValueError('Outcome sources are only supported for vectorized runs.')
+            if collect_statistics:
+                raise ValueError('Statistics are only collected for vectorized runs.')
+            if not strategy.sequential():
+                raise ValueError(f'{strategy!r} only supports vectorized runs.')
+
+        self.rng = np.random.default_rng(seed)
+        self.bandit_returns = bandit_returns
+        self.n_bandits = len(bandit_returns)
+        self.bandits = list(range(self.n_bandits))
+
+        self.strategy = strategy
+        self.batch_size = batch_size
+        self.batches = batches
+        self.simulations = simulations
+        self.vectorized = vectorized
+        self.stopping_rule = stopping_rule
+        self.instrument = instrument or NULL_INSTRUMENT
+        self.stopping_batches = np.full(self.simulations, -1)
+        self.state = None
+        self.return_schedule = ReturnSchedule(bandit_returns, return_schedule)
+        self.delays = delays
+        self.outcomes = outcomes or BinomialOutcomes()
+        self.collect_statistics = collect_statistics
+        self.statistics = None
+        self.simulation_clicks = np.zeros(self.simulations, dtype=np.int64)
+
+        self.bids = np.zeros((self.batches, self.n_bandits), dtype=np.int64)
+        self.clicks = np.zeros((self.batches, self.n_bandits), dtype=np.int64)
+        self.df_bids = pd.DataFrame(columns=self.bandit_returns)
+        self.df_clicks = pd.DataFrame(columns=self.bandit_returns)
+
+    def init_bandits(self):
+        """
+        Prepares everything for a new simulation of a sequential run.
+        """
+
+        self.bandit_positive_examples = [0] * self.n_bandits
+        self.bandit_total_examples = [0] * self.n_bandits
+        self.test = self.strategy.sequential_test(self)
+
+    def run(self, checkpoint: str=None, checkpoint_every: int=10):
+        """
+        Runs the simulations and tracks performance.
+
+        Args:
+            checkpoint: If set, the run is saved to this file every checkpoint_every
+                batches and when it ends, so it can be continued with resume. Needs
+                vectorized runs.
+            checkpoint_every: Number of batches between checkpoints.
+        """
+
+        if self.vectorized:
+            self.run_vectorized(checkpoint, checkpoint_every)
+        elif checkpoint is not None:
+            raise ValueError('Checkpoints are only supported for vectorized runs.')
+        else:
+            self.run_sequential()
+
+    def run_sequential(self):
+        """
+        Runs the simulations one after another with the tests of the strategy.
+        """
+
+        self.bids[:] = 0
+        self.clicks[:] = 0
+        for j in range(self.simulations):
+            self.init_bandits()
+            for i in range(self.batches):
+                self.strategy.sequential_batch(self, self.test, i, self.return_schedule(i),
+                                               self.bandit_total_examples, self.bandit_positive_examples)
+                self.bids[i] += self.bandit_total_examples
+                self.clicks[i] += self.bandit_positive_examples
+            self.simulation_clicks[j] = sum(self.bandit_positive_examples)
+        self.build_frames()
+
+    def resume(self, checkpoint: str=None, batches: int=None, checkpoint_every: int=10):
+        """
+        Continues a run from a checkpoint, or the last run of this runner,
+        exactly where it stopped. With more batches than the run had, a
+        finished run is extended instead of recomputed. Runs of run_parallel
+        cannot be resumed.
+
+        Args:
+            checkpoint: Checkpoint written by run. If None, the last run in memory is continued.
+            batches: Number of batches of the continued run. If None, the number is kept.
+            checkpoint_every: Number of batches between checkpoints of the continued run.
+        """
+
+        if checkpoint is not None:
+            state = load_checkpoint(checkpoint, self, batches)
+        else:
+            if self.state is None:
+                raise ValueError('There is no run to resume, pass a checkpoint. Runs of run_parallel cannot be resumed.')
+            state = self.state
+            if batches is not None:
+                grow_batches(self, batches)
+        if self.stopping_rule is not None:
+            self.stopping_rule.resume(self.batches)
+        self.run_vectorized(checkpoint, checkpoint_every, state)
+
+    def run_vectorized(self, checkpoint: str=None, checkpoint_every: int=10, state: RunState=None):
+        """
+        Runs all simulations in lockstep as arrays.
+
+        Args:
+            checkpoint: If set, the run is saved to this file every checkpoint_every batches and when it ends.
+            checkpoint_every: Number of batches between checkpoints.
+            state: RunState to continue from. If None, a new run is started.
+        """
+
+        if state is None:
+            self.statistics = RunStatistics(self.bandit_returns, self.batches, self.batch_size) if self.collect_statistics else None
+        last_batch = -1 if state is None else state.batch - 1
+        for result in self.iter_batches(state):
+            with self.instrument.phase('bookkeeping'):
+                self.bids[result.batch] = result.total_bids.sum(axis=0)
+                self.clicks[result.batch] = result.total_clicks.sum(axis=0)
+                self.simulation_clicks = result.total_clicks.sum(axis=1)
+            if self.statistics is not None:
+                with self.instrument.phase('statistics'):
+                    self.statistics.add(result)
+            last_batch = result.batch
+            if checkpoint is not None and (last_batch + 1) % checkpoint_every == 0:
+                with self.instrument.phase('checkpoint'):
+                    save_checkpoint(checkpoint, self)
+        # Stopped simulations keep their totals for the remaining batches.
+        self.bids[last_batch + 1:] = self.bids[last_batch]
+        self.clicks[last_batch + 1:] = self.clicks[last_batch]
+        if self.statistics is not None:
+            final = BatchResult(last_batch, None, None, self.state.total_examples, self.state.positive_examples)
+            for batch in range(last_batch + 1, self.batches):
+                self.statistics.add(final, batch)
+        if checkpoint is not None:
+            with self.instrument.phase('checkpoint'):
+                save_checkpoint(checkpoint, self)
+        with self.instrument.phase('build_frames'):
+            self.build_frames()
+
+    def iter_batches(self, state: RunState=None) -> Iterator[BatchResult]:
+        """
+        Runs all simulations in lockstep and yields the results of every batch.
+        Each stage of a batch asks the strategy for the allocation of all active
+        simulations, draws their positive examples at once and hands them back
+        to the strategy. Iteration ends early once the stopping rule has stopped
+        every simulation.
+
+        Args:
+            state: RunState to continue from. If None, a new run is started.
+        Returns:
+            Iterator over the results of each batch.
+        """
+
+        shape = (self.simulations, self.n_bandits)
+        if state is None:
+            state = RunState(
+                delayed=DelayedFeedback(self.delays, shape) if self.delays is not None else None,
+                total_examples=np.zeros(shape, dtype=np.int64),
+                positive_examples=np.zeros(shape, dtype=np.int64),
+                stopped=np.zeros(self.simulations, dtype=bool),
+                stopping_batches=np.full(self.simulations, -1),
+                outcomes=self.outcomes.start(self.simulations, self.n_bandits, self.bandit_returns))
+            self.strategy.start(self, state)
+            if self.stopping_rule is not None:
+                self.stopping_rule.start(self.simulations, self.n_bandits, self.batches)
+        self.state = state
+        self.stopping_batches = state.stopping_batches
+        total_examples, positive_examples = state.total_examples, state.positive_examples
+        stopped, outcomes, bandits = state.stopped, state.outcomes, np.arange(self.n_bandits)
+
+        for i in range(state.batch, self.batches):
+            if stopped.all():
+                return
+            active = np.flatnonzero(~stopped)
+            returns = self.return_schedule(i)
+            for stage in range(self.strategy.stages):
+                stage_examples = np.zeros(shape, dtype=np.int64)
+                stage_positives = np.zeros(shape, dtype=np.int64)
+                stage_examples[active] = self.strategy.allocate(self, state, i, stage, active)
+                with self.instrument.phase('binomial_draws'):
+                    stage_positives[active] = outcomes.draw(self.rng, active[:, None], bandits, stage_examples[active], returns)
+                with self.instrument.phase('bookkeeping'):
+                    total_examples += stage_examples
+                    positive_examples += stage_positives
+                    if stage == 0:
+                        examples, positives = stage_examples, stage_positives
+                    else:
+                        examples += stage_examples
+                        positives += stage_positives
+                self.strategy.update(self, state, i, stage, stage_examples, stage_positives)
+            best_bandits, win_probabilities = self.strategy.report(self, state)
+            result = BatchResult(i, examples, positives, total_examples, positive_examples,
+                                 best_bandits=best_bandits, win_probabilities=win_probabilities)
+
+            if self.stopping_rule is not None:
+                with self.instrument.phase('stopping'):
+                    newly_stopped = self.stopping_rule.check(result) & ~stopped
+                self.stopping_batches[newly_stopped] = i
+                stopped |= newly_stopped
+            self.instrument.count('batches')
+            state.batch = i + 1
+            yield result
+
+    def build_frames(self):
+        """
+        Builds df_bids and df_clicks, the average cumulative number of
+        examples and positive examples per batch, from the accumulated totals.
+        """
+
+        self.df_bids = pd.DataFrame(self.bids / self.simulations, columns=self.bandit_returns)
+        self.df_clicks = pd.DataFrame(self.clicks / self.simulations, columns=self.bandit_returns)
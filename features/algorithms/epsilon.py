@@ -1,10 +1,15 @@
 import math
-from typing import List
+from typing import Callable, List, Sequence, Union
 
 import numpy as np
-import pandas as pd
 
-from features.algorithms.bandits import EpsilonBandit
+from features.algorithms.bandits import ArmTable
+from features.algorithms.engine import Strategy, StrategyRunner, report_positives
+from features.algorithms.outcomes import BinomialOutcomes, CommonOutcomes
+from features.algorithms.schedules import Forgetting
+from features.algorithms.stopping import StoppingRule
+from features.checkpoint import RunState
+from features.instrumentation import Instrument, NULL_INSTRUMENT
 
 
 class EpsilonGreedy:
@@ -14,60 +19,95 @@ class EpsilonGreedy:
     Attributes:
         epsilon: Percentage of exploration.
         batch_size: Number of examples per batch.
+        instrument: Instrument that records the time spent in each phase.
+        discount: Factor the positive examples are multiplied by before every batch.
+        window: Number of most recent batches the best bandit is chosen from.
+        arms: ArmTable with the positive examples of every bandit.
+        forgetting: Forgetting with the positive examples of every bandit, for discounted or sliding-window tests.
     
     Methods:
-        add_bandit: Adds a new BetaBandit to the test.
-        update_bandit: Updates the priors of the BetaBandit at index idx.
+        add_bandit: Adds a new bandit to the test.
+        update_bandit: Updates the positive examples of the bandit at index idx.
+        update_batch: Updates all bandits with the positive examples of one batch, forgetting old ones.
         add_best_bandit: Adds the best bandit of the current batch.
         bandit_batch: Determines how many times each bandit gets used in the running batch.
     """
 
-    def __init__(self, epsilon: float=0.2, batch_size: int=1000):
+    def __init__(self, epsilon: float=0.2, batch_size: int=1000, instrument: Instrument=None, discount: float=1.,
+                 window: int=None):
         """
         Initializes a new instance of EpsilonGreedy with the passed parmeters
 
         Args:
             epsilon: Percentage of exploration.
             batch_size: Number of examples per batch.
+            instrument: Instrument that records the time spent in each phase. Nothing is recorded by default.
+            discount: Factor the positive examples are multiplied by before every batch of
+                update_batch, 1 keeps all examples.
+            window: If set, the best bandit is chosen from the positive examples of the last
+                window batches of update_batch only.
         """
     
+        self.instrument = instrument or NULL_INSTRUMENT
         self.batch_size = batch_size
         self.epsilon = epsilon
-        self.bandits = list()
+        self.discount = discount
+        self.window = window
+        forgets = discount != 1 or window is not None
+        self.arms = ArmTable(positive_examples=np.float64 if forgets else np.int64)
+        self.forgetting = None
         self.best_bandits = list()
     
     def add_bandit(self, positive_examples: int=0):
         """
-        Adds a new EpsilonBandit to the test.
+        Adds a new bandit to the test.
 
         Args:
             positive_examples: Number of positive examples.
         """
-        self.bandits.append(EpsilonBandit(positive_examples))
+        self.arms.append(positive_examples=positive_examples)
 
     def update_bandit(self, idx: int, positive_examples: int=0):
         """
-        Updates the priors of the BetaBandit at index idx.
+        Updates the positive examples of the bandit at index idx.
 
         Args:
             idx: Index of the bandit to be updated.
             positive_examples: Number of positive examples.
         """
 
-        self.bandits[idx].update(positive_examples)
+        self.arms.update(idx, positive_examples=positive_examples)
+
+    def update_batch(self, positive_examples: np.ndarray):
+        """
+        Updates all bandits with the positive examples of one batch. With a
+        discount or a window, the positive examples of earlier batches are
+        discounted or dropped first.
+
+        Args:
+            positive_examples: Positive examples of every bandit in the batch.
+        """
+
+        arm_positive_examples = self.arms['positive_examples']
+        if self.discount == 1 and self.window is None:
+            arm_positive_examples += positive_examples
+            return
+        if self.forgetting is None:
+            self.forgetting = Forgetting(self.discount, self.window, positive_examples=(len(self.arms),))
+            # Positive examples the bandits were added with are kept until they are discounted.
+            self.forgetting.evidence['positive_examples'] += arm_positive_examples
+        elif self.forgetting.evidence['positive_examples'].shape[0] != len(self.arms):
+            raise ValueError('Bandits cannot be added after the first update_batch of a discounted or sliding-window test.')
+        arm_positive_examples[:] = self.forgetting.step(positive_examples=positive_examples)['positive_examples']
 
     def add_best_bandit(self):
         """
         Adds the best bandit of the current batch.
         """
 
-        idx = 0
-        maxVal = 0
-        for i in range(len(self.bandits)):
-            val = self.bandits[i].get_value()
-            if val > maxVal:
-                maxVal = val
-                idx = i
+        positive_examples = self.arms['positive_examples']
+        # argmax picks the first of equal bandits, and bandit 0 when nothing is positive yet.
+        idx = int(positive_examples.argmax()) if len(positive_examples) > 0 else 0
         self.best_bandits.append(idx)
 
     def bandit_batch(self) -> (int, int):
@@ -79,15 +119,134 @@ class EpsilonGreedy:
             The number of exploratory examples and the best bandit's index.
         """
 
-        self.add_best_bandit()
-        n_bandits = len(self.bandits)
+        with self.instrument.phase('best_bandit'):
+            self.add_best_bandit()
+        n_bandits = len(self.arms)
         exploration_total = self.batch_size * self.epsilon
         exploration = int(exploration_total / n_bandits)
 
         return exploration, self.best_bandits[-1]
 
 
-class EpsilonGreedyRunner:
+class EpsilonGreedyStrategy(Strategy):
+    """
+    Strategy of Epsilon-greedy multi-armed bandits. The first stage of a batch
+    explores, every bandit gets the same share of epsilon of it, and the second
+    stage exploits, the rest goes to the bandit with the most explored positive
+    examples before the batch. The first batch is explored completely.
+
+    Attributes:
+        epsilon: Percentage of exploration.
+        discount: Factor the explored positive examples are multiplied by before every batch.
+        window: Number of most recent batches the best bandit is chosen from.
+    """
+    stages = 2
+
+    def __init__(self, epsilon: float=0.2, discount: float=1., window: int=None):
+        """
+        Initializes a new EpsilonGreedyStrategy.
+
+        Args:
+            epsilon: Percentage of exploration.
+            discount: Factor the explored positive examples are multiplied by before every
+                batch, 1 keeps all examples.
+            window: If set, the best bandit is chosen from the explored positive examples
+                of the last window batches only.
+        """
+        self.epsilon = epsilon
+        self.discount = discount
+        self.window = window
+
+    def start(self, runner: StrategyRunner, state: RunState):
+        """
+        Adds the forgetting explored positive examples and the best bandit of
+        every simulation to the state.
+        """
+        shape = (runner.simulations, runner.n_bandits)
+        # Positive examples seen by the EpsilonBandits, i.e. from exploration only.
+        state.forgetting = Forgetting(self.discount, self.window, positive_examples=shape)
+        state.best_bandits = np.zeros(runner.simulations, dtype=np.int64)
+
+    def exploration_examples(self, runner: StrategyRunner, batch: int) -> int:
+        """
+        Gets the examples every bandit gets from the exploration of a batch.
+
+        Args:
+            runner: Runner of the run.
+            batch: Index of the batch.
+        Returns:
+            The examples per bandit, the whole batch split evenly in the first batch.
+        """
+        if batch == 0:
+            return runner.batch_size // runner.n_bandits
+        return int(runner.batch_size * self.epsilon / runner.n_bandits)
+
+    def allocate(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Splits the exploration evenly over the bandits in the first stage, and
+        gives the rest of the batch to the best bandit in the second.
+        """
+        exploration_examples = self.exploration_examples(runner, batch)
+        if stage == 0:
+            with runner.instrument.phase('best_bandit'):
+                state.best_bandits = state.forgetting.evidence['positive_examples'].argmax(axis=1)
+            return np.full((len(active), runner.n_bandits), exploration_examples, dtype=np.int64)
+        examples = np.zeros((len(active), runner.n_bandits), dtype=np.int64)
+        examples[np.arange(len(active)), state.best_bandits[active]] = runner.batch_size - exploration_examples * runner.n_bandits
+        return examples
+
+    def update(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, examples: np.ndarray, positives: np.ndarray):
+        """
+        Adds the reported positive examples of the exploration stage. The best
+        bandit is only chosen from explored positive examples.
+        """
+        if stage == 0:
+            state.forgetting.step(positive_examples=report_positives(runner, state, positives))
+
+    def report(self, runner: StrategyRunner, state: RunState) -> (np.ndarray, np.ndarray):
+        """
+        Reports the bandit every simulation exploited in the last batch.
+        """
+        return state.best_bandits, None
+
+    def sequential(self) -> bool:
+        """
+        Checks whether the simulations can also be run one after another,
+        which EpsilonGreedy supports with all parameters.
+        """
+        return True
+
+    def sequential_test(self, runner: StrategyRunner) -> EpsilonGreedy:
+        """
+        Creates the EpsilonGreedy test of one simulation of a sequential run.
+        """
+        test = EpsilonGreedy(self.epsilon, runner.batch_size, instrument=runner.instrument, discount=self.discount,
+                             window=self.window)
+        for _ in range(runner.n_bandits):
+            test.add_bandit()
+        return test
+
+    def sequential_batch(self, runner: StrategyRunner, test: EpsilonGreedy, batch: int, returns: np.ndarray,
+                         total_examples: List[int], positive_examples: List[int]):
+        """
+        Explores every bandit and then exploits the best one with an EpsilonGreedy test.
+        """
+        exploration_examples, best_bandit = test.bandit_batch()
+        if batch == 0:
+            exploration_examples = runner.batch_size // runner.n_bandits
+        positives = np.zeros(runner.n_bandits, dtype=np.int64)
+        for idx in range(runner.n_bandits):
+            total_examples[idx] += exploration_examples
+            positives[idx] = runner.rng.binomial(exploration_examples, returns[idx])
+            positive_examples[idx] += positives[idx]
+        test.update_batch(positives)
+
+        exploitation_examples = runner.batch_size - exploration_examples * runner.n_bandits
+        total_examples[best_bandit] += exploitation_examples
+        positive_examples[best_bandit] += runner.rng.binomial(exploitation_examples, returns[best_bandit])
+
+
+class EpsilonGreedyRunner(StrategyRunner):
     """
     Class that is used to run simulations of Thompson sampling tests.
 
@@ -97,13 +256,36 @@ class EpsilonGreedyRunner:
         batch_size: Number of examples per batch.
         batches: Number of batches.
         simulations: Number of simulations.
+        vectorized: Whether all simulations are advanced in lockstep as arrays.
+        return_schedule: ReturnSchedule with the average returns per bandit of every batch.
+        discount: Factor the explored positive examples are multiplied by before every batch.
+        window: Number of most recent batches the best bandit is chosen from.
+        delays: Probability that positive examples are reported 0, 1, ... batches late.
+        outcomes: Source of the positive examples, e.g. CommonOutcomes to compare strategies on the same outcomes.
+        simulation_clicks: Total positive examples of every simulation at the end of the run.
+        collect_statistics: Whether the distribution of the results across simulations is collected.
+        statistics: RunStatistics of the last run, if collected.
+        stopping_rule: Rule that decides when a simulation stops.
+        stopping_batches: Batch at which each simulation stopped, -1 if it did not.
+        state: RunState of the last vectorized run.
+        instrument: Instrument that records the time spent in each phase of the run.
+        rng: Random number generator used for all draws of the run.
     
     Methods:
-        init_bandits: Prepares everything for new simulation.
+        init_bandits: Prepares everything for a new simulation of a sequential run.
         run: Runs the simulations and tracks performance.
+        run_sequential: Runs the simulations one after another with EpsilonGreedy objects.
+        run_vectorized: Runs all simulations in lockstep as arrays with an EpsilonGreedyStrategy.
+        resume: Continues a run from a checkpoint or extends a finished run.
+        iter_batches: Runs all simulations in lockstep and yields the results of every batch.
+        build_frames: Builds df_bids and df_clicks from the accumulated totals.
     """
 
-    def __init__(self, bandit_returns: List[float], epsilon: float=0.2, batch_size: int=10000, batches: int=10, simulations: int=100):
+    def __init__(self, bandit_returns: List[float], epsilon: float=0.2, batch_size: int=10000, batches: int=10, simulations: int=100, vectorized: bool=True,
+                 seed: Union[int, np.random.Generator]=None, stopping_rule: StoppingRule=None,
+                 instrument: Instrument=None, return_schedule: Union[np.ndarray, Callable[[int], Sequence[float]]]=None,
+                 discount: float=1., window: int=None, delays: Sequence[float]=None,
+                 outcomes: Union[BinomialOutcomes, CommonOutcomes]=None, collect_statistics: bool=False):
         """
         Initializes a new instance of RunEpsilonGreedy with the passed parameters.
 
@@ -113,59 +295,34 @@ class EpsilonGreedyRunner:
             batch_size: Number of examples per batch.
             batches: Number of batches.
             simulations: Number of simulations.
+            vectorized: Whether all simulations are advanced in lockstep as arrays.
+            seed: Seed or random number generator used for all draws of the run.
+            stopping_rule: Rule that decides when a simulation stops, e.g. a StableBestArm.
+                Once stopped, a simulation gets no more examples. Needs vectorized runs.
+            instrument: Instrument that records the time spent in each phase of the run,
+                e.g. a Recorder. Nothing is recorded by default.
+            return_schedule: Average returns per bandit of every batch, as an array of shape
+                (batches, bandits) or a callable that maps a batch index to the returns of
+                that batch, e.g. a Diurnal. If None, bandit_returns are used for every batch.
+            discount: Factor the explored positive examples are multiplied by before every
+                batch, 1 keeps all examples.
+            window: If set, the best bandit is chosen from the explored positive examples
+                of the last window batches only.
+            delays: Probability that positive examples are reported 0, 1, ... batches after
+                their examples were made, e.g. from geometric_delays. If None, they are
+                reported in the same batch. Needs vectorized runs.
+            outcomes: Source of the positive examples. CommonOutcomes with the same seed give
+                every strategy the same outcomes per replica. If None, they are independent
+                binomial draws. Needs vectorized runs.
+            collect_statistics: If True, the variance, extremes and quantiles of the results of
+                every batch and bandit across simulations are collected in statistics. Needs
+                vectorized runs.
         """
 
-        self.bandit_returns = bandit_returns
-        self.n_bandits = len(bandit_returns)
-        self.bandits = list(range(self.n_bandits))
-
+        super().__init__(bandit_returns, EpsilonGreedyStrategy(epsilon, discount, window), batch_size=batch_size,
+                         batches=batches, simulations=simulations, seed=seed, stopping_rule=stopping_rule,
+                         instrument=instrument, return_schedule=return_schedule, delays=delays, outcomes=outcomes,
+                         collect_statistics=collect_statistics, vectorized=vectorized)
         self.epsilon = epsilon
-        self.batch_size = batch_size
-        self.batches = batches
-        self.simulations = simulations
-
-        self.df_bids = pd.DataFrame(columns=self.bandit_returns)
-        self.df_clicks = pd.DataFrame(columns=self.bandit_returns)
-
-    def init_bandits(self):
-        """
-        Prepares everything for new simulation.
-        """
-
-        self.first_batch = True
-        self.bandit_positive_examples = [0] * self.n_bandits
-        self.bandit_total_examples = [0] * self.n_bandits
-        self.eps = EpsilonGreedy(self.epsilon, self.batch_size)
-        for i in self.bandits:
-            self.eps.add_bandit()
-    
-    def run(self):
-        """
-        Runs the simulations and tracks performance.
-        """
-
-        for j in range(self.simulations):
-            self.init_bandits()
-            for i in range(self.batches):
-                exploration_examples, best_bandit = self.eps.bandit_batch()
-                if self.first_batch:
-                    self.first_batch = False
-                    exploration_examples = self.batch_size // self.n_bandits
-                for idx in self.bandits:
-                    self.bandit_total_examples[idx] += exploration_examples
-                    positive_examples = np.random.binomial(exploration_examples, self.bandit_returns[idx])
-                    self.bandit_positive_examples[idx] += positive_examples
-                    self.eps.update_bandit(idx, positive_examples)
-                
-                exploitation_examples = self.batch_size - exploration_examples * self.n_bandits
-                self.bandit_total_examples[best_bandit] += exploitation_examples
-                self.bandit_positive_examples[best_bandit] += np.random.binomial(exploitation_examples, self.bandit_returns[best_bandit])
-
-                if self.df_bids.shape[0] < self.batches:
-                    self.df_bids.loc[i] = self.bandit_total_examples
-                    self.df_clicks.loc[i] = self.bandit_positive_examples
-                else:
-                    self.df_bids.loc[i] += self.bandit_total_examples
-                    self.df_clicks.loc[i] += self.bandit_positive_examples
-        self.df_bids /= self.simulations
-        self.df_clicks /= self.simulations
+        self.discount = discount
+        self.window = window
@@ -0,0 +1,221 @@
+import copy
+from typing import Union
+
+import numpy as np
+
+# Largest position of a click, used for streams that never click.
+NEVER = 2**62
+
+
+def mix(z: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finalizer, a bijective hash of 64 bit integers.
+
+    Args:
+        z: Array of uint64.
+    Returns:
+        Array of hashed uint64.
+    """
+    z = z + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hashed_uniforms(key: np.uint64, stream: int, replicas: np.ndarray, bandits: np.ndarray, counters: np.ndarray) -> np.ndarray:
+    """
+    Counter-based uniform random numbers: the same key, stream, replica,
+    bandit and counter always give the same number, whatever was drawn before.
+
+    Args:
+        key: Key derived from the seed.
+        stream: Index of the stream.
+        replicas: Indices of the replicas.
+        bandits: Indices of the bandits.
+        counters: Indices of the numbers within each stream.
+    Returns:
+        Array of uniform numbers in [0, 1).
+    """
+    h = mix(np.full(np.shape(replicas), key ^ np.uint64(stream), dtype=np.uint64))
+    for value in (replicas, bandits, counters):
+        h = mix(h ^ np.asarray(value).astype(np.uint64))
+    return (h >> np.uint64(11)) * 2.**-53
+
+
+class BinomialOutcomes:
+    """
+    Outcomes of independent simulations: the positive examples of every
+    bandit are drawn from the runner's random number generator.
+
+    Methods:
+        start: Prepares the outcomes of a run.
+        shard: Gets the outcomes of a shard of the simulations.
+        draw: Draws the positive examples of the bandits' examples.
+    """
+
+    def __repr__(self):
+        return 'BinomialOutcomes()'
+
+    def start(self, simulations: int, bandits: int, returns: np.ndarray) -> 'BinomialOutcomes':
+        return self
+
+    def shard(self, first_replica: int) -> 'BinomialOutcomes':
+        return self
+
+    def draw(self, rng: np.random.Generator, replicas: np.ndarray, bandits: np.ndarray, examples: np.ndarray, returns: np.ndarray) -> np.ndarray:
+        """
+        Draws the positive examples of the bandits' examples.
+
+        Args:
+            rng: Random number generator of the runner.
+            replicas: Indices of the simulations.
+            bandits: Indices of the bandits.
+            examples: Number of examples.
+            returns: Average returns of the bandits.
+        Returns:
+            Array with the positive examples, broadcast like the arguments.
+        """
+        return rng.binomial(examples, returns)
+
+
+class CommonOutcomes:
+    """
+    Common random numbers for comparing strategies. Every bandit of every
+    replica has a fixed stream of outcomes, so the k-th example a strategy
+    gives a bandit in a replica has the same outcome for every strategy run
+    with the same seed. Differences between strategies per replica are then
+    not blurred by luck.
+
+    Only the examples that may be positive are generated: candidates arrive
+    with probability cap per example, at geometrically distributed gaps,
+    and a candidate is positive with probability return / cap. This costs
+    about cap draws per example rather than one.
+
+    Attributes:
+        key: Key of the hashed random numbers, derived from the seed.
+        cap: Upper bound of the returns, None uses the largest return of the runner.
+        first_replica: Replica of the runner's first simulation.
+
+    Methods:
+        start: Prepares the outcome streams of a run.
+        shard: Gets the outcomes of a shard of the simulations.
+    """
+
+    def __init__(self, seed: Union[int, np.random.SeedSequence]=None, cap: float=None, first_replica: int=0):
+        """
+        Initializes new CommonOutcomes.
+
+        Args:
+            seed: Seed of the outcome streams. Strategies run with the same seed see the same outcomes.
+            cap: Upper bound of the returns of every batch, needed when a return schedule
+                exceeds the returns of the runner. None uses the largest return of the runner.
+            first_replica: Replica of the runner's first simulation.
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.key = seed.generate_state(1, np.uint64)[0]
+        self.cap = cap
+        self.first_replica = first_replica
+
+    def __repr__(self):
+        return f'CommonOutcomes(key={self.key}, cap={self.cap}, first_replica={self.first_replica})'
+
+    def start(self, simulations: int, bandits: int, returns: np.ndarray) -> 'OutcomeStreams':
+        """
+        Prepares the outcome streams of a run.
+
+        Args:
+            simulations: Number of simulations.
+            bandits: Number of bandits.
+            returns: Average returns of the bandits.
+        Returns:
+            The OutcomeStreams positive examples are drawn from.
+        """
+        cap = float(np.max(returns)) if self.cap is None else self.cap
+        return OutcomeStreams(self.key, cap, self.first_replica, simulations, bandits)
+
+    def shard(self, first_replica: int) -> 'CommonOutcomes':
+        """
+        Gets the outcomes of a shard whose first simulation is the
+        first_replica-th simulation of the runner.
+        """
+        shard = copy.copy(self)
+        shard.first_replica = self.first_replica + first_replica
+        return shard
+
+
+class OutcomeStreams:
+    """
+    Positions in the outcome streams of CommonOutcomes for every
+    simulation and bandit of a run.
+
+    Attributes:
+        key: Key of the hashed random numbers.
+        cap: Probability of a candidate per example.
+        first_replica: Replica of the first simulation.
+        examples: Number of examples used so far per simulation and bandit.
+        candidates: Index of the next candidate per simulation and bandit.
+        positions: Position of the next candidate per simulation and bandit.
+
+    Methods:
+        draw: Draws the positive examples of the bandits' examples.
+    """
+
+    def __init__(self, key: np.uint64, cap: float, first_replica: int, simulations: int, bandits: int):
+        """
+        Initializes new OutcomeStreams at the start of every stream.
+        """
+        if not 0 <= cap <= 1:
+            raise ValueError(f'cap must be a probability, got {cap}.')
+        self.key = key
+        self.cap = cap
+        self.first_replica = first_replica
+        self.examples = np.zeros((simulations, bandits), dtype=np.int64)
+        self.candidates = np.zeros((simulations, bandits), dtype=np.int64)
+        replicas, arms = np.indices((simulations, bandits))
+        self.positions = self.gaps(replicas, arms, self.candidates) - 1
+
+    def gaps(self, replicas: np.ndarray, bandits: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """
+        Gets the geometric gaps before the given candidates.
+        """
+        if self.cap == 0:
+            return np.full(np.shape(replicas), NEVER, dtype=np.int64)
+        uniforms = hashed_uniforms(self.key, 0, replicas + self.first_replica, bandits, candidates)
+        gaps = np.floor(np.log1p(-uniforms) / np.log1p(-self.cap)) + 1 if self.cap < 1 else np.ones(np.shape(uniforms))
+        return np.minimum(gaps, NEVER).astype(np.int64)
+
+    def draw(self, rng: np.random.Generator, replicas: np.ndarray, bandits: np.ndarray, examples: np.ndarray, returns: np.ndarray) -> np.ndarray:
+        """
+        Draws the positive examples of the bandits' examples from the
+        streams, and moves the streams past them.
+
+        Args:
+            rng: Random number generator of the runner, unused.
+            replicas: Indices of the simulations.
+            bandits: Indices of the bandits. Every simulation and bandit may appear only once.
+            examples: Number of examples.
+            returns: Average returns of the bandits.
+        Returns:
+            Array with the positive examples, broadcast like the arguments.
+        """
+        replicas, bandits, examples, returns = np.broadcast_arrays(replicas, bandits, examples, returns)
+        shape = replicas.shape
+        replicas, bandits, returns = replicas.ravel(), bandits.ravel(), returns.ravel()
+        if (returns > self.cap).any():
+            raise ValueError(f'Returns {returns.max()} exceed the cap {self.cap} of the outcome streams.')
+        end = self.examples[replicas, bandits] + examples.ravel()
+        positives = np.zeros(len(replicas), dtype=np.int64)
+        due = np.arange(len(replicas))
+        while True:
+            due = due[self.positions[replicas[due], bandits[due]] < end[due]]
+            if due.size == 0:
+                break
+            r, b = replicas[due], bandits[due]
+            candidates = self.candidates[r, b]
+            uniforms = hashed_uniforms(self.key, 1, r + self.first_replica, b, candidates)
+            positives[due] += uniforms * self.cap < returns[due]
+            self.candidates[r, b] = candidates + 1
+            self.positions[r, b] += self.gaps(r, b, candidates + 1)
+        self.examples[replicas, bandits] = end
+        return positives.reshape(shape)
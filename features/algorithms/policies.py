@@ -0,0 +1,193 @@
+import numpy as np
+
+from features.algorithms.engine import Strategy, StrategyRunner, report_positives
+from features.checkpoint import RunState
+
+
+def split_evenly(batch_size: int, mask: np.ndarray) -> np.ndarray:
+    """
+    Splits a batch evenly over the bandits of every row in mask. Bandits that
+    come first in a row get one more example if the batch does not divide.
+
+    Args:
+        batch_size: Number of examples per batch.
+        mask: Boolean array of shape (simulations, bandits), with at least one bandit per row.
+    Returns:
+        Integer array of shape (simulations, bandits) with the examples per bandit.
+    """
+    counts = mask.sum(axis=1, keepdims=True)
+    rank = np.cumsum(mask, axis=1) - 1
+    examples = batch_size // counts + (rank < batch_size % counts)
+    return np.where(mask, examples, 0).astype(np.int64)
+
+
+class EmpiricalStrategy(Strategy):
+    """
+    Base of strategies that decide on the empirical returns of the bandits,
+    the reported positive examples per example. Positive examples that have
+    not been reported yet count as negative ones.
+    """
+
+    def start(self, runner: StrategyRunner, state: RunState):
+        """
+        Adds the reported positive examples of every bandit to the state.
+        """
+        shape = (runner.simulations, runner.n_bandits)
+        state.reported_positive_examples = np.zeros(shape, dtype=np.int64)
+
+    def update(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, examples: np.ndarray, positives: np.ndarray):
+        """
+        Adds the positive examples of the batch once they are reported.
+        """
+        with runner.instrument.phase('update'):
+            state.reported_positive_examples += report_positives(runner, state, positives)
+
+    def means(self, state: RunState, rows: np.ndarray=slice(None)) -> np.ndarray:
+        """
+        Gets the empirical returns of the bandits, 0 for bandits without examples.
+
+        Args:
+            state: RunState of the run.
+            rows: Simulations to get the returns of.
+        Returns:
+            Array of shape (simulations, bandits) with the empirical returns.
+        """
+        return state.reported_positive_examples[rows] / np.maximum(state.total_examples[rows], 1)
+
+    def report(self, runner: StrategyRunner, state: RunState) -> (np.ndarray, np.ndarray):
+        """
+        Reports the bandit with the highest empirical return.
+        """
+        return self.means(state).argmax(axis=1), None
+
+
+class UCB1Strategy(EmpiricalStrategy):
+    """
+    Batched UCB1: every batch goes to the bandit with the highest upper
+    confidence bound, the empirical return plus
+    exploration * sqrt(2 * ln(examples) / bandit examples).
+    Until every bandit of a simulation has examples, its batches are split
+    evenly over the bandits without examples.
+
+    Attributes:
+        exploration: Factor of the confidence width, 1 is UCB1.
+    """
+
+    def __init__(self, exploration: float=1.):
+        """
+        Initializes a new UCB1Strategy.
+
+        Args:
+            exploration: Factor of the confidence width, 1 is UCB1.
+        """
+        self.exploration = exploration
+
+    def allocate(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Gives the batch to the bandit with the highest upper confidence bound,
+        or splits it over the bandits without examples.
+        """
+        with runner.instrument.phase('allocation'):
+            total_examples = state.total_examples[active]
+            untried = total_examples == 0
+            examples = split_evenly(runner.batch_size, untried | ~untried.any(axis=1, keepdims=True))
+            tried = ~untried.any(axis=1)
+            if tried.any():
+                counts = total_examples[tried]
+                width = np.sqrt(2 * np.log(counts.sum(axis=1, keepdims=True)) / counts)
+                bounds = self.means(state, active[tried]) + self.exploration * width
+                examples[tried] = 0
+                examples[np.flatnonzero(tried), bounds.argmax(axis=1)] = runner.batch_size
+            return examples
+
+
+class SoftmaxStrategy(EmpiricalStrategy):
+    """
+    Boltzmann exploration: every batch is allocated by a multinomial draw
+    with probabilities proportional to exp(empirical return / temperature).
+
+    Attributes:
+        temperature: Return difference that makes a bandit e times as likely, lower exploits more.
+    """
+
+    def __init__(self, temperature: float=0.01):
+        """
+        Initializes a new SoftmaxStrategy.
+
+        Args:
+            temperature: Return difference that makes a bandit e times as likely, lower
+                exploits more. It is in units of returns, so it should be of the order of
+                the differences between the bandits.
+        """
+        if temperature <= 0:
+            raise ValueError(f'temperature must be positive, got {temperature}.')
+        self.temperature = temperature
+
+    def allocate(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Allocates the batch by a multinomial draw from the Boltzmann distribution
+        of the empirical returns.
+        """
+        with runner.instrument.phase('allocation'):
+            scores = self.means(state, active) / self.temperature
+            weights = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return runner.rng.multinomial(runner.batch_size, weights / weights.sum(axis=1, keepdims=True))
+
+
+class SuccessiveEliminationStrategy(EmpiricalStrategy):
+    """
+    Successive elimination: every batch is split evenly over the bandits
+    that are still in the test, and after every batch the bandits whose
+    upper confidence bound is below the highest lower confidence bound are
+    dropped. The bounds are empirical Bernstein bounds, which hold for all
+    batches with probability 1 - delta and, unlike Hoeffding bounds, shrink
+    with the variance of the returns, so low returns are told apart quickly.
+
+    Attributes:
+        delta: Probability that the best bandit is dropped.
+    """
+
+    def __init__(self, delta: float=0.05):
+        """
+        Initializes a new SuccessiveEliminationStrategy.
+
+        Args:
+            delta: Probability that the best bandit is dropped.
+        """
+        if not 0 < delta < 1:
+            raise ValueError(f'delta must be in (0, 1), got {delta}.')
+        self.delta = delta
+
+    def start(self, runner: StrategyRunner, state: RunState):
+        """
+        Adds the bandits that are still in the test to the state, all of them at first.
+        """
+        super().start(runner, state)
+        state.remaining = np.ones((runner.simulations, runner.n_bandits), dtype=bool)
+
+    def allocate(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Splits the batch evenly over the bandits that are still in the test.
+        """
+        with runner.instrument.phase('allocation'):
+            return split_evenly(runner.batch_size, state.remaining[active])
+
+    def update(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, examples: np.ndarray, positives: np.ndarray):
+        """
+        Adds the reported positive examples and drops the bandits whose upper
+        confidence bound is below the highest lower confidence bound.
+        """
+        super().update(runner, state, batch, stage, examples, positives)
+        with runner.instrument.phase('elimination'):
+            counts = np.maximum(state.total_examples, 2)
+            means = self.means(state)
+            log_term = np.log(4 * runner.n_bandits * counts ** 2 / self.delta)
+            width = np.sqrt(2 * means * (1 - means) * log_term / counts) + 7 * log_term / (3 * (counts - 1))
+            lower = np.where(state.remaining, means - width, -np.inf).max(axis=1, keepdims=True)
+            state.remaining &= means + width >= lower
+
+    def report(self, runner: StrategyRunner, state: RunState) -> (np.ndarray, np.ndarray):
+        """
+        Reports the remaining bandit with the highest empirical return.
+        """
+        return np.where(state.remaining, self.means(state), -np.inf).argmax(axis=1), None
@@ -0,0 +1,66 @@
+import numpy as np
+
+
+class BatchResult:
+    """
+    Results of one batch of every simulation of a runner.
+
+    The arrays are owned by the runner and reused between batches, so copy
+    them if they are needed after the next batch has been produced.
+
+    Attributes:
+        batch: Index of the batch.
+        bids: Array of shape (simulations, bandits) with the examples per bandit in this batch.
+        clicks: Array of shape (simulations, bandits) with the positive examples per bandit in this batch.
+        total_bids: Array of shape (simulations, bandits) with the cumulative examples per bandit.
+        total_clicks: Array of shape (simulations, bandits) with the cumulative positive examples per bandit.
+        best_bandits: Array with the bandit each simulation considers best, if the runner reports it.
+        win_probabilities: Array of shape (simulations, bandits) with the probability of each
+            bandit being the best one, if the runner reports it.
+
+    Methods:
+        mean: Gets the mean cumulative examples and positive examples across simulations.
+        variance: Gets the variance of the cumulative examples and positive examples across simulations.
+    """
+
+    def __init__(self, batch: int, bids: np.ndarray, clicks: np.ndarray, total_bids: np.ndarray, total_clicks: np.ndarray,
+                 best_bandits: np.ndarray=None, win_probabilities: np.ndarray=None):
+        """
+        Initializes a new BatchResult.
+
+        Args:
+            batch: Index of the batch.
+            bids: Examples per simulation and bandit in this batch.
+            clicks: Positive examples per simulation and bandit in this batch.
+            total_bids: Cumulative examples per simulation and bandit.
+            total_clicks: Cumulative positive examples per simulation and bandit.
+            best_bandits: Bandit each simulation considers best.
+            win_probabilities: Probability of each bandit being the best one per simulation.
+        """
+        self.batch = batch
+        self.bids = bids
+        self.clicks = clicks
+        self.total_bids = total_bids
+        self.total_clicks = total_clicks
+        self.best_bandits = best_bandits
+        self.win_probabilities = win_probabilities
+
+    def mean(self) -> (np.ndarray, np.ndarray):
+        """
+        Gets the mean cumulative examples and positive examples across simulations.
+
+        Returns:
+            The mean cumulative examples and positive examples per bandit.
+        """
+        return self.total_bids.mean(axis=0), self.total_clicks.mean(axis=0)
+
+    def variance(self) -> (np.ndarray, np.ndarray):
+        """
+        Gets the sample variance of the cumulative examples and positive
+        examples across simulations.
+
+        Returns:
+            The variance of the cumulative examples and positive examples per bandit.
+        """
+        ddof = 1 if self.total_bids.shape[0] > 1 else 0
+        return self.total_bids.var(axis=0, ddof=ddof), self.total_clicks.var(axis=0, ddof=ddof)
@@ -0,0 +1,96 @@
+import numpy as np
+from scipy import stats
+
+
+class AliasTable:
+    """
+    Walker's alias table for drawing from a discrete distribution in
+    constant time per draw, independent of the number of categories.
+
+    Attributes:
+        probabilities: Probability of keeping the drawn column.
+        aliases: Category drawn instead when the column is not kept.
+
+    Methods:
+        draw: Draws n categories.
+    """
+
+    def __init__(self, weights: np.ndarray):
+        """
+        Builds the alias table with Vose's method.
+
+        Args:
+            weights: Non-negative weights of the categories, they do not need to sum up to one.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        self.probabilities = np.ones(n)
+        self.aliases = np.arange(n)
+
+        small = list(np.flatnonzero(scaled < 1.))
+        large = list(np.flatnonzero(scaled >= 1.))
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1. - scaled[less]
+            if scaled[more] < 1.:
+                small.append(more)
+            else:
+                large.append(more)
+        # Whatever is left is 1 up to rounding errors and always keeps its column.
+
+    def draw(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draws n categories.
+
+        Args:
+            n: Number of draws.
+            rng: Random number generator to draw with.
+        Returns:
+            Array with the drawn categories.
+        """
+        columns = rng.integers(len(self.probabilities), size=n)
+        keep = rng.random(n) < self.probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+
+def candidate_bandits(alpha: np.ndarray, beta: np.ndarray, tail: float) -> np.ndarray:
+    """
+    Finds the bandits that can still realistically win a Thompson sampling
+    draw. A bandit is dropped when the upper tail / 2 quantile of its Beta
+    posterior is below the largest lower tail / 2 quantile of all bandits. By
+    the union bound over the two quantiles, its probability of beating the
+    bandit with that lower quantile, and so of being the best one, is then
+    below tail.
+
+    Args:
+        alpha: Alpha parameters, the bandits are along the last axis.
+        beta: Beta parameters, the bandits are along the last axis.
+        tail: Bound on the probability of being the best one of the dropped bandits.
+    Returns:
+        Boolean array that is True for the bandits that are kept.
+    """
+    lower = stats.beta.ppf(tail / 2, alpha, beta)
+    upper = stats.beta.isf(tail / 2, alpha, beta)
+    return upper >= lower.max(axis=-1, keepdims=True)
+
+
+def keep_top_k(probabilities: np.ndarray, k: int) -> np.ndarray:
+    """
+    Keeps the k largest probabilities along the last axis, sets the others
+    to zero and renormalizes.
+
+    Args:
+        probabilities: Probabilities, the bandits are along the last axis.
+        k: Number of bandits to keep.
+    Returns:
+        The pruned probabilities.
+    """
+    if k >= probabilities.shape[-1]:
+        return probabilities
+    pruned = np.zeros_like(probabilities)
+    top = np.argpartition(probabilities, -k, axis=-1)[..., -k:]
+    np.put_along_axis(pruned, top, np.take_along_axis(probabilities, top, axis=-1), axis=-1)
+    return pruned / pruned.sum(axis=-1, keepdims=True)
@@ -0,0 +1,198 @@
+import hashlib
+from typing import Callable, Dict, List, Sequence, Union
+
+import numpy as np
+
+
+class ReturnSchedule:
+    """
+    Average returns of every bandit per batch. Rows are only evaluated when
+    a batch asks for them, so an array schedule may be memory-mapped and a
+    callable schedule never materializes the whole horizon.
+
+    Attributes:
+        bandit_returns: List of average returns per bandit, used when there is no schedule.
+        schedule: Array of shape (batches, bandits), a callable that maps a
+            batch index to the returns of that batch, or None for constant returns.
+
+    Methods:
+        constant: Whether the returns are the same for every batch.
+        fingerprint: Identifies the returns of a number of batches, e.g. for cache keys.
+    """
+
+    def __init__(self, bandit_returns: List[float], schedule: Union[np.ndarray, Callable[[int], Sequence[float]]]=None):
+        """
+        Initializes a new ReturnSchedule.
+
+        Args:
+            bandit_returns: List of average returns per bandit.
+            schedule: Array of shape (batches, bandits), a callable that maps a batch
+                index to the returns of that batch, or None for constant returns.
+        """
+        self.bandit_returns = np.asarray(bandit_returns, dtype=np.float64)
+        if schedule is not None and not callable(schedule):
+            schedule = np.asanyarray(schedule)
+            if schedule.ndim != 2 or schedule.shape[1] != len(self.bandit_returns):
+                raise ValueError(f'Return schedules need shape (batches, {len(self.bandit_returns)}), got {schedule.shape}.')
+        self.schedule = schedule
+
+    def __repr__(self):
+        if self.schedule is None:
+            return 'ReturnSchedule(None)'
+        if callable(self.schedule):
+            return f'ReturnSchedule({self.schedule!r})'
+        digest = hashlib.sha256(np.ascontiguousarray(self.schedule, dtype=np.float64).tobytes()).hexdigest()
+        return f'ReturnSchedule(array{self.schedule.shape}, sha256={digest})'
+
+    def __call__(self, batch: int) -> np.ndarray:
+        """
+        Gets the average returns of every bandit in a batch.
+
+        Args:
+            batch: Index of the batch.
+        Returns:
+            Array with the average return per bandit.
+        """
+        if self.schedule is None:
+            return self.bandit_returns
+        if callable(self.schedule):
+            returns = np.asarray(self.schedule(batch), dtype=np.float64)
+        else:
+            if batch >= len(self.schedule):
+                raise ValueError(f'The return schedule has {len(self.schedule)} batches, batch {batch} was requested.')
+            returns = np.asarray(self.schedule[batch], dtype=np.float64)
+        if returns.shape != self.bandit_returns.shape or (returns < 0).any() or (returns > 1).any():
+            raise ValueError(f'Returns of batch {batch} must be {len(self.bandit_returns)} probabilities, got {returns}.')
+        return returns
+
+    def constant(self) -> bool:
+        """
+        Whether the returns are the same for every batch.
+        """
+        return self.schedule is None
+
+    def fingerprint(self, batches: int) -> str:
+        """
+        Identifies the returns of the first batches. The repr of a callable
+        schedule may hold a memory address, so callables are identified by
+        their qualified name and a hash of the returns they give.
+
+        Args:
+            batches: Number of batches.
+        Returns:
+            String that only depends on the returns of the batches.
+        """
+        if not callable(self.schedule):
+            return repr(self)
+        returns = np.asarray([self(batch) for batch in range(batches)])
+        digest = hashlib.sha256(np.ascontiguousarray(returns, dtype=np.float64).tobytes()).hexdigest()
+        name = getattr(self.schedule, '__qualname__', type(self.schedule).__qualname__)
+        return f'ReturnSchedule({name}, batches={batches}, sha256={digest})'
+
+
+class Diurnal:
+    """
+    Returns that follow a daily cycle: every bandit's return is scaled by
+    1 + amplitude * sin(2 pi (batch + shift) / period).
+
+    Attributes:
+        bandit_returns: List of average returns per bandit.
+        amplitude: Relative size of the swing, between 0 and 1.
+        period: Number of batches in a day.
+        shift: Batch of the day the test starts at.
+    """
+
+    def __init__(self, bandit_returns: List[float], amplitude: float=0.3, period: int=24, shift: int=0):
+        self.bandit_returns = np.asarray(bandit_returns, dtype=np.float64)
+        self.amplitude = amplitude
+        self.period = period
+        self.shift = shift
+
+    def __repr__(self):
+        return f'Diurnal({self.bandit_returns.tolist()}, amplitude={self.amplitude}, period={self.period}, shift={self.shift})'
+
+    def __call__(self, batch: int) -> np.ndarray:
+        scale = 1. + self.amplitude * np.sin(2 * np.pi * (batch + self.shift) / self.period)
+        return np.clip(self.bandit_returns * scale, 0., 1.)
+
+
+class Decay:
+    """
+    Returns that fade over the life of a campaign: every bandit's return
+    moves from its initial value towards its final value with a half-life.
+
+    Attributes:
+        bandit_returns: List of initial average returns per bandit.
+        final_returns: List of average returns per bandit the returns decay to.
+        half_life: Number of batches after which half of the difference is gone.
+    """
+
+    def __init__(self, bandit_returns: List[float], final_returns: List[float], half_life: float=100.):
+        self.bandit_returns = np.asarray(bandit_returns, dtype=np.float64)
+        self.final_returns = np.asarray(final_returns, dtype=np.float64)
+        self.half_life = half_life
+
+    def __repr__(self):
+        return f'Decay({self.bandit_returns.tolist()}, {self.final_returns.tolist()}, half_life={self.half_life})'
+
+    def __call__(self, batch: int) -> np.ndarray:
+        remaining = 0.5 ** (batch / self.half_life)
+        return self.final_returns + (self.bandit_returns - self.final_returns) * remaining
+
+
+class Forgetting:
+    """
+    Evidence of (simulations, bandits) arrays that forgets old batches,
+    either by discounting it every batch, by only keeping the last window
+    batches, or both. Without discount and window it simply accumulates.
+
+    Attributes:
+        discount: Factor the evidence is multiplied by before every batch.
+        window: Number of most recent batches that are kept, None keeps all.
+        evidence: Current evidence per field.
+
+    Methods:
+        step: Adds the updates of a batch and returns the evidence.
+    """
+
+    def __init__(self, discount: float=1., window: int=None, **shapes: tuple):
+        """
+        Initializes a new Forgetting without evidence.
+
+        Args:
+            discount: Factor the evidence is multiplied by before every batch, between 0 and 1.
+            window: Number of most recent batches that are kept, None keeps all.
+            shapes: Names of the fields and the shapes of their arrays.
+        """
+        if not 0 < discount <= 1:
+            raise ValueError(f'discount must be in (0, 1], got {discount}.')
+        if window is not None and window < 1:
+            raise ValueError(f'window must be at least 1, got {window}.')
+        self.discount = discount
+        self.window = window
+        self.evidence = {name: np.zeros(shape) for name, shape in shapes.items()}
+        # With a window, the updates of the last window batches are kept in a ring buffer,
+        # already discounted to the batch they will leave the window at.
+        self.history = {name: np.zeros((window,) + tuple(shape)) for name, shape in shapes.items()} if window else {}
+        self.position = 0
+
+    def step(self, **updates: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Adds the updates of a batch and returns the evidence.
+
+        Args:
+            updates: Update per field.
+        Returns:
+            Dictionary with the evidence per field.
+        """
+        for name, update in updates.items():
+            evidence = self.evidence[name]
+            if self.discount < 1:
+                evidence *= self.discount
+            if self.window:
+                evidence -= self.history[name][self.position]
+                self.history[name][self.position] = update * self.discount ** self.window
+            evidence += update
+        if self.window:
+            self.position = (self.position + 1) % self.window
+        return self.evidence
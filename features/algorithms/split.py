@@ -1,10 +1,27 @@
-from typing import List
+from typing import Callable, List, Sequence, Union
 
 import numpy as np
-import pandas as pd
 
+from features.algorithms.engine import MAX_CHUNK_ELEMENTS, Strategy, StrategyRunner
+from features.algorithms.outcomes import BinomialOutcomes, CommonOutcomes
+from features.algorithms.stopping import StoppingRule
+from features.checkpoint import RunState
+from features.instrumentation import Instrument
 
-class SplitTestRunner:
+
+class SplitStrategy(Strategy):
+    """
+    Strategy of a split test: every bandit gets the same share of every batch.
+    """
+
+    def allocate(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Gives every bandit of every active simulation the same share of the batch.
+        """
+        return np.full((len(active), runner.n_bandits), runner.batch_size // runner.n_bandits, dtype=np.int64)
+
+
+class SplitTestRunner(StrategyRunner):
     """
     Class that is used to run simulations of split tests.
 
@@ -13,13 +30,29 @@ class SplitTestRunner:
         batch_size: Number of examples per batch.
         batches: Number of batches.
         simulations: Number of simulations.
+        chunk_size: Number of simulations drawn at once.
+        return_schedule: ReturnSchedule with the average returns per bandit of every batch.
+        outcomes: Source of the positive examples, e.g. CommonOutcomes to compare strategies on the same outcomes.
+        simulation_clicks: Total positive examples of every simulation at the end of the run.
+        collect_statistics: Whether the distribution of the results across simulations is collected.
+        statistics: RunStatistics of the last run, if collected.
+        stopping_rule: Rule that decides when a simulation stops.
+        stopping_batches: Batch at which each simulation stopped, -1 if it did not.
+        state: RunState of the last batch by batch run.
+        instrument: Instrument that records the time spent in each phase of the run.
+        rng: Random number generator used for all draws of the run.
     
     Methods:
-        init_bandits: Prepares everything for new simulation.
         run: Runs the simulations and tracks performance.
+        resume: Continues a run from a checkpoint or extends a finished run.
+        iter_batches: Runs all simulations batch by batch and yields the results of every batch.
+        build_frames: Builds df_bids and df_clicks from the accumulated totals.
     """
 
-    def __init__(self, bandit_returns: List[float], batch_size: int=1000, batches: int=10, simulations: int=100):
+    def __init__(self, bandit_returns: List[float], batch_size: int=1000, batches: int=10, simulations: int=100, chunk_size: int=None,
+                 seed: Union[int, np.random.Generator]=None, stopping_rule: StoppingRule=None,
+                 instrument: Instrument=None, return_schedule: Union[np.ndarray, Callable[[int], Sequence[float]]]=None,
+                 outcomes: Union[BinomialOutcomes, CommonOutcomes]=None, collect_statistics: bool=False):
         """
         Initializes a new RunSplitTest class with passed parameters.
 
@@ -28,46 +61,68 @@ class SplitTestRunner:
             batch_size: Number of examples per batch.
             batches: Number of batches.
             simulations: Number of simulations.
+            chunk_size: Number of simulations drawn at once. If None, it is chosen
+                so that a chunk holds at most MAX_CHUNK_ELEMENTS draws.
+            seed: Seed or random number generator used for all draws of the run.
+            stopping_rule: Rule that decides when a simulation stops, e.g. a SequentialTest.
+                Once stopped, a simulation gets no more examples.
+            instrument: Instrument that records the time spent in each phase of the run,
+                e.g. a Recorder. Nothing is recorded by default.
+            return_schedule: Average returns per bandit of every batch, as an array of shape
+                (batches, bandits) or a callable that maps a batch index to the returns of
+                that batch, e.g. a Diurnal. If None, bandit_returns are used for every batch.
+            outcomes: Source of the positive examples. CommonOutcomes with the same seed give
+                every strategy the same outcomes per replica. If None, they are independent
+                binomial draws.
+            collect_statistics: If True, the variance, extremes and quantiles of the results of
+                every batch and bandit across simulations are collected in statistics.
         """
 
-        self.bandit_returns = bandit_returns
-        self.n_bandits = len(bandit_returns)
-        self.bandits = list(range(self.n_bandits))
-        self.bandit_positive_examples = [0] * self.n_bandits
-        self.bandit_total_examples = [0] * self.n_bandits
+        super().__init__(bandit_returns, SplitStrategy(), batch_size=batch_size, batches=batches, simulations=simulations,
+                         seed=seed, stopping_rule=stopping_rule, instrument=instrument, return_schedule=return_schedule,
+                         outcomes=outcomes, collect_statistics=collect_statistics)
+        if chunk_size is None:
+            chunk_size = max(1, MAX_CHUNK_ELEMENTS // max(1, self.batches * self.n_bandits))
+        self.chunk_size = chunk_size
 
-        self.batch_size = batch_size
-        self.batches = batches
-        self.simulations = simulations
-
-        self.df_bids = pd.DataFrame(columns=self.bandit_returns)
-        self.df_clicks = pd.DataFrame(columns=self.bandit_returns)
- 
-    def init_bandits(self):
-        """
-        Prepares everything for new simulation.
-        """
-
-        self.bandit_positive_examples = [0] * self.n_bandits
-        self.bandit_total_examples = [0] * self.n_bandits
-    
-    def run(self):
+    def run(self, checkpoint: str=None, checkpoint_every: int=10):
         """
         Runs the simulations and tracks performance.
+
+        A split test has no adaptive state, so all (simulations, batches, bandits)
+        binomial draws are made at once, chunk_size simulations at a time.
+        With a stopping rule, returns that change between batches, common
+        outcomes, collected statistics or a checkpoint the simulations are run
+        batch by batch instead.
+
+        Args:
+            checkpoint: If set, the simulations are run batch by batch and saved to this
+                file every checkpoint_every batches and when they end.
+            checkpoint_every: Number of batches between checkpoints.
         """
 
-        for j in range(self.simulations):
-            self.init_bandits()
-            for i in range(self.batches):
-                examples = self.batch_size // self.n_bandits
-                for idx in self.bandits:
-                    self.bandit_total_examples[idx] += examples
-                    self.bandit_positive_examples[idx] += np.random.binomial(examples, self.bandit_returns[idx])
-                if self.df_bids.shape[0] < self.batches:
-                    self.df_bids.loc[i] = self.bandit_total_examples
-                    self.df_clicks.loc[i] = self.bandit_positive_examples
-                else:
-                    self.df_bids.loc[i] += self.bandit_total_examples
-                    self.df_clicks.loc[i] += self.bandit_positive_examples
-        self.df_bids /= self.simulations
-        self.df_clicks /= self.simulations
+        if (self.stopping_rule is not None or not self.return_schedule.constant()
+                or not isinstance(self.outcomes, BinomialOutcomes) or self.collect_statistics or checkpoint is not None):
+            self.run_vectorized(checkpoint, checkpoint_every)
+            return
+
+        examples = self.batch_size // self.n_bandits
+        returns = np.asarray(self.bandit_returns, dtype=np.float64)
+
+        self.statistics = None
+        self.state = None
+        positive_examples = np.zeros((self.batches, self.n_bandits), dtype=np.int64)
+        self.simulation_clicks = np.zeros(self.simulations, dtype=np.int64)
+        for start in range(0, self.simulations, self.chunk_size):
+            size = min(self.chunk_size, self.simulations - start)
+            with self.instrument.phase('binomial_draws'):
+                draws = self.rng.binomial(examples, returns, (size, self.batches, self.n_bandits))
+            with self.instrument.phase('bookkeeping'):
+                positive_examples += draws.sum(axis=0)
+                self.simulation_clicks[start:start + size] = draws.sum(axis=(1, 2))
+        self.instrument.count('batches', self.batches)
+
+        self.clicks[:] = positive_examples.cumsum(axis=0)
+        self.bids[:] = examples * self.simulations * np.arange(1, self.batches + 1)[:, None]
+        with self.instrument.phase('build_frames'):
+            self.build_frames()
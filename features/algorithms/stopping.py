@@ -0,0 +1,167 @@
+import numpy as np
+from scipy import stats
+
+from features.algorithms.results import BatchResult
+
+
+class StoppingRule:
+    """
+    Base class of the rules that decide when a simulation has converged
+    and can stop.
+
+    Methods:
+        start: Prepares the rule for a new run.
+        resume: Prepares the rule for a run that is continued.
+        check: Checks which simulations can stop after a batch.
+    """
+
+    def start(self, simulations: int, bandits: int, batches: int):
+        """
+        Prepares the rule for a new run.
+
+        Args:
+            simulations: Number of simulations.
+            bandits: Number of bandits.
+            batches: Maximum number of batches.
+        """
+
+    def resume(self, batches: int):
+        """
+        Prepares the rule for a run that is continued, e.g. from a checkpoint
+        or extended to more batches.
+
+        Args:
+            batches: Maximum number of batches of the continued run.
+        """
+
+    def check(self, result: BatchResult) -> np.ndarray:
+        """
+        Checks which simulations can stop after a batch.
+
+        Args:
+            result: Results of the batch.
+        Returns:
+            Boolean array with one entry per simulation.
+        """
+        raise NotImplementedError
+
+
+class BestArmProbability(StoppingRule):
+    """
+    Stops a Thompson sampling simulation once the posterior probability
+    that one bandit is the best one is above a threshold. The probabilities
+    are the ones of the posteriors updated with the batch. Needs a strategy
+    that reports win probabilities, like ThompsonStrategy; with any other
+    strategy check raises a ValueError.
+
+    Attributes:
+        threshold: Probability the best bandit needs to reach.
+    """
+
+    def __init__(self, threshold: float=0.95):
+        """
+        Initializes a new BestArmProbability rule.
+
+        Args:
+            threshold: Probability the best bandit needs to reach.
+        """
+        self.threshold = threshold
+
+    def __repr__(self):
+        return f'BestArmProbability(threshold={self.threshold})'
+
+    def check(self, result: BatchResult) -> np.ndarray:
+        if result.win_probabilities is None:
+            raise ValueError('BestArmProbability needs a runner that reports win probabilities.')
+        return result.win_probabilities.max(axis=1) >= self.threshold
+
+
+class SequentialTest(StoppingRule):
+    """
+    Stops a simulation once the bandit with the highest observed return is
+    significantly better than the runner-up. The one sided z test is done
+    after every batch at level alpha / ((bandits - 1) * batches), a
+    Bonferroni correction over the comparisons and the repeated looks.
+    A run with a single bandit never stops.
+
+    Attributes:
+        alpha: Type one error of the whole sequential test.
+        bandits: Number of bandits of the run.
+        level: Level of the test after every batch.
+    """
+
+    def __init__(self, alpha: float=0.01):
+        """
+        Initializes a new SequentialTest rule.
+
+        Args:
+            alpha: Type one error of the whole sequential test.
+        """
+        self.alpha = alpha
+        self.bandits = None
+        self.level = alpha
+
+    def __repr__(self):
+        return f'SequentialTest(alpha={self.alpha})'
+
+    def start(self, simulations: int, bandits: int, batches: int):
+        self.bandits = bandits
+        self.resume(batches)
+
+    def resume(self, batches: int):
+        self.level = self.alpha / (max(1, self.bandits - 1) * batches)
+
+    def check(self, result: BatchResult) -> np.ndarray:
+        bids = result.total_bids
+        clicks = result.total_clicks
+        if bids.shape[1] < 2:
+            return np.zeros(bids.shape[0], dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.where(bids > 0, clicks / bids, 0.)
+            order = np.argsort(rates, axis=1)
+            rows = np.arange(bids.shape[0])
+            best, second = order[:, -1], order[:, -2]
+            n1, n2 = bids[rows, second], bids[rows, best]
+            p1, p2 = rates[rows, second], rates[rows, best]
+            p_star = (p1 * n1 + p2 * n2) / (n1 + n2)
+            z = (p2 - p1) / np.sqrt(p_star * (1 - p_star) * (1. / n1 + 1. / n2))
+        return np.nan_to_num(stats.norm.sf(z), nan=1.) < self.level
+
+
+class StableBestArm(StoppingRule):
+    """
+    Stops a simulation once the bandit it considers best has not changed
+    for a number of consecutive batches. Runners that do not report their
+    best bandits are judged by the highest observed return.
+
+    Attributes:
+        patience: Number of consecutive batches the best bandit has to stay the same.
+    """
+
+    def __init__(self, patience: int=10):
+        """
+        Initializes a new StableBestArm rule.
+
+        Args:
+            patience: Number of consecutive batches the best bandit has to stay the same.
+        """
+        self.patience = patience
+        self.best_bandits = None
+        self.streaks = None
+
+    def __repr__(self):
+        return f'StableBestArm(patience={self.patience})'
+
+    def start(self, simulations: int, bandits: int, batches: int):
+        self.best_bandits = np.full(simulations, -1)
+        self.streaks = np.zeros(simulations, dtype=np.int64)
+
+    def check(self, result: BatchResult) -> np.ndarray:
+        best_bandits = result.best_bandits
+        if best_bandits is None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                best_bandits = np.nan_to_num(result.total_clicks / result.total_bids).argmax(axis=1)
+        same = best_bandits == self.best_bandits
+        self.streaks = np.where(same, self.streaks + 1, 1)
+        self.best_bandits = best_bandits
+        return self.streaks >= self.patience
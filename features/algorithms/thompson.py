@@ -1,11 +1,18 @@
-from random import random
-from typing import List, Dict
+from bisect import bisect_right
+from typing import Callable, Dict, List, Sequence, Union
 from collections import Counter
 
 import numpy as np
-import pandas as pd
+from scipy import integrate, stats
 
-from features.algorithms.bandits import BetaBandit
+from features.algorithms.bandits import ArmTable
+from features.algorithms.engine import MAX_CHUNK_ELEMENTS, Strategy, StrategyRunner, report_positives
+from features.algorithms.outcomes import BinomialOutcomes, CommonOutcomes
+from features.algorithms.sampling import AliasTable, candidate_bandits, keep_top_k
+from features.algorithms.schedules import Forgetting
+from features.algorithms.stopping import StoppingRule
+from features.checkpoint import RunState
+from features.instrumentation import Instrument, NULL_INSTRUMENT
 
 
 class WeightedChoiceFailed(Exception):
@@ -39,32 +46,66 @@ class ThompsonSampling:
     Attributes:
         sample_size: Number of examples sampled in each batch.
         batch_size: Number of examples per batch.
+        rng: Random number generator used for all draws of the test.
+        instrument: Instrument that records the time spent in each phase.
+        discount: Factor the examples are multiplied by before every batch.
+        window: Number of most recent batches the posteriors are built from.
+        arms: ArmTable with the alpha and beta parameters and priors of every bandit.
+        forgetting: Forgetting with the examples of every bandit, for discounted or sliding-window posteriors.
     
     Methods:
-        add_bandit: Adds a new BetaBandit to the test.
-        update_bandit: Updates the priors of the BetaBandit at index idx.
+        add_bandit: Adds a new bandit to the test.
+        update_bandit: Updates the priors of the bandit at index idx.
+        update_batch: Updates all bandits with the examples of one batch, forgetting old ones.
         generate_relative_frequencies: Generates relative frequencies for each bandit in the test that will later be used in the weighted lottery.
+        exact_relative_frequencies: Calculates the probability of each bandit being the best one by numerical integration.
         weighted_choice: Performes a run of the weighted lottery using relative frequencies as weights, and returns the index of the bandit that was drawn.
+        allocate_batch: Draws the number of examples each bandit gets in the running batch in one multinomial draw.
         bandit_batch: Determines how many times each bandit gets used in the running batch.
     """
 
-    def __init__(self, sample_size: int=1000, batch_size: int=1000):
+    def __init__(self, sample_size: int=1000, batch_size: int=1000, batched: bool=True, exact: bool=False,
+                 seed: Union[int, np.random.Generator]=None, prune: float=0., top_k: int=None, instrument: Instrument=None,
+                 discount: float=1., window: int=None):
         """
         Initializes a new instance of ThompsonSampling with the passed parmeters
 
         Args:
             sample_size: Number of examples sampled in each batch.
             batch_size: Number of examples per batch.
+            batched: If True, the whole batch is allocated with a single multinomial
+                draw instead of running the weighted lottery once per example.
+            exact: If True, relative frequencies are calculated by numerical
+                integration instead of sampling. Only sensible for a small number of bandits.
+            seed: Seed or random number generator used for all draws of the test.
+            prune: If positive, bandits whose probability of being the best one is
+                provably below prune are not sampled and get no examples.
+            top_k: If set, only the top_k bandits by relative frequency get examples.
+            instrument: Instrument that records the time spent in each phase. Nothing is recorded by default.
+            discount: Factor the examples are multiplied by before every batch of update_batch,
+                1 keeps all examples.
+            window: If set, the posteriors are only built from the examples of the last window
+                batches of update_batch.
         """
 
+        self.rng = np.random.default_rng(seed)
+        self.instrument = instrument or NULL_INSTRUMENT
         self.sample_size = sample_size
         self.batch_size = batch_size
-        self.bandits = list()
+        self.batched = batched
+        self.exact = exact
+        self.prune = prune
+        self.top_k = top_k
+        self.discount = discount
+        self.window = window
+        self.arms = ArmTable(alpha=np.float64, beta=np.float64, alpha_prior=np.float64, beta_prior=np.float64)
+        self.forgetting = None
         self.relative_frequencies = list()
+        self.cumulative_frequencies = list()
     
     def add_bandit(self, positive_examples: int=0, negative_examples: int=0, alpha_prior: float=1., beta_prior: float=1.):
         """
-        Adds a new BetaBandit to the test.
+        Adds a new bandit to the test, with the same parameters a BetaBandit would get.
 
         Args:
             positive_examples: Number of positive examples.
@@ -73,11 +114,12 @@ class ThompsonSampling:
             beta_prior: Prior for the beta parameter of the underlying beta distribution.
         """
 
-        self.bandits.append(BetaBandit(positive_examples, negative_examples, alpha_prior, beta_prior))
+        self.arms.append(alpha=positive_examples + alpha_prior, beta=negative_examples + beta_prior,
+                         alpha_prior=alpha_prior, beta_prior=beta_prior)
 
     def update_bandit(self, idx: int, positive_examples: int=0, negative_examples: int=0):
         """
-        Updates the priors of the BetaBandit at index idx.
+        Updates the priors of the bandit at index idx.
 
         Args:
             idx: Index of the bandit to be updated.
@@ -85,7 +127,35 @@ class ThompsonSampling:
             negative_examples: Number of negative examples.
         """
 
-        self.bandits[idx].update(positive_examples, negative_examples)
+        self.arms.update(idx, alpha=positive_examples, beta=negative_examples)
+
+    def update_batch(self, positive_examples: np.ndarray, negative_examples: np.ndarray):
+        """
+        Updates all bandits with the examples of one batch. With a discount or
+        a window, the examples of earlier batches are discounted or dropped
+        first, also for the bandits without examples in this batch.
+
+        Args:
+            positive_examples: Positive examples of every bandit in the batch.
+            negative_examples: Negative examples of every bandit in the batch.
+        """
+
+        alpha, beta = self.arms['alpha'], self.arms['beta']
+        if self.discount == 1 and self.window is None:
+            alpha += positive_examples
+            beta += negative_examples
+            return
+        if self.forgetting is None:
+            shape = (len(self.arms),)
+            self.forgetting = Forgetting(self.discount, self.window, alpha=shape, beta=shape)
+            # Examples the bandits were added with are kept until they are discounted.
+            self.forgetting.evidence['alpha'] += alpha - self.arms['alpha_prior']
+            self.forgetting.evidence['beta'] += beta - self.arms['beta_prior']
+        elif self.forgetting.evidence['alpha'].shape[0] != len(self.arms):
+            raise ValueError('Bandits cannot be added after the first update_batch of a discounted or sliding-window test.')
+        evidence = self.forgetting.step(alpha=positive_examples, beta=negative_examples)
+        np.add(self.arms['alpha_prior'], evidence['alpha'], out=alpha)
+        np.add(self.arms['beta_prior'], evidence['beta'], out=beta)
 
     def generate_relative_frequencies(self):
         """
@@ -93,33 +163,85 @@ class ThompsonSampling:
         that will later be used in the weighted lottery.
         """
 
-        bandit_samples = dict()
-        self.relative_frequencies = [0] * len(self.bandits)
-        for i in range(len(self.bandits)):
-            bandit = self.bandits[i]
-            bandit_samples[i] = bandit.sample(self.sample_size)
-        bandit_df = pd.DataFrame(bandit_samples)
-        for i in range(bandit_df.shape[0]):
-            self.relative_frequencies[bandit_df.iloc[i].idxmax()] += 1. / self.sample_size
-    
+        if self.exact:
+            frequencies = np.array(self.exact_relative_frequencies())
+        else:
+            n_bandits = len(self.arms)
+            alpha, beta = self.arms['alpha'], self.arms['beta']
+            candidates = np.arange(n_bandits)
+            if self.prune > 0:
+                candidates = np.flatnonzero(candidate_bandits(alpha, beta, self.prune))
+            samples = self.rng.beta(alpha[candidates, None], beta[candidates, None], (len(candidates), self.sample_size))
+            self.instrument.count('beta_draws', samples.size)
+            wins = np.zeros(n_bandits, dtype=np.int64)
+            wins[candidates] = np.bincount(samples.argmax(axis=0), minlength=len(candidates))
+            frequencies = wins / self.sample_size
+
+        if self.top_k is not None:
+            frequencies = keep_top_k(frequencies, self.top_k)
+        self.relative_frequencies = list(frequencies)
+        self.cumulative_frequencies = list(np.cumsum(frequencies))
+
+    def exact_relative_frequencies(self) -> List[float]:
+        """
+        Calculates the probability of each bandit being the best one by
+        numerically integrating pdf_i(x) * prod_{j != i} cdf_j(x) over [0, 1].
+
+        Returns:
+            List of probabilities that each bandit has the highest return.
+        """
+
+        distributions = [stats.beta(alpha, beta) for alpha, beta in zip(self.arms['alpha'], self.arms['beta'])]
+
+        def integrand(x: float, i: int) -> float:
+            value = distributions[i].pdf(x)
+            for j, distribution in enumerate(distributions):
+                if j != i:
+                    value *= distribution.cdf(x)
+            return value
+
+        probabilities = list()
+        for i, distribution in enumerate(distributions):
+            # Integrate only where the bandit's density has mass, which keeps
+            # quad accurate for the very peaked posteriors of long tests.
+            low, high = distribution.ppf([1e-12, 1. - 1e-12])
+            probabilities.append(integrate.quad(integrand, low, high, args=(i,), limit=200)[0])
+        total = sum(probabilities)
+        return [p / total for p in probabilities]
+
     def weighted_choice(self) -> int:
         """
         Performes a run of the weighted lottery using relative frequencies as
-        weights, and returns the index of the bandit that was drawn.
+        weights, and returns the index of the bandit that was drawn. The
+        bandit is found by binary search over the cumulative frequencies.
 
         Returns:
             The index of the bandit that won the weighted lottery.
         """
 
-        r = random()
-
-        for i in range(len(self.relative_frequencies)):
-            r -= self.relative_frequencies[i]
-            if r < 0:
-                return i
+        r = self.rng.random()
+        i = bisect_right(self.cumulative_frequencies, r)
+        if i < len(self.relative_frequencies):
+            return i
 
         raise WeightedChoiceFailed(self.relative_frequencies)
 
+    def allocate_batch(self) -> np.ndarray:
+        """
+        Draws the number of examples each bandit gets in the running batch
+        in one multinomial draw over the relative frequencies. This has the
+        same distribution as running the weighted lottery batch_size times.
+
+        Returns:
+            An array with the number of examples per bandit.
+        """
+
+        weights = np.asarray(self.relative_frequencies, dtype=np.float64)
+        total = weights.sum()
+        if not total > 0:
+            raise WeightedChoiceFailed(self.relative_frequencies)
+        return self.rng.multinomial(self.batch_size, weights / total)
+
     def bandit_batch(self) -> Dict[int, int]:
         """
         Determines how many times each bandit gets used in the running batch.
@@ -129,13 +251,212 @@ class ThompsonSampling:
             applied in the running batch.
         """
 
-        self.generate_relative_frequencies()
-        strategy = [self.weighted_choice() for _ in range(self.batch_size)]
-        counter = Counter(strategy)
+        with self.instrument.phase('beta_sampling'):
+            self.generate_relative_frequencies()
+        if self.batched:
+            with self.instrument.phase('allocation'):
+                counts = self.allocate_batch()
+            return {int(i): int(counts[i]) for i in np.flatnonzero(counts)}
+        if sum(self.relative_frequencies) <= 0:
+            raise WeightedChoiceFailed(self.relative_frequencies)
+        with self.instrument.phase('weighted_lottery'):
+            # One lottery per example, drawn from an alias table in constant time each.
+            strategy = AliasTable(self.relative_frequencies).draw(self.batch_size, self.rng)
+            counter = Counter(strategy.tolist())
         return dict(counter)
 
 
-class ThompsonSamplingRunner:
+class ThompsonStrategy(Strategy):
+    """
+    Strategy of Thompson sampling. Alpha and beta of every bandit in every
+    simulation are kept in (simulations, bandits) arrays, and each batch is
+    allocated by a multinomial draw from the relative frequencies with which
+    each bandit's Beta samples win.
+
+    Attributes:
+        alpha_priors: List of alpha priors for each bandit.
+        beta_priors: List of beta priors for each bandit.
+        sample_size: Sample size of BetaBandit pulls per batch.
+        chunk_size: Number of simulations whose Beta samples are drawn at once, None to derive it.
+        prune: Tail probability below which bandits are not sampled.
+        top_k: Number of bandits per simulation that get examples in a batch.
+        discount: Factor the posteriors' examples are multiplied by before every batch.
+        window: Number of most recent batches the posteriors are built from.
+
+    Methods:
+        simulations_per_chunk: Gets the number of simulations whose Beta samples are drawn at once.
+        win_probabilities: Estimates the probability of each bandit being the best one in every simulation.
+    """
+
+    def __init__(self, alpha_priors: List[float], beta_priors: List[float], sample_size: int=1000, chunk_size: int=None,
+                 prune: float=0., top_k: int=None, discount: float=1., window: int=None):
+        """
+        Initializes a new ThompsonStrategy.
+
+        Args:
+            alpha_priors: List of alpha priors for each bandit.
+            beta_priors: List of beta priors for each bandit.
+            sample_size: Sample size of BetaBandit pulls per batch.
+            chunk_size: Number of simulations whose Beta samples are drawn at once. If None,
+                it is chosen so that a chunk holds at most MAX_CHUNK_ELEMENTS draws.
+            prune: If positive, bandits whose probability of being the best one is provably
+                below prune are not sampled.
+            top_k: If set, only the top_k bandits of each simulation by relative frequency get examples.
+            discount: Factor the posteriors' examples are multiplied by before every batch,
+                1 keeps all examples.
+            window: If set, the posteriors are only built from the examples of the last window batches.
+        """
+        self.alpha_priors = alpha_priors
+        self.beta_priors = beta_priors
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.prune = prune
+        self.top_k = top_k
+        self.discount = discount
+        self.window = window
+
+    def start(self, runner: StrategyRunner, state: RunState):
+        """
+        Adds the posteriors, their forgetting evidence and the win probabilities
+        of the first batch to the state.
+        """
+        shape = (runner.simulations, runner.n_bandits)
+        state.chunk_size = self.simulations_per_chunk(runner)
+        state.alpha = np.tile(np.asarray(self.alpha_priors, dtype=np.float64), (runner.simulations, 1))
+        state.beta = np.tile(np.asarray(self.beta_priors, dtype=np.float64), (runner.simulations, 1))
+        state.forgetting = Forgetting(self.discount, self.window, alpha=shape, beta=shape)
+        with runner.instrument.phase('beta_sampling'):
+            state.probabilities = self.win_probabilities(runner, state.alpha, state.beta, state.chunk_size)
+
+    def simulations_per_chunk(self, runner: StrategyRunner) -> int:
+        """
+        Gets the number of simulations whose Beta samples are drawn at once.
+
+        Args:
+            runner: Runner of the run.
+        Returns:
+            chunk_size, or if it is None, the most simulations whose draws fit in MAX_CHUNK_ELEMENTS.
+        """
+        if self.chunk_size is not None:
+            return self.chunk_size
+        return max(1, MAX_CHUNK_ELEMENTS // max(1, runner.n_bandits * self.sample_size))
+
+    def win_probabilities(self, runner: StrategyRunner, alpha: np.ndarray, beta: np.ndarray, chunk_size: int=1) -> np.ndarray:
+        """
+        Estimates the probability of each bandit being the best one in every
+        simulation, the same way ThompsonSampling.generate_relative_frequencies does.
+
+        Args:
+            runner: Runner of the run.
+            alpha: Array of shape (simulations, bandits) with alpha parameters.
+            beta: Array of shape (simulations, bandits) with beta parameters.
+            chunk_size: Number of simulations whose Beta samples are drawn at once.
+        Returns:
+            Array of shape (simulations, bandits) with the relative frequencies.
+        """
+
+        simulations = alpha.shape[0]
+        wins = np.zeros((simulations, runner.n_bandits), dtype=np.int64)
+        for start in range(0, simulations, chunk_size):
+            end = min(start + chunk_size, simulations)
+            chunk_alpha, chunk_beta = alpha[start:end], beta[start:end]
+            if self.prune > 0:
+                # Every simulation only samples its own candidates, packed to the left of
+                # a (simulations, most candidates) array that is padded with -1.
+                candidates = candidate_bandits(chunk_alpha, chunk_beta, self.prune)
+                rows, columns = np.nonzero(candidates)
+                positions = np.cumsum(candidates, axis=1)[rows, columns] - 1
+                n_columns = positions.max() + 1
+                samples = np.full((end - start, n_columns, self.sample_size), -1.)
+                samples[rows, positions] = runner.rng.beta(chunk_alpha[rows, columns, None], chunk_beta[rows, columns, None],
+                                                           (len(rows), self.sample_size))
+                runner.instrument.count('beta_draws', len(rows) * self.sample_size)
+            else:
+                n_columns = runner.n_bandits
+                samples = runner.rng.beta(chunk_alpha[:, :, None], chunk_beta[:, :, None],
+                                          (end - start, n_columns, self.sample_size))
+                runner.instrument.count('beta_draws', samples.size)
+            # Offset the winners of each simulation so one bincount counts all of them.
+            winners = samples.argmax(axis=1) + n_columns * np.arange(end - start)[:, None]
+            chunk_wins = np.bincount(winners.ravel(), minlength=(end - start) * n_columns).reshape(end - start, n_columns)
+            if self.prune > 0:
+                wins[start + rows, columns] = chunk_wins[rows, positions]
+            else:
+                wins[start:end] = chunk_wins
+        probabilities = wins / self.sample_size
+        if self.top_k is not None:
+            probabilities = keep_top_k(probabilities, self.top_k)
+        return probabilities
+
+    def allocate(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, active: np.ndarray) -> np.ndarray:
+        """
+        Allocates the batch of every active simulation by a multinomial draw
+        from the win probabilities of its posteriors.
+        """
+        with runner.instrument.phase('allocation'):
+            return runner.rng.multinomial(runner.batch_size, state.probabilities[active])
+
+    def update(self, runner: StrategyRunner, state: RunState, batch: int, stage: int, examples: np.ndarray, positives: np.ndarray):
+        """
+        Updates the posteriors with the reported positive examples of the batch
+        and estimates the win probabilities the next batch is allocated with.
+        """
+        with runner.instrument.phase('posterior_update'):
+            reported = report_positives(runner, state, positives)
+            # The posteriors are built from the examples of each batch, which a
+            # forgetting posterior discounts or drops as they age.
+            evidence = state.forgetting.step(alpha=reported, beta=examples - reported)
+            np.add(np.asarray(self.alpha_priors, dtype=np.float64), evidence['alpha'], out=state.alpha)
+            # Late positive examples are first counted as negative ones, which a
+            # forgetting posterior may have discounted already by the time they arrive.
+            np.add(np.asarray(self.beta_priors, dtype=np.float64), np.maximum(evidence['beta'], 0), out=state.beta)
+        # The win probabilities of the updated posteriors are reported, e.g. to a
+        # stopping rule, and allocate the next batch.
+        with runner.instrument.phase('beta_sampling'):
+            active = np.flatnonzero(~state.stopped)
+            state.probabilities[active] = self.win_probabilities(runner, state.alpha[active], state.beta[active], state.chunk_size)
+
+    def report(self, runner: StrategyRunner, state: RunState) -> (np.ndarray, np.ndarray):
+        """
+        Reports the win probabilities of the current posteriors and the bandit
+        with the highest one.
+        """
+        return state.probabilities.argmax(axis=1), state.probabilities
+
+    def sequential(self) -> bool:
+        """
+        Checks whether the simulations can also be run one after another,
+        which ThompsonSampling supports with all parameters.
+        """
+        return True
+
+    def sequential_test(self, runner: StrategyRunner) -> ThompsonSampling:
+        """
+        Creates the ThompsonSampling test of one simulation of a sequential run.
+        """
+        test = ThompsonSampling(self.sample_size, runner.batch_size, seed=runner.rng, prune=self.prune, top_k=self.top_k,
+                                instrument=runner.instrument, discount=self.discount, window=self.window)
+        for alpha_prior, beta_prior in zip(self.alpha_priors, self.beta_priors):
+            test.add_bandit(alpha_prior=alpha_prior, beta_prior=beta_prior)
+        return test
+
+    def sequential_batch(self, runner: StrategyRunner, test: ThompsonSampling, batch: int, returns: np.ndarray,
+                         total_examples: List[int], positive_examples: List[int]):
+        """
+        Allocates the batch with a ThompsonSampling test and updates it with
+        the examples of the batch.
+        """
+        examples = np.zeros(runner.n_bandits, dtype=np.int64)
+        positives = np.zeros(runner.n_bandits, dtype=np.int64)
+        for key, val in test.bandit_batch().items():
+            examples[key] = val
+            positives[key] = runner.rng.binomial(val, returns[key])
+            total_examples[key] += val
+            positive_examples[key] += positives[key]
+        test.update_batch(positives, examples - positives)
+
+
+class ThompsonSamplingRunner(StrategyRunner):
     """
     Class that is used to run simulations of Thompson sampling tests.
 
@@ -147,13 +468,41 @@ class ThompsonSamplingRunner:
         batch_size: Number of examples per batch.
         batches: Number of batches.
         simulations: Number of simulations.
+        vectorized: Whether all simulations are advanced in lockstep as arrays.
+        chunk_size: Number of simulations whose Beta samples are drawn at once, None to derive it.
+        prune: Tail probability below which bandits are not sampled.
+        top_k: Number of bandits per simulation that get examples in a batch.
+        return_schedule: ReturnSchedule with the average returns per bandit of every batch.
+        discount: Factor the posteriors' examples are multiplied by before every batch.
+        window: Number of most recent batches the posteriors are built from.
+        delays: Probability that positive examples are reported 0, 1, ... batches late.
+        outcomes: Source of the positive examples, e.g. CommonOutcomes to compare strategies on the same outcomes.
+        simulation_clicks: Total positive examples of every simulation at the end of the run.
+        collect_statistics: Whether the distribution of the results across simulations is collected.
+        statistics: RunStatistics of the last run, if collected.
+        stopping_rule: Rule that decides when a simulation stops.
+        stopping_batches: Batch at which each simulation stopped, -1 if it did not.
+        state: RunState of the last vectorized run.
+        instrument: Instrument that records the time spent in each phase of the run.
+        rng: Random number generator used for all draws of the run.
     
     Methods:
-        init_bandits: Prepares everything for new simulation.
+        init_bandits: Prepares everything for a new simulation of a sequential run.
         run: Runs the simulations and tracks performance.
+        run_sequential: Runs the simulations one after another with ThompsonSampling objects.
+        run_vectorized: Runs all simulations in lockstep as arrays with a ThompsonStrategy.
+        resume: Continues a run from a checkpoint or extends a finished run.
+        iter_batches: Runs all simulations in lockstep and yields the results of every batch.
+        win_probabilities: Estimates the probability of each bandit being the best one in every simulation.
+        build_frames: Builds df_bids and df_clicks from the accumulated totals.
     """
 
-    def __init__(self, bandit_returns: List[float], alpha_priors: List[float]=None, beta_priors: List[float]=None, sample_size: int=1000, batch_size: int=1000, batches: int=10, simulations: int=2):
+    def __init__(self, bandit_returns: List[float], alpha_priors: List[float]=None, beta_priors: List[float]=None, sample_size: int=1000, batch_size: int=1000, batches: int=10, simulations: int=2, vectorized: bool=True, chunk_size: int=None,
+                 seed: Union[int, np.random.Generator]=None, stopping_rule: StoppingRule=None,
+                 instrument: Instrument=None, prune: float=0., top_k: int=None,
+                 return_schedule: Union[np.ndarray, Callable[[int], Sequence[float]]]=None, discount: float=1., window: int=None,
+                 delays: Sequence[float]=None, outcomes: Union[BinomialOutcomes, CommonOutcomes]=None,
+                 collect_statistics: bool=False):
         """
         Initializes a new instance of RunThompsonSampling with the passed parameters.
 
@@ -165,53 +514,66 @@ class ThompsonSamplingRunner:
             batch_size: Number of examples per batch.
             batches: Number of batches.
             simulations: Number of simulations.
+            vectorized: Whether all simulations are advanced in lockstep as arrays.
+            chunk_size: Number of simulations whose Beta samples are drawn at once. If None,
+                it is chosen so that a chunk holds at most MAX_CHUNK_ELEMENTS draws.
+            seed: Seed or random number generator used for all draws of the run.
+            stopping_rule: Rule that decides when a simulation stops, e.g. a BestArmProbability.
+                Once stopped, a simulation gets no more examples. Needs vectorized runs.
+            prune: If positive, bandits whose probability of being the best one is provably
+                below prune are not sampled, which saves most of the Beta draws in tests
+                with many bandits.
+            top_k: If set, only the top_k bandits of each simulation by relative frequency get examples.
+            instrument: Instrument that records the time spent in each phase of the run,
+                e.g. a Recorder. Nothing is recorded by default.
+            return_schedule: Average returns per bandit of every batch, as an array of shape
+                (batches, bandits) or a callable that maps a batch index to the returns of
+                that batch, e.g. a Diurnal. If None, bandit_returns are used for every batch.
+            discount: Factor the posteriors' examples are multiplied by before every batch,
+                1 keeps all examples.
+            window: If set, the posteriors are only built from the examples of the last
+                window batches.
+            delays: Probability that positive examples are reported 0, 1, ... batches after
+                their examples were made, e.g. from geometric_delays. Until then they count
+                as negative examples. If None, they are reported in the same batch. Needs
+                vectorized runs.
+            outcomes: Source of the positive examples. CommonOutcomes with the same seed give
+                every strategy the same outcomes per replica. If None, they are independent
+                binomial draws. Needs vectorized runs.
+            collect_statistics: If True, the variance, extremes and quantiles of the results of
+                every batch and bandit across simulations are collected in statistics. Needs
+                vectorized runs.
         """
 
-        self.bandit_returns = bandit_returns
-        self.n_bandits = len(bandit_returns)
-        self.bandits = list(range(self.n_bandits))
-
-        self.sample_size = sample_size
-        self.batch_size = batch_size
-        self.batches = batches
-        self.simulations = simulations
-
-        self.df_bids = pd.DataFrame(columns=self.bandit_returns)
-        self.df_clicks = pd.DataFrame(columns=self.bandit_returns)
-
+        n_bandits = len(bandit_returns)
         if alpha_priors is None:
-            alpha_priors = [1.] * self.n_bandits
+            alpha_priors = [1.] * n_bandits
         if beta_priors is None:
-            beta_priors = [1.] * self.n_bandits
-    
-    def init_bandits(self):
-        """
-        Prepares everything for new simulation.
-        """
-
-        self.bandit_positive_examples = [0] * self.n_bandits
-        self.bandit_total_examples = [0] * self.n_bandits
-        self.thomsam = ThompsonSampling(self.sample_size, self.batch_size)
-        for i in self.bandits:
-            self.thomsam.add_bandit()
+            beta_priors = [1.] * n_bandits
+        strategy = ThompsonStrategy(alpha_priors, beta_priors, sample_size=sample_size, chunk_size=chunk_size,
+                                    prune=prune, top_k=top_k, discount=discount, window=window)
+        super().__init__(bandit_returns, strategy, batch_size=batch_size, batches=batches, simulations=simulations,
+                         seed=seed, stopping_rule=stopping_rule, instrument=instrument, return_schedule=return_schedule,
+                         delays=delays, outcomes=outcomes, collect_statistics=collect_statistics, vectorized=vectorized)
+        self.alpha_priors = alpha_priors
+        self.beta_priors = beta_priors
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.prune = prune
+        self.top_k = top_k
+        self.discount = discount
+        self.window = window
 
-    def run(self):
+    def win_probabilities(self, alpha: np.ndarray, beta: np.ndarray) -> np.ndarray:
         """
-        Runs the simulations and tracks performance.
+        Estimates the probability of each bandit being the best one in every
+        simulation with the runner's ThompsonStrategy.
+
+        Args:
+            alpha: Array of shape (simulations, bandits) with alpha parameters.
+            beta: Array of shape (simulations, bandits) with beta parameters.
+        Returns:
+            Array of shape (simulations, bandits) with the relative frequencies.
         """
 
-        for j in range(self.simulations):
-            self.init_bandits()
-            for i in range(self.batches):
-                for key, val in self.thomsam.bandit_batch().items():
-                    self.bandit_total_examples[key] += val
-                    self.bandit_positive_examples[key] += np.random.binomial(val, self.bandit_returns[key])
-                    self.thomsam.update_bandit(key, self.bandit_positive_examples[key], self.bandit_total_examples[key] - self.bandit_positive_examples[key])
-                if self.df_bids.shape[0] < self.batches:
-                        self.df_bids.loc[i] = self.bandit_total_examples
-                        self.df_clicks.loc[i] = self.bandit_positive_examples
-                else:
-                    self.df_bids.loc[i] += self.bandit_total_examples
-                    self.df_clicks.loc[i] += self.bandit_positive_examples
-        self.df_bids /= self.simulations
-        self.df_clicks /= self.simulations
+        return self.strategy.win_probabilities(self, alpha, beta, self.strategy.simulations_per_chunk(self))
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+# Bump when a change to the algorithms changes the results for a given seed,
+# so that stale cached results are not loaded.
+CACHE_VERSION = 5
+
+# Runner attributes that determine its results for a given seed.
+CONFIG_ATTRIBUTES = ('bandit_returns', 'batch_size', 'batches', 'simulations', 'epsilon',
+                     'sample_size', 'alpha_priors', 'beta_priors', 'vectorized', 'stopping_rule',
+                     'return_schedule', 'discount', 'window', 'delays', 'outcomes', 'strategy',
+                     'collect_statistics')
+
+
+class ResultCache:
+    """
+    Content addressed on-disk cache of runner results.
+
+    Results are stored as .npz files holding the summed bids and clicks of a
+    runner, the total clicks and stopping batch of each of its simulations and
+    its RunStatistics if it collects them, named by a hash of the runner's
+    class, configuration and seed.
+    When the cache grows over its limits, the least recently used files
+    are evicted.
+
+    Attributes:
+        directory: Directory the results are stored in.
+        max_bytes: Maximum total size of the cached files.
+        max_entries: Maximum number of cached files.
+
+    Methods:
+        key: Calculates the cache key of a runner and seed.
+        load: Loads cached results into a runner.
+        store: Stores the results of a runner.
+        evict: Removes the least recently used files until the cache fits its limits.
+    """
+
+    def __init__(self, directory: str, max_bytes: int=2**30, max_entries: int=1000):
+        """
+        Initializes a new ResultCache and creates its directory.
+
+        Args:
+            directory: Directory the results are stored in.
+            max_bytes: Maximum total size of the cached files.
+            max_entries: Maximum number of cached files.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, runner, seed) -> str:
+        """
+        Calculates the cache key of a runner and seed.
+
+        Args:
+            runner: Runner whose configuration is hashed.
+            seed: Anything JSON serializable that determines the randomness of the run.
+        Returns:
+            Hex digest identifying the results.
+        """
+        config = {name: getattr(runner, name) for name in CONFIG_ATTRIBUTES if hasattr(runner, name)}
+        if 'return_schedule' in config:
+            config['return_schedule'] = runner.return_schedule.fingerprint(runner.batches)
+        payload = json.dumps([CACHE_VERSION, type(runner).__name__, config, seed], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        """
+        Gets the path of the file of a cache key.
+
+        Args:
+            key: Cache key.
+        Returns:
+            Path of the file.
+        """
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def load(self, runner, key: str) -> bool:
+        """
+        Loads cached results into a runner and builds its DataFrames.
+
+        Args:
+            runner: Runner to load the results into.
+            key: Cache key.
+        Returns:
+            True if the results were cached.
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                runner.bids[:] = data['bids']
+                runner.clicks[:] = data['clicks']
+                runner.simulation_clicks = data['simulation_clicks']
+                runner.stopping_batches = data['stopping_batches']
+                # RunStatistics are pickled into a byte array, empty if they were not collected.
+                statistics = data['statistics'].tobytes()
+                runner.statistics = pickle.loads(statistics) if statistics else None
+        except (FileNotFoundError, KeyError, ValueError, OSError, pickle.UnpicklingError):
+            return False
+        # The modification time marks the last use for the LRU eviction.
+        os.utime(path)
+        runner.build_frames()
+        return True
+
+    def store(self, runner, key: str):
+        """
+        Stores the results of a runner and evicts old files if needed.
+
+        Args:
+            runner: Runner that has been run.
+            key: Cache key.
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            statistics = pickle.dumps(runner.statistics, protocol=pickle.HIGHEST_PROTOCOL) if runner.statistics is not None else b''
+            np.savez_compressed(f, bids=runner.bids, clicks=runner.clicks, simulation_clicks=runner.simulation_clicks,
+                                stopping_batches=runner.stopping_batches, statistics=np.frombuffer(statistics, dtype=np.uint8))
+        os.replace(temporary, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used files until the cache fits its limits.
+        """
+        entries = list()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _, size, path = entries.pop(0)
+            os.remove(path)
+            total -= size
@@ -0,0 +1,112 @@
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+# Bump when the layout of checkpoints changes, so that old files are rejected.
+CHECKPOINT_VERSION = 4
+
+
+class RunState:
+    """
+    State of a vectorized run between two batches: the per-simulation
+    arrays and helper objects of the runner's iter_batches, and the index
+    of the next batch. The arrays are updated in place while the run goes on.
+
+    Attributes:
+        batch: Index of the next batch.
+    """
+
+    def __init__(self, batch: int=0, **values):
+        """
+        Initializes a new RunState.
+
+        Args:
+            batch: Index of the next batch.
+            values: Arrays and objects of the run, available as attributes.
+        """
+        self.batch = batch
+        self.__dict__.update(values)
+
+
+def grow_batches(runner, batches: int):
+    """
+    Sets the number of batches of a runner, keeping the accumulated
+    totals of the batches it already has.
+
+    Args:
+        runner: Runner to be changed.
+        batches: New number of batches.
+    """
+    if batches < runner.batches:
+        raise ValueError(f'A run of {runner.batches} batches cannot be shortened to {batches}.')
+    for name in ('bids', 'clicks'):
+        grown = np.zeros((batches, runner.n_bandits), dtype=np.int64)
+        grown[:runner.batches] = getattr(runner, name)
+        setattr(runner, name, grown)
+    if getattr(runner, 'statistics', None) is not None:
+        runner.statistics.resize(batches)
+    runner.batches = batches
+
+
+def save_checkpoint(path: str, runner):
+    """
+    Writes everything needed to continue a vectorized run: its RunState,
+    the accumulated totals per batch, the stopping rule and the state of
+    the random number generator. The file is replaced atomically, so a run
+    killed while writing leaves the previous checkpoint intact.
+
+    Args:
+        path: Path of the checkpoint file.
+        runner: Runner whose run is saved.
+    """
+    payload = {
+        'version': CHECKPOINT_VERSION,
+        'runner': type(runner).__name__,
+        'strategy': type(runner.strategy).__name__,
+        'simulations': runner.simulations,
+        'n_bandits': runner.n_bandits,
+        'batches': runner.batches,
+        'bids': runner.bids,
+        'clicks': runner.clicks,
+        'stopping_rule': runner.stopping_rule,
+        'statistics': runner.statistics,
+        'rng': runner.rng.bit_generator.state,
+        'state': runner.state,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path: str, runner, batches: int=None) -> RunState:
+    """
+    Restores a runner to the point a checkpoint was written at.
+
+    Args:
+        path: Path of the checkpoint file.
+        runner: Runner with the same configuration as the saved one.
+        batches: Number of batches of the continued run. If None, the saved number is used.
+    Returns:
+        The RunState to continue the run from.
+    """
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+    if payload.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'{path} is not a checkpoint of version {CHECKPOINT_VERSION}.')
+    saved = (payload['runner'], payload['strategy'], payload['simulations'], payload['n_bandits'])
+    expected = (type(runner).__name__, type(runner.strategy).__name__, runner.simulations, runner.n_bandits)
+    if saved != expected:
+        raise ValueError(f'{path} holds a run of {saved}, not {expected}.')
+
+    runner.batches = payload['batches']
+    runner.bids = payload['bids']
+    runner.clicks = payload['clicks']
+    runner.statistics = payload['statistics']
+    grow_batches(runner, payload['batches'] if batches is None else batches)
+    runner.stopping_rule = payload['stopping_rule']
+    runner.rng.bit_generator.state = payload['rng']
+    return payload['state']
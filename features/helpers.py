@@ -1,12 +1,18 @@
 import math
+from functools import lru_cache
 from typing import List
 
+import numpy as np
 import pandas as pd
 from scipy import stats
 
 from features.algorithms.split import SplitTestRunner
 from features.algorithms.epsilon import EpsilonGreedyRunner
 from features.algorithms.thompson import ThompsonSamplingRunner
+from features.algorithms.outcomes import CommonOutcomes
+from features.algorithms.stopping import StoppingRule
+from features.cache import ResultCache
+from features.parallel import run_parallel
 from features.plotting import plot_stacked_plots, plot_gain, stacked_plot
 
 def z_calc(p1: float, p2: float, n1: int, n2: int) -> float:
@@ -25,11 +31,35 @@ def z_calc(p1: float, p2: float, n1: int, n2: int) -> float:
     return (p2 - p1) / math.sqrt(p_star*(1 - p_star)*((1.0 / n1) + (1.0 / n2)))
 
 
+def is_significant(p1: float, p2: float, n: int, alpha: float=0.01) -> bool:
+    """
+    Checks if a sample size of n per sample is enough to reject
+    h0: p2-p1==0 at significance level alpha.
+
+    Args:
+        p1: Mean of first sample.
+        p2: Mean of second sample.
+        n: Sample size of each sample.
+        alpha: Type one error.
+    Returns:
+        True if the one sided p-value is below alpha.
+    """
+    z = z_calc(p1, p2, n1=n, n2=n)
+    return 1 - stats.norm.cdf(z) < alpha
+
+
+@lru_cache(maxsize=None)
 def sample_required(p1: float, p2: float, alpha: float=0.01) -> int:
     """
     Calculates the sample size needed to provide a test power of (1-alpha)
     in which we are testing h0: p2-p1==0.
 
+    With equal sample sizes the z value is (p2-p1)*sqrt(n/(2*p*(1-p))), where p
+    is the pooled mean, so the sample size follows from the normal quantile
+    of alpha. The estimate is then corrected with a bracketed bisection on
+    is_significant, which makes the result exactly the smallest n passing
+    the test. Results are cached per (p1, p2, alpha).
+
     Args:
         p1: Mean of first sample.
         p2: Mean of second sample.
@@ -37,14 +67,27 @@ def sample_required(p1: float, p2: float, alpha: float=0.01) -> int:
     Returns:
         The calculated sample size.
     """
-    n = 1
-    while True:
-        z = z_calc(p1, p2, n1=n, n2=n)
-        p = 1 - stats.norm.cdf(z)
-        if p < alpha:
-            break
-        n += 1
-    return n
+    if not p2 > p1:
+        raise ValueError(f'p2 must be greater than p1, got p1={p1} and p2={p2}.')
+
+    p_star = (p1 + p2) / 2
+    estimate = 2 * p_star * (1 - p_star) * (stats.norm.isf(alpha) / (p2 - p1))**2
+    n = max(1, math.ceil(estimate))
+
+    high = n
+    while not is_significant(p1, p2, high, alpha):
+        high *= 2
+    low = n - 1
+    while low >= 1 and is_significant(p1, p2, low, alpha):
+        low //= 2
+    # Invariant: low fails the test (or is 0) and high passes it.
+    while high - low > 1:
+        middle = (low + high) // 2
+        if is_significant(p1, p2, middle, alpha):
+            high = middle
+        else:
+            low = middle
+    return high
 
 
 def closest_pair(bandits: List[float]) -> (float, float):
@@ -58,7 +101,7 @@ def closest_pair(bandits: List[float]) -> (float, float):
         The average return of the two bandits that are the most
         similar.
     """
-    bandits.sort()
+    bandits = sorted(bandits)
     min_diff = float("inf")
     p1 = -1
     p2 = -1
@@ -99,7 +142,8 @@ def get_number_batches(examples_needed: int, batch_size: int) -> int:
     return math.ceil(examples_needed / batch_size)
 
 
-def simulate(bandits: List[float], alpha: float=0.001, batch_size: int=5000, simulations: int=1000, epsilon: float=0.1, sample_size: int=1000) -> (SplitTestRunner, EpsilonGreedyRunner, ThompsonSamplingRunner):
+def simulate(bandits: List[float], alpha: float=0.001, batch_size: int=5000, simulations: int=1000, epsilon: float=0.1, sample_size: int=1000,
+             workers: int=None, seed: int=None, cache: ResultCache=None, paired: bool=False) -> (SplitTestRunner, EpsilonGreedyRunner, ThompsonSamplingRunner):
     """
     Runs simulations for split tests, Epsilon-greedy multi-armed bandits
     and Thompson sampling based on the provided parameters.
@@ -111,22 +155,37 @@ def simulate(bandits: List[float], alpha: float=0.001, batch_size: int=5000, sim
         simulations: Number of simaltions per test type.
         epsilon: percentage of exploration in epsilon-greedy MAB
         sample_size: sample size per bandit for each Thompson sampling batch
+        workers: If set, simulations are sharded over this many processes.
+        seed: Base seed of the run. Each runner gets its own generator spawned
+            from it. With workers set, results for a seed do not depend on
+            the number of workers.
+        cache: If set, results are loaded from and stored to this cache.
+            Only seeded runs are cached.
+        paired: If True, the i-th simulation of every test type sees the same
+            outcomes for the k-th example of each bandit, so that the tests can be
+            compared per simulation with compare_gains.
     Returns:
         The classes for each type of test.
     """
     examples_needed = get_minimum_sample(bandits, alpha)
     batches = get_number_batches(examples_needed, batch_size)
+    split_seed, epsilon_seed, thompson_seed, outcome_seed = np.random.SeedSequence(seed).spawn(4)
+    outcomes = CommonOutcomes(outcome_seed) if paired else None
 
     rst = SplitTestRunner(bandits,
                           batch_size=batch_size,
                           batches=batches,
-                          simulations=simulations)
+                          simulations=simulations,
+                          seed=split_seed,
+                          outcomes=outcomes)
 
     reg = EpsilonGreedyRunner(bandits,
                               epsilon=epsilon, 
                               batch_size=batch_size,
                               batches=batches,
-                              simulations=simulations)
+                              simulations=simulations,
+                              seed=epsilon_seed,
+                              outcomes=outcomes)
 
     rts = ThompsonSamplingRunner(bandits,
                                  alpha_priors=None,
@@ -134,16 +193,61 @@ def simulate(bandits: List[float], alpha: float=0.001, batch_size: int=5000, sim
                                  sample_size=sample_size,
                                  batch_size=batch_size,
                                  batches=batches,
-                                 simulations=simulations)
+                                 simulations=simulations,
+                                 seed=thompson_seed,
+                                 outcomes=outcomes)
 
-    rst.run()
-    reg.run()
-    rts.run()
+    runners = [rst, reg, rts]
+    if cache is not None and seed is not None:
+        # Sharded runs draw differently than single process runs.
+        keys = [cache.key(runner, [seed, i, workers is not None]) for i, runner in enumerate(runners)]
+        if all(cache.load(runner, key) for runner, key in zip(runners, keys)):
+            return rst, reg, rts
+
+    if workers is None:
+        for runner in runners:
+            runner.run()
+    else:
+        run_parallel(runners, workers=workers, seed=seed)
+
+    if cache is not None and seed is not None:
+        for runner, key in zip(runners, keys):
+            cache.store(runner, key)
     return rst, reg, rts
 
 
+def compare_gains(rst: SplitTestRunner, reg: EpsilonGreedyRunner, rts: ThompsonSamplingRunner, confidence: float=0.95) -> pd.DataFrame:
+    """
+    Compares the total positive examples of the test types per simulation.
+    The differences are paired by simulation, which removes most of the noise
+    when the runners were simulated with common outcomes (simulate with paired=True).
+
+    Args:
+        rst: Split test simulation class.
+        reg: Epsilon-greedy MAB test simulation class.
+        rts: Thompson sampling test simulation class.
+        confidence: Confidence level of the intervals.
+    Returns:
+        DataFrame with the mean difference of every pair of test types, its
+        standard error and confidence interval.
+    """
+    gains = {'Split Test': rst.simulation_clicks,
+             'Epsilon Greedy MAB': reg.simulation_clicks,
+             'Thompson Sampling': rts.simulation_clicks}
+    rows = dict()
+    for better, worse in [('Epsilon Greedy MAB', 'Split Test'), ('Thompson Sampling', 'Split Test'), ('Thompson Sampling', 'Epsilon Greedy MAB')]:
+        differences = np.asarray(gains[better], dtype=np.float64) - gains[worse]
+        n = len(differences)
+        mean = differences.mean()
+        std_error = differences.std(ddof=1) / math.sqrt(n) if n > 1 else float('nan')
+        margin = stats.t.ppf((1 + confidence) / 2, max(1, n - 1)) * std_error
+        rows[f'{better} - {worse}'] = {'mean': mean, 'std_error': std_error, 'lower': mean - margin, 'upper': mean + margin}
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
 def run_simulations(bandits: List[float], alpha: float=0.001, batch_size: int=1000,
-                    simulations: int=1000, epsilon: float=0.1, sample_size: int=1000):
+                    simulations: int=1000, epsilon: float=0.1, sample_size: int=1000,
+                    workers: int=None, seed: int=None, cache: ResultCache=None, paired: bool=False) -> pd.DataFrame:
     """
     Starts the simulation process, gets the results and makes plots.
 
@@ -154,13 +258,23 @@ def run_simulations(bandits: List[float], alpha: float=0.001, batch_size: int=10
         simulations: Number of simaltions per test type.
         epsilon: percentage of exploration in epsilon-greedy MAB
         sample_size: sample size per bandit for each Thompson sampling batch
+        workers: If set, simulations are sharded over this many processes.
+        seed: Base seed of the run.
+        cache: If set, results of seeded runs are loaded from and stored to this cache.
+        paired: If True, the test types are simulated with common outcomes.
+    Returns:
+        The per simulation comparison of the test types from compare_gains.
     """
     rst, reg, rts = simulate(bandits=bandits,
                              alpha=alpha,
                              batch_size=batch_size,
                              simulations=simulations,
                              epsilon=epsilon,
-                             sample_size=sample_size)
+                             sample_size=sample_size,
+                             workers=workers,
+                             seed=seed,
+                             cache=cache,
+                             paired=paired)
 
     plot_stacked_plots(rst=rst,
                        reg=reg,
@@ -170,17 +284,39 @@ def run_simulations(bandits: List[float], alpha: float=0.001, batch_size: int=10
               reg=reg,
               rts=rts)
 
+    return compare_gains(rst, reg, rts)
+
 
-def simulate_ts(bandits: List[float], alpha_priors: List[float], beta_priors: List[float], batch_size: int=5000, simulations: int=1000, sample_size: int=1000):
+def simulate_ts(bandits: List[float], alpha_priors: List[float], beta_priors: List[float], batch_size: int=5000, simulations: int=1000, sample_size: int=1000,
+                seed: int=None, stopping_rule: StoppingRule=None):
+    """
+    Runs Thompson sampling simulations with the provided priors and
+    plots the resources allocation.
+
+    Args:
+        bandits: list of average bandit returns.
+        alpha_priors: List of alpha priors for each bandit.
+        beta_priors: List of beta priors for each bandit.
+        batch_size: Number of examples per batch.
+        simulations: Number of simaltions.
+        sample_size: sample size per bandit for each Thompson sampling batch
+        seed: Seed of the run.
+        stopping_rule: If set, simulations stop before the 700th batch once the
+            rule decides they have converged, e.g. a BestArmProbability.
+    Returns:
+        The average cumulative examples and positive examples per batch.
+    """
     batches = 700
 
-    rts = RunThompsonSampling(bandits,
-                              alpha_priors=None,
-                              beta_priors=None,
-                              sample_size=sample_size,
-                              batch_size=batch_size,
-                              batches=batches,
-                              simulations=simulations)
+    rts = ThompsonSamplingRunner(bandits,
+                                 alpha_priors=alpha_priors,
+                                 beta_priors=beta_priors,
+                                 sample_size=sample_size,
+                                 batch_size=batch_size,
+                                 batches=batches,
+                                 simulations=simulations,
+                                 seed=seed,
+                                 stopping_rule=stopping_rule)
     
     rts.run()
     
@@ -0,0 +1,239 @@
+import cProfile
+import json
+import pstats
+import time
+from contextlib import nullcontext
+from typing import TextIO
+
+import pandas as pd
+
+
+class Instrument:
+    """
+    Instrument that records nothing. Runners use it by default, so
+    instrumentation costs one method call per phase when it is off.
+
+    Methods:
+        phase: Returns a context manager that times a phase of the algorithm.
+        count: Counts events, e.g. the number of Beta draws.
+        merge: Adds what a Recorder recorded elsewhere, e.g. in a worker process.
+    """
+
+    NULL_PHASE = nullcontext()
+
+    def phase(self, name: str):
+        """
+        Returns a context manager that times a phase of the algorithm.
+
+        Args:
+            name: Name of the phase.
+        """
+        return self.NULL_PHASE
+
+    def count(self, name: str, n: int=1):
+        """
+        Counts events, e.g. the number of Beta draws.
+
+        Args:
+            name: Name of the counter.
+            n: Number of events.
+        """
+
+    def merge(self, recorder: 'Recorder'):
+        """
+        Adds what a Recorder recorded elsewhere, e.g. in a worker process.
+
+        Args:
+            recorder: Recorder whose phases and counters are added.
+        """
+
+
+NULL_INSTRUMENT = Instrument()
+
+
+class Phase:
+    """
+    Context manager that times one execution of a phase for a Recorder.
+    """
+
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder: 'Recorder', name: str):
+        self.recorder = recorder
+        self.name = name
+        self.start = 0.
+
+    def __enter__(self):
+        self.recorder.enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Recorder(Instrument):
+    """
+    Instrument that keeps the total time, number of calls and longest call
+    of every phase, and the totals of every counter, in memory.
+
+    Attributes:
+        phases: Dictionary of phase name to [total seconds, calls, longest call].
+        counters: Dictionary of counter name to total.
+
+    Methods:
+        summary: Gets the recorded phases and counters as a DataFrame.
+        reset: Forgets everything recorded so far.
+    """
+
+    def __init__(self):
+        """
+        Initializes a new empty Recorder.
+        """
+        self.phases = dict()
+        self.counters = dict()
+
+    def phase(self, name: str) -> Phase:
+        return Phase(self, name)
+
+    def enter(self, name: str):
+        """
+        Called when a phase starts.
+
+        Args:
+            name: Name of the phase.
+        """
+
+    def record(self, name: str, seconds: float):
+        """
+        Records one execution of a phase.
+
+        Args:
+            name: Name of the phase.
+            seconds: Duration of the execution.
+        """
+        stats = self.phases.get(name)
+        if stats is None:
+            self.phases[name] = [seconds, 1, seconds]
+        else:
+            stats[0] += seconds
+            stats[1] += 1
+            stats[2] = max(stats[2], seconds)
+
+    def count(self, name: str, n: int=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, recorder: 'Recorder'):
+        for name, (total, calls, longest) in recorder.phases.items():
+            stats = self.phases.get(name)
+            if stats is None:
+                self.phases[name] = [total, calls, longest]
+            else:
+                stats[0] += total
+                stats[1] += calls
+                stats[2] = max(stats[2], longest)
+        for name, total in recorder.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + total
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Gets the recorded phases and counters.
+
+        Returns:
+            DataFrame indexed by name with the total seconds, calls and longest
+            call of every phase, and the total of every counter.
+        """
+        rows = [{'name': name, 'seconds': total, 'calls': calls, 'max_seconds': longest}
+                for name, (total, calls, longest) in self.phases.items()]
+        rows += [{'name': name, 'count': total} for name, total in self.counters.items()]
+        return pd.DataFrame(rows, columns=['name', 'seconds', 'calls', 'max_seconds', 'count']).set_index('name')
+
+    def reset(self):
+        """
+        Forgets everything recorded so far.
+        """
+        self.phases.clear()
+        self.counters.clear()
+
+
+class JsonLinesRecorder(Recorder):
+    """
+    Recorder that also writes every phase execution and counter update as a
+    JSON line, e.g. to feed a dashboard. What is merged from other recorders
+    is written as one line per phase, with its number of calls, and one line
+    per counter.
+
+    Attributes:
+        stream: Text stream the lines are written to.
+    """
+
+    def __init__(self, stream: TextIO):
+        """
+        Initializes a new JsonLinesRecorder.
+
+        Args:
+            stream: Text stream the lines are written to, e.g. an open file.
+        """
+        super().__init__()
+        self.stream = stream
+
+    def record(self, name: str, seconds: float):
+        super().record(name, seconds)
+        self.stream.write(json.dumps({'time': time.time(), 'phase': name, 'seconds': seconds}) + '\n')
+
+    def count(self, name: str, n: int=1):
+        super().count(name, n)
+        self.stream.write(json.dumps({'time': time.time(), 'counter': name, 'n': n}) + '\n')
+
+    def merge(self, recorder: Recorder):
+        super().merge(recorder)
+        for name, (total, calls, _) in recorder.phases.items():
+            self.stream.write(json.dumps({'time': time.time(), 'phase': name, 'seconds': total, 'calls': calls}) + '\n')
+        for name, total in recorder.counters.items():
+            self.stream.write(json.dumps({'time': time.time(), 'counter': name, 'n': total}) + '\n')
+
+
+class ProfilingRecorder(Recorder):
+    """
+    Recorder that also runs cProfile while any phase is open, so the
+    profile only covers the instrumented code. The profile only covers this
+    process, timings merged from worker processes are not profiled.
+
+    Attributes:
+        profile: The cProfile.Profile that collects the calls.
+        depth: Number of phases that are open.
+
+    Methods:
+        stats: Gets the collected profile as pstats.Stats.
+    """
+
+    def __init__(self):
+        """
+        Initializes a new ProfilingRecorder.
+        """
+        super().__init__()
+        self.profile = cProfile.Profile()
+        self.depth = 0
+
+    def enter(self, name: str):
+        if self.depth == 0:
+            self.profile.enable()
+        self.depth += 1
+
+    def record(self, name: str, seconds: float):
+        self.depth -= 1
+        if self.depth == 0:
+            self.profile.disable()
+        super().record(name, seconds)
+
+    def stats(self, sort: str='cumulative') -> pstats.Stats:
+        """
+        Gets the collected profile.
+
+        Args:
+            sort: Key the statistics are sorted by.
+        Returns:
+            The profile statistics.
+        """
+        return pstats.Stats(self.profile).sort_stats(sort)
@@ -0,0 +1,108 @@
+import copy
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+
+from features.algorithms.accumulators import RunStatistics
+from features.algorithms.engine import StrategyRunner
+from features.instrumentation import NULL_INSTRUMENT, Recorder
+
+# Number of simulations per shard. Shards, and the seeds spawned for them, only
+# depend on this and the number of simulations, never on the number of workers,
+# so a base seed gives the same results for any worker count.
+SHARD_SIZE = 50
+
+
+def run_shard(runner: StrategyRunner, simulations: int, seed_sequence: np.random.SeedSequence,
+              first_simulation: int=0, record: bool=False) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, RunStatistics, Recorder):
+    """
+    Runs a copy of the runner with a subset of its simulations.
+
+    Args:
+        runner: Runner whose configuration is used.
+        simulations: Number of simulations in the shard.
+        seed_sequence: Seed sequence of the shard.
+        first_simulation: Index of the shard's first simulation in the runner.
+        record: Whether the shard records into a new Recorder instead of the
+            instrument of the runner, for shards run in worker processes.
+    Returns:
+        The summed cumulative examples and positive examples per batch of the
+        shard, the batch at which each of its simulations stopped, the total
+        positive examples of each of its simulations, its RunStatistics if
+        the runner collects them, and its Recorder if record is set.
+    """
+    shard = copy.copy(runner)
+    shard.simulations = simulations
+    shard.bids = np.zeros_like(runner.bids)
+    shard.clicks = np.zeros_like(runner.clicks)
+    shard.rng = np.random.default_rng(seed_sequence)
+    shard.outcomes = runner.outcomes.shard(first_simulation)
+    if record:
+        shard.instrument = Recorder()
+    shard.run()
+    recorder = shard.instrument if record else None
+    return shard.bids, shard.clicks, shard.stopping_batches, shard.simulation_clicks, shard.statistics, recorder
+
+
+def run_parallel(runners: List[StrategyRunner], workers: int=None, seed: int=None, shard_size: int=SHARD_SIZE) -> List[StrategyRunner]:
+    """
+    Runs the simulations of the runners in shards on a process pool and
+    merges the results back into the runners. Instruments, which may hold
+    streams or profiles, are not sent to worker processes: the shards record
+    into new Recorders that are merged into the instruments of the runners.
+    The shards' RunStates are not merged, so the runs cannot be resumed.
+
+    Args:
+        runners: Runners to be run.
+        workers: Number of worker processes. If 1, shards are run in this process.
+            If None, the number of processors is used.
+        seed: Base seed. Every shard gets its own seed spawned from it.
+        shard_size: Number of simulations per shard.
+    Returns:
+        The runners, with df_bids and df_clicks filled in.
+    """
+    tasks = list()
+    for runner, runner_seed in zip(runners, np.random.SeedSequence(seed).spawn(len(runners))):
+        n_shards = math.ceil(runner.simulations / shard_size)
+        template = runner
+        record = workers != 1 and runner.instrument is not NULL_INSTRUMENT
+        if workers != 1:
+            template = copy.copy(runner)
+            template.instrument = NULL_INSTRUMENT
+        for k, shard_seed in enumerate(runner_seed.spawn(n_shards)):
+            simulations = min(shard_size, runner.simulations - k * shard_size)
+            tasks.append((template, simulations, shard_seed, k * shard_size, record))
+
+    if workers == 1:
+        results = [run_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_shard, *zip(*tasks)))
+
+    stopping_batches = {id(runner): list() for runner in runners}
+    simulation_clicks = {id(runner): list() for runner in runners}
+    for runner in runners:
+        runner.bids[:] = 0
+        runner.clicks[:] = 0
+    for runner in runners:
+        runner.statistics = None
+        runner.state = None
+    shard_runners = [runner for runner in runners for _ in range(math.ceil(runner.simulations / shard_size))]
+    for runner, (bids, clicks, shard_stopping_batches, shard_simulation_clicks, statistics, recorder) in zip(shard_runners, results):
+        runner.bids += bids
+        runner.clicks += clicks
+        if runner.statistics is None:
+            runner.statistics = statistics
+        elif statistics is not None:
+            runner.statistics.merge(statistics)
+        if recorder is not None:
+            runner.instrument.merge(recorder)
+        stopping_batches[id(runner)].append(shard_stopping_batches)
+        simulation_clicks[id(runner)].append(shard_simulation_clicks)
+    for runner in runners:
+        runner.stopping_batches = np.concatenate(stopping_batches[id(runner)])
+        runner.simulation_clicks = np.concatenate(simulation_clicks[id(runner)])
+        runner.build_frames()
+    return runners
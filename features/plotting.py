@@ -1,12 +1,95 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
+from features.algorithms.engine import StrategyRunner
 from features.algorithms.split import SplitTestRunner
 from features.algorithms.epsilon import EpsilonGreedyRunner
 from features.algorithms.thompson import ThompsonSamplingRunner
 
 
-def line_plot(df: pd.DataFrame, title:str, x_label: str, y_label: str):
+# Figures reused by render_figure in each process, one per figure size.
+FIGURE_CACHE = dict()
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts every row of the passed DataFrame to percentages of the row's sum.
+
+    Args:
+        df: DataFrame containing data to be normalized.
+    Returns:
+        DataFrame with rows that sum up to 100.
+    """
+    values = df.to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = values * 100 / values.sum(axis=1, keepdims=True)
+    return pd.DataFrame(values, index=df.index, columns=df.columns)
+
+
+def lttb_indices(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    Selects n rows with the largest triangle three buckets algorithm. The
+    rows between the first and the last one are split into n - 2 buckets,
+    and from each bucket the row spanning the largest triangle with the
+    previous selected row and the average of the next bucket is kept.
+    The areas of all columns are summed, so all columns share the rows.
+
+    Args:
+        values: Array of shape (rows, columns) with the series, x is the row index.
+        n: Number of rows to keep.
+    Returns:
+        Array with the indices of the kept rows.
+    """
+    rows = len(values)
+    if n >= rows or n < 3:
+        return np.arange(rows)
+    edges = np.linspace(1, rows - 1, n - 1).astype(np.int64)
+    selected = [0]
+    for bucket in range(n - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else rows
+        next_x = (end + next_end - 1) / 2
+        next_y = values[end:next_end].mean(axis=0)
+        a = selected[-1]
+        x = np.arange(start, end)
+        areas = np.abs((a - next_x) * (values[start:end] - values[a]) - (a - x)[:, None] * (next_y - values[a])).sum(axis=1)
+        selected.append(start + int(areas.argmax()))
+    selected.append(rows - 1)
+    return np.asarray(selected)
+
+
+def decimate(df: pd.DataFrame, max_points: int=None, method: str='lttb') -> pd.DataFrame:
+    """
+    Reduces the passed DataFrame to at most max_points rows for plotting.
+    The index of the kept rows is preserved.
+
+    Args:
+        df: DataFrame containing data to be plotted.
+        max_points: Maximum number of rows. If None, all rows are kept.
+        method: Either 'lttb', which keeps the shape of the series, or 'stride',
+            which keeps evenly spaced rows.
+    Returns:
+        DataFrame with the kept rows.
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+    if method == 'lttb':
+        indices = lttb_indices(np.nan_to_num(df.to_numpy(dtype=np.float64)), max_points)
+    elif method == 'stride':
+        indices = np.unique(np.linspace(0, len(df) - 1, max_points).round().astype(np.int64))
+    else:
+        raise ValueError(f"Unknown method {method}, expected 'lttb' or 'stride'.")
+    return df.iloc[indices]
+
+
+def line_plot(df: pd.DataFrame, title:str, x_label: str, y_label: str, max_points: int=None):
     """
     Plots a line plot of the passed DataFrame.
 
@@ -15,15 +98,16 @@ def line_plot(df: pd.DataFrame, title:str, x_label: str, y_label: str):
         title: Title of the plot.
         x_label: Title of the x-axis.
         y_label: Title of the y-axis.
+        max_points: If set, the plotted rows are reduced to max_points with decimate.
     """
-    stacked_data = df.apply(lambda x: x*100/sum(x), axis=1)
+    stacked_data = decimate(normalize(df), max_points)
     stacked_data.plot(kind="line", stacked=True)
     plt.title(title)
     plt.xlabel(x_label)
     plt.ylabel(y_label)
 
 
-def stacked_plot(df: pd.DataFrame, title:str, x_label: str, y_label: str):
+def stacked_plot(df: pd.DataFrame, title:str, x_label: str, y_label: str, max_points: int=None):
     """
     Plots a stacked area plot of the passed DataFrame.
 
@@ -32,8 +116,9 @@ def stacked_plot(df: pd.DataFrame, title:str, x_label: str, y_label: str):
         title: Title of the plot.
         x_label: Title of the x-axis.
         y_label: Title of the y-axis.
+        max_points: If set, the plotted rows are reduced to max_points with decimate.
     """
-    stacked_data = df.apply(lambda x: x*100/sum(x), axis=1)
+    stacked_data = decimate(normalize(df), max_points)
     stacked_data.plot(kind="area", stacked=True, figsize=(12,6))
     plt.title(title)
     plt.xlabel(x_label)
@@ -105,3 +190,104 @@ def plot_gain(rst: SplitTestRunner, reg: EpsilonGreedyRunner, rts: ThompsonSampl
     df_gains = pd.concat([rst_gain, reg_gain, rts_gain], axis=1)
     df_gains.rename(columns={0: 'Split Test', 1: 'Epsilon Greedy MAB', 2: 'Thompson Sampling'}, inplace=True)
     df_gains.plot(figsize=(12,6))
+
+
+def render_figure(df: pd.DataFrame, kind: str, title: str, x_label: str, y_label: str, figsize: Tuple[float, float]=(12, 6)) -> Figure:
+    """
+    Draws the passed DataFrame on a figure without pyplot, so it works on
+    servers without a display. The figure of each size is reused between
+    calls in the same process instead of creating a new one every time.
+
+    Args:
+        df: DataFrame containing data to be plotted.
+        kind: Either 'area' for a stacked area plot or 'line' for a line plot.
+        title: Title of the plot.
+        x_label: Title of the x-axis.
+        y_label: Title of the y-axis.
+        figsize: Size of the figure in inches.
+    Returns:
+        The figure, which is overwritten by the next call with the same size.
+    """
+    figure = FIGURE_CACHE.get(figsize)
+    if figure is None:
+        figure = Figure(figsize=figsize)
+        FigureCanvasAgg(figure)
+        FIGURE_CACHE[figsize] = figure
+    figure.clear()
+    ax = figure.add_subplot()
+    x = df.index.to_numpy()
+    values = df.to_numpy(dtype=np.float64)
+    labels = [str(column) for column in df.columns]
+    if kind == 'area':
+        ax.stackplot(x, values.T, labels=labels)
+    elif kind == 'line':
+        for line, label in zip(ax.plot(x, values), labels):
+            line.set_label(label)
+    else:
+        raise ValueError(f"Unknown kind {kind}, expected 'area' or 'line'.")
+    ax.set_title(title)
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    ax.legend(loc='upper left')
+    return figure
+
+
+def save_plot(path: str, formats: Sequence[str], dpi: int, df: pd.DataFrame, kind: str, title: str, x_label: str, y_label: str) -> List[str]:
+    """
+    Renders the passed DataFrame with render_figure and saves it in every format.
+
+    Args:
+        path: Path of the files without extension.
+        formats: File formats, e.g. ('png', 'svg').
+        dpi: Resolution of raster formats.
+        df: DataFrame containing data to be plotted.
+        kind: Either 'area' or 'line'.
+        title: Title of the plot.
+        x_label: Title of the x-axis.
+        y_label: Title of the y-axis.
+    Returns:
+        The paths of the saved files.
+    """
+    figure = render_figure(df, kind, title, x_label, y_label)
+    paths = list()
+    for file_format in formats:
+        figure.savefig(f'{path}.{file_format}', format=file_format, dpi=dpi)
+        paths.append(f'{path}.{file_format}')
+    return paths
+
+
+def export_plots(runners: Dict[str, StrategyRunner], directory: str, formats: Sequence[str]=('png',), max_points: int=1000,
+                 workers: int=None, dpi: int=100) -> List[str]:
+    """
+    Saves the resources allocation and the cumulative positive examples of
+    every runner to files named after the runner, rendered headless on a
+    process pool. Long runs are reduced to max_points batches with decimate
+    before they are sent to the workers.
+
+    Args:
+        runners: Runners that have been run, by name, e.g. {'thompson': rts}.
+        directory: Directory the files are saved to, created if needed.
+        formats: File formats, e.g. ('png', 'svg').
+        max_points: Maximum number of batches per plot. If None, all batches are plotted.
+        workers: Number of worker processes. If 1, the plots are rendered in this process.
+            If None, the number of processors is used.
+        dpi: Resolution of raster formats.
+    Returns:
+        The paths of the saved files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tasks = list()
+    for name, runner in runners.items():
+        path = os.path.join(directory, name)
+        tasks.append((f'{path}_allocation', formats, dpi, decimate(normalize(runner.df_bids), max_points), 'area',
+                      f'{name} Bandit Resources Allocation', 'Batch', 'Bandit Allocation (%)'))
+        tasks.append((f'{path}_clicks', formats, dpi, decimate(runner.df_clicks, max_points), 'line',
+                      f'{name} Positive Examples', 'Batch', 'Cumulative Positive Examples'))
+
+    if workers == 1:
+        results = [save_plot(*task) for task in tasks]
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(save_plot, *zip(*tasks), chunksize=max(1, len(tasks) // (4 * workers))))
+    return [path for paths in results for path in paths]
@@ -0,0 +1,358 @@
+import os
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from features.algorithms.epsilon import EpsilonGreedy
+from features.algorithms.thompson import ThompsonSampling
+
+# Number of log rows read from disk at once.
+CHUNK_SIZE = 2**20
+
+
+class TrafficLog:
+    """
+    Logged traffic stored column-wise as .npy files in a directory: the
+    bandit shown for every impression in bandits.npy, and whether it was
+    clicked in clicks.npy. The columns are memory-mapped, so logs larger than
+    the memory can be replayed. The clicks sorted by bandit are kept next to
+    them in sorted_clicks.npy and offsets.npy once they are built.
+
+    Attributes:
+        directory: Directory of the log.
+        bandits: Memory-mapped array with the bandit of every impression.
+        clicks: Memory-mapped array with the click (0 or 1) of every impression.
+        n_bandits: Number of bandits in the log.
+        chunk_size: Number of rows read at once.
+        sorted_clicks: Memory-mapped clicks of the log sorted by bandit, in log order per bandit, or None until built.
+        offsets: Start of every bandit's clicks in sorted_clicks, followed by the number of rows.
+
+    Methods:
+        write: Writes a log to a directory.
+        bandit_returns: Calculates the click-through rate of every bandit in the log.
+        build_index: Sorts the clicks by bandit into a file next to the log, once.
+    """
+
+    def __init__(self, directory: str, n_bandits: int=None, chunk_size: int=CHUNK_SIZE):
+        """
+        Opens a log written by TrafficLog.write.
+
+        Args:
+            directory: Directory with bandits.npy and clicks.npy.
+            n_bandits: Number of bandits. If None, it is the largest bandit index plus one.
+            chunk_size: Number of rows read at once.
+        """
+        self.directory = directory
+        self.bandits = np.load(os.path.join(directory, 'bandits.npy'), mmap_mode='r')
+        self.clicks = np.load(os.path.join(directory, 'clicks.npy'), mmap_mode='r')
+        if len(self.bandits) != len(self.clicks):
+            raise ValueError(f'bandits.npy has {len(self.bandits)} rows but clicks.npy has {len(self.clicks)}.')
+        self.chunk_size = chunk_size
+        if n_bandits is None:
+            n_bandits = 1 + max((int(self.bandits[start:start + chunk_size].max()) for start in range(0, len(self), chunk_size)), default=-1)
+        self.n_bandits = n_bandits
+        self.sorted_clicks = None
+        self.offsets = None
+
+    def __len__(self) -> int:
+        """
+        Returns the number of impressions in the log.
+        """
+        return len(self.bandits)
+
+    @staticmethod
+    def write(directory: str, bandits: np.ndarray, clicks: np.ndarray):
+        """
+        Writes a log to a directory.
+
+        Args:
+            directory: Directory the columns are written to, created if needed.
+            bandits: Bandit of every impression.
+            clicks: Click (0 or 1) of every impression.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # Sorted clicks of a previous log in the directory are stale.
+        for name in ('sorted_clicks.npy', 'offsets.npy'):
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        np.save(os.path.join(directory, 'bandits.npy'), np.asarray(bandits, dtype=np.int32))
+        np.save(os.path.join(directory, 'clicks.npy'), np.asarray(clicks, dtype=np.uint8))
+
+    def bandit_returns(self) -> List[float]:
+        """
+        Calculates the click-through rate of every bandit in the log.
+
+        Returns:
+            List of average returns per bandit.
+        """
+        impressions = np.zeros(self.n_bandits, dtype=np.int64)
+        clicks = np.zeros(self.n_bandits, dtype=np.int64)
+        for start in range(0, len(self), self.chunk_size):
+            bandits = self.bandits[start:start + self.chunk_size]
+            impressions += np.bincount(bandits, minlength=self.n_bandits)
+            clicks += np.bincount(bandits, weights=self.clicks[start:start + self.chunk_size], minlength=self.n_bandits).astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return list(np.where(impressions > 0, clicks / impressions, 0.))
+
+    def build_index(self):
+        """
+        Sorts the clicks of the log by bandit, keeping log order per bandit,
+        with a counting sort that reads the log one chunk at a time and writes
+        the sorted clicks to sorted_clicks.npy, so they are not held in memory.
+        Sorted clicks that are already in the directory are reused.
+        """
+        if self.sorted_clicks is not None:
+            return
+        sorted_path = os.path.join(self.directory, 'sorted_clicks.npy')
+        offsets_path = os.path.join(self.directory, 'offsets.npy')
+        if os.path.exists(sorted_path) and os.path.exists(offsets_path):
+            sorted_clicks = np.load(sorted_path, mmap_mode='r')
+            offsets = np.load(offsets_path)
+            if len(sorted_clicks) == len(self) and len(offsets) == self.n_bandits + 1:
+                self.sorted_clicks = sorted_clicks
+                self.offsets = offsets
+                return
+        counts = np.zeros(self.n_bandits, dtype=np.int64)
+        for start in range(0, len(self), self.chunk_size):
+            counts += np.bincount(self.bandits[start:start + self.chunk_size], minlength=self.n_bandits)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        sorted_clicks = np.lib.format.open_memmap(sorted_path, mode='w+', dtype=np.uint8, shape=(len(self),))
+        filled = offsets[:-1].copy()
+        for start in range(0, len(self), self.chunk_size):
+            bandits = np.asarray(self.bandits[start:start + self.chunk_size])
+            rows = np.argsort(bandits, kind='stable')
+            chunk_counts = np.bincount(bandits, minlength=self.n_bandits)
+            chunk_offsets = np.cumsum(chunk_counts) - chunk_counts
+            sorted_bandits = bandits[rows]
+            destinations = filled[sorted_bandits] + np.arange(len(rows)) - chunk_offsets[sorted_bandits]
+            sorted_clicks[destinations] = self.clicks[start:start + self.chunk_size][rows]
+            filled += chunk_counts
+        sorted_clicks.flush()
+        del sorted_clicks
+        np.save(offsets_path, offsets)
+        self.sorted_clicks = np.load(sorted_path, mmap_mode='r')
+        self.offsets = offsets
+
+
+class LogCursor:
+    """
+    Serves the logged impressions of every bandit in log order. The clicks
+    of the log are sorted by bandit once per log, so serving impressions
+    only slices them instead of scanning the log.
+
+    Attributes:
+        log: The replayed log.
+        positions: Number of impressions of each bandit served so far.
+
+    Methods:
+        take: Serves the next n logged impressions of a bandit.
+    """
+
+    def __init__(self, log: TrafficLog):
+        """
+        Initializes a new LogCursor at the start of the log.
+
+        Args:
+            log: The replayed log.
+        """
+        self.log = log
+        self.log.build_index()
+        self.positions = np.zeros(log.n_bandits, dtype=np.int64)
+
+    def take(self, bandit: int, n: int) -> (int, int):
+        """
+        Serves the next n logged impressions of a bandit.
+
+        Args:
+            bandit: Index of the bandit.
+            n: Number of impressions.
+        Returns:
+            The number of impressions served, which is less than n once the
+            bandit's impressions in the log run out, and their clicks.
+        """
+        start = int(self.log.offsets[bandit] + self.positions[bandit])
+        end = min(start + n, int(self.log.offsets[bandit + 1]))
+        served = end - start
+        self.positions[bandit] += served
+        return served, int(self.log.sorted_clicks[start:end].sum())
+
+
+class ReplayRunner:
+    """
+    Class that is used to evaluate Thompson sampling or Epsilon-greedy
+    policies offline by replaying logged traffic. Whenever the policy gives
+    a bandit examples, the next logged impressions of that bandit are
+    served with their logged clicks. Every simulation replays the log from
+    the start with its own policy randomness.
+
+    Attributes:
+        log: The replayed log.
+        bandit_returns: Click-through rate of every bandit in the log.
+        policy: Either 'thompson' or 'epsilon'.
+        epsilon: Percentage of exploration of the Epsilon-greedy policy.
+        sample_size: Sample size of the Thompson sampling policy.
+        alpha_priors: List of alpha priors for each bandit of the Thompson sampling policy.
+        beta_priors: List of beta priors for each bandit of the Thompson sampling policy.
+        discount: Factor the examples the policy learned from are multiplied by before every batch.
+        window: Number of most recent batches the policy learns from.
+        batch_size: Number of examples per batch.
+        batches: Number of batches.
+        simulations: Number of simulations.
+        batches_replayed: Number of batches each simulation ran before the log ran out.
+        rng: Random number generator used for all draws of the run.
+
+    Methods:
+        init_bandits: Prepares everything for new simulation.
+        run: Replays the log and tracks performance.
+        build_frames: Builds df_bids and df_clicks from the accumulated totals.
+    """
+
+    def __init__(self, log: TrafficLog, policy: str='thompson', epsilon: float=0.2, sample_size: int=1000,
+                 alpha_priors: List[float]=None, beta_priors: List[float]=None, batch_size: int=1000, batches: int=10,
+                 simulations: int=1, seed: Union[int, np.random.Generator]=None, discount: float=1., window: int=None):
+        """
+        Initializes a new ReplayRunner with the passed parameters.
+
+        Args:
+            log: The replayed log.
+            policy: Either 'thompson' or 'epsilon'.
+            epsilon: Percentage of exploration of the Epsilon-greedy policy.
+            sample_size: Sample size of the Thompson sampling policy.
+            alpha_priors: List of alpha priors for each bandit of the Thompson sampling policy.
+            beta_priors: List of beta priors for each bandit of the Thompson sampling policy.
+            batch_size: Number of examples per batch.
+            batches: Number of batches.
+            simulations: Number of simulations.
+            seed: Seed or random number generator used for all draws of the run.
+            discount: Factor the examples the policy learned from are multiplied by before
+                every batch, 1 keeps all examples.
+            window: If set, the policy only learns from the examples of the last window batches.
+        """
+        if policy not in ('thompson', 'epsilon'):
+            raise ValueError(f"Unknown policy {policy}, expected 'thompson' or 'epsilon'.")
+
+        self.rng = np.random.default_rng(seed)
+        self.log = log
+        self.bandit_returns = log.bandit_returns()
+        self.n_bandits = log.n_bandits
+        self.bandits = list(range(self.n_bandits))
+
+        self.policy = policy
+        self.epsilon = epsilon
+        self.sample_size = sample_size
+        self.alpha_priors = alpha_priors or [1.] * self.n_bandits
+        self.beta_priors = beta_priors or [1.] * self.n_bandits
+        self.discount = discount
+        self.window = window
+        self.batch_size = batch_size
+        self.batches = batches
+        self.simulations = simulations
+        self.batches_replayed = np.zeros(self.simulations, dtype=np.int64)
+
+        self.bids = np.zeros((self.batches, self.n_bandits), dtype=np.int64)
+        self.clicks = np.zeros((self.batches, self.n_bandits), dtype=np.int64)
+        self.df_bids = pd.DataFrame(columns=self.bandit_returns)
+        self.df_clicks = pd.DataFrame(columns=self.bandit_returns)
+
+    def init_bandits(self):
+        """
+        Prepares everything for new simulation.
+        """
+        self.cursor = LogCursor(self.log)
+        self.first_batch = True
+        self.bandit_positive_examples = [0] * self.n_bandits
+        self.bandit_total_examples = [0] * self.n_bandits
+        if self.policy == 'thompson':
+            self.thomsam = ThompsonSampling(self.sample_size, self.batch_size, seed=self.rng, discount=self.discount,
+                                            window=self.window)
+            for i in self.bandits:
+                self.thomsam.add_bandit(alpha_prior=self.alpha_priors[i], beta_prior=self.beta_priors[i])
+        else:
+            self.eps = EpsilonGreedy(self.epsilon, self.batch_size, discount=self.discount, window=self.window)
+            for i in self.bandits:
+                self.eps.add_bandit()
+
+    def serve(self, bandit: int, examples: int) -> (int, int):
+        """
+        Serves examples of a bandit from the log and adds them to the totals.
+
+        Args:
+            bandit: Index of the bandit.
+            examples: Number of examples.
+        Returns:
+            The number of examples served, which is less than examples once the
+            log runs out of impressions of the bandit, and their positive examples.
+        """
+        served, positive_examples = self.cursor.take(bandit, examples)
+        self.bandit_total_examples[bandit] += served
+        self.bandit_positive_examples[bandit] += positive_examples
+        return served, positive_examples
+
+    def thompson_batch(self) -> bool:
+        """
+        Replays one batch of the Thompson sampling policy.
+
+        Returns:
+            Whether the log had enough impressions for the batch.
+        """
+        complete = True
+        examples = np.zeros(self.n_bandits, dtype=np.int64)
+        positives = np.zeros(self.n_bandits, dtype=np.int64)
+        for key, val in self.thomsam.bandit_batch().items():
+            examples[key], positives[key] = self.serve(key, val)
+            complete &= examples[key] == val
+        self.thomsam.update_batch(positives, examples - positives)
+        return complete
+
+    def epsilon_batch(self) -> bool:
+        """
+        Replays one batch of the Epsilon-greedy policy.
+
+        Returns:
+            Whether the log had enough impressions for the batch.
+        """
+        complete = True
+        exploration_examples, best_bandit = self.eps.bandit_batch()
+        if self.first_batch:
+            self.first_batch = False
+            exploration_examples = self.batch_size // self.n_bandits
+        positives = np.zeros(self.n_bandits, dtype=np.int64)
+        for idx in self.bandits:
+            served, positives[idx] = self.serve(idx, exploration_examples)
+            complete &= served == exploration_examples
+        self.eps.update_batch(positives)
+        exploitation_examples = self.batch_size - exploration_examples * self.n_bandits
+        served, _ = self.serve(best_bandit, exploitation_examples)
+        return complete and served == exploitation_examples
+
+    def run(self):
+        """
+        Replays the log and tracks performance. A simulation ends when the
+        log runs out of impressions for a bandit the policy chose, and keeps
+        its totals for the remaining batches.
+        """
+        self.bids[:] = 0
+        self.clicks[:] = 0
+        replay_batch = self.thompson_batch if self.policy == 'thompson' else self.epsilon_batch
+        for j in range(self.simulations):
+            self.init_bandits()
+            self.batches_replayed[j] = self.batches
+            for i in range(self.batches):
+                if not replay_batch():
+                    self.batches_replayed[j] = i
+                    self.bids[i:] += self.bandit_total_examples
+                    self.clicks[i:] += self.bandit_positive_examples
+                    break
+                self.bids[i] += self.bandit_total_examples
+                self.clicks[i] += self.bandit_positive_examples
+        self.build_frames()
+
+    def build_frames(self):
+        """
+        Builds df_bids and df_clicks, the average cumulative number of
+        examples and positive examples per batch, from the accumulated totals.
+        """
+        self.df_bids = pd.DataFrame(self.bids / self.simulations, columns=self.bandit_returns)
+        self.df_clicks = pd.DataFrame(self.clicks / self.simulations, columns=self.bandit_returns)
@@ -0,0 +1,213 @@
+import itertools
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from features.algorithms.split import SplitTestRunner
+from features.algorithms.epsilon import EpsilonGreedyRunner
+from features.algorithms.thompson import ThompsonSamplingRunner
+from features.helpers import get_minimum_sample, get_number_batches
+from features.parallel import run_parallel
+from features.plotting import export_plots
+
+STRATEGIES = ('split', 'epsilon', 'thompson')
+
+# Parameters each strategy depends on. Configurations that only differ in other
+# parameters are simulated once per strategy.
+STRATEGY_PARAMETERS = {
+    'split': ('bandit_returns', 'batch_size'),
+    'epsilon': ('bandit_returns', 'batch_size', 'epsilon'),
+    'thompson': ('bandit_returns', 'batch_size', 'sample_size', 'priors'),
+}
+
+
+def grid_search(bandit_returns: Sequence[Sequence[float]], epsilon: Sequence[float]=(0.1,), batch_size: Sequence[int]=(5000,),
+                sample_size: Sequence[int]=(1000,), priors: Sequence[Tuple[List[float], List[float]]]=(None,)) -> List[Dict]:
+    """
+    Builds every combination of the passed parameter values.
+
+    Args:
+        bandit_returns: Lists of average returns per bandit.
+        epsilon: Percentages of exploration for epsilon-greedy MAB.
+        batch_size: Numbers of examples per batch.
+        sample_size: Sample sizes per bandit for each Thompson sampling batch.
+        priors: Pairs of (alpha_priors, beta_priors) for Thompson sampling, None for uniform priors.
+    Returns:
+        List of configurations.
+    """
+    return [make_configuration(*values) for values in itertools.product(bandit_returns, epsilon, batch_size, sample_size, priors)]
+
+
+def random_search(bandit_returns: Sequence[Sequence[float]], n: int, epsilon: Sequence[float]=(0.1,), batch_size: Sequence[int]=(5000,),
+                  sample_size: Sequence[int]=(1000,), priors: Sequence[Tuple[List[float], List[float]]]=(None,), seed: int=None) -> List[Dict]:
+    """
+    Draws n configurations by picking every parameter uniformly at random
+    from its passed values.
+
+    Args:
+        bandit_returns: Lists of average returns per bandit.
+        n: Number of configurations to draw.
+        epsilon: Percentages of exploration for epsilon-greedy MAB.
+        batch_size: Numbers of examples per batch.
+        sample_size: Sample sizes per bandit for each Thompson sampling batch.
+        priors: Pairs of (alpha_priors, beta_priors) for Thompson sampling, None for uniform priors.
+        seed: Seed of the draws.
+    Returns:
+        List of configurations.
+    """
+    rng = np.random.default_rng(seed)
+    space = (bandit_returns, epsilon, batch_size, sample_size, priors)
+    return [make_configuration(*(values[rng.integers(len(values))] for values in space)) for _ in range(n)]
+
+
+def make_configuration(bandit_returns: Sequence[float], epsilon: float=0.1, batch_size: int=5000, sample_size: int=1000,
+                       priors: Tuple[List[float], List[float]]=None) -> Dict:
+    """
+    Builds a configuration in canonical form, with tuples instead of lists,
+    so that configurations can be compared and hashed.
+
+    Args:
+        bandit_returns: List of average returns per bandit.
+        epsilon: Percentage of exploration for epsilon-greedy MAB.
+        batch_size: Number of examples per batch.
+        sample_size: Sample size per bandit for each Thompson sampling batch.
+        priors: Pair of (alpha_priors, beta_priors) for Thompson sampling, None for uniform priors.
+    Returns:
+        The configuration.
+    """
+    if priors is not None:
+        priors = (tuple(float(p) for p in priors[0]), tuple(float(p) for p in priors[1]))
+    return {
+        'bandit_returns': tuple(float(r) for r in bandit_returns),
+        'epsilon': float(epsilon),
+        'batch_size': int(batch_size),
+        'sample_size': int(sample_size),
+        'priors': priors,
+    }
+
+
+def make_runner(strategy: str, configuration: Dict, batches: int, simulations: int):
+    """
+    Builds the runner of a strategy for a configuration.
+
+    Args:
+        strategy: One of STRATEGIES.
+        configuration: Configuration built by make_configuration.
+        batches: Number of batches.
+        simulations: Number of simulations.
+    Returns:
+        The runner.
+    """
+    bandit_returns = list(configuration['bandit_returns'])
+    if strategy == 'split':
+        return SplitTestRunner(bandit_returns,
+                               batch_size=configuration['batch_size'],
+                               batches=batches,
+                               simulations=simulations)
+    if strategy == 'epsilon':
+        return EpsilonGreedyRunner(bandit_returns,
+                                   epsilon=configuration['epsilon'],
+                                   batch_size=configuration['batch_size'],
+                                   batches=batches,
+                                   simulations=simulations)
+    if strategy == 'thompson':
+        alpha_priors, beta_priors = configuration['priors'] or (None, None)
+        return ThompsonSamplingRunner(bandit_returns,
+                                      alpha_priors=alpha_priors and list(alpha_priors),
+                                      beta_priors=beta_priors and list(beta_priors),
+                                      sample_size=configuration['sample_size'],
+                                      batch_size=configuration['batch_size'],
+                                      batches=batches,
+                                      simulations=simulations)
+    raise ValueError(f'Unknown strategy {strategy}, expected one of {STRATEGIES}.')
+
+
+def summarize(runner, convergence_share: float=0.9) -> Dict:
+    """
+    Summarizes the results of a finished runner.
+
+    Args:
+        runner: Runner that has been run.
+        convergence_share: Share of a batch the best bandit needs to get, in
+            this and every later batch, for the test to count as converged.
+    Returns:
+        Dictionary with the average clicks, the expected regret against always
+        using the best bandit, the allocation of the last batch, the share of
+        the best bandit in it and the batch at which the test converged.
+    """
+    returns = np.asarray(runner.bandit_returns, dtype=np.float64)
+    bids = runner.bids / runner.simulations
+    clicks = runner.clicks / runner.simulations
+    allocation = np.diff(bids, axis=0, prepend=0)
+    allocation = allocation / allocation.sum(axis=1, keepdims=True)
+    best_share = allocation[:, returns.argmax()]
+
+    below = np.flatnonzero(best_share < convergence_share)
+    if below.size == 0:
+        convergence_batch = 0
+    elif below[-1] + 1 < len(best_share):
+        convergence_batch = int(below[-1] + 1)
+    else:
+        convergence_batch = None
+
+    return {
+        'clicks': clicks[-1].sum(),
+        'regret': (bids[-1] * (returns.max() - returns)).sum(),
+        'final_allocation': tuple(allocation[-1]),
+        'best_share': best_share[-1],
+        'convergence_batch': convergence_batch,
+    }
+
+
+def run_sweep(configurations: List[Dict], strategies: Sequence[str]=STRATEGIES, alpha: float=0.001, batches: int=None,
+              simulations: int=100, convergence_share: float=0.9, workers: int=None, seed: int=None,
+              plot_directory: str=None, plot_formats: Sequence[str]=('png',)) -> pd.DataFrame:
+    """
+    Simulates every strategy for every configuration and collects the results.
+
+    Duplicate configurations are dropped. Configurations that only differ in
+    parameters a strategy does not use are simulated once for that strategy. All simulations
+    are sharded over one process pool with run_parallel.
+
+    Args:
+        configurations: Configurations built by grid_search, random_search or make_configuration.
+        strategies: Strategies to simulate, a subset of STRATEGIES.
+        alpha: Type one error used to size the test when batches is None.
+        batches: Number of batches. If None, it is derived from the minimum
+            sample size of each configuration, as in helpers.simulate.
+        simulations: Number of simulations per strategy and configuration.
+        convergence_share: Share of a batch the best bandit needs to keep for the test to count as converged.
+        workers: Number of worker processes. If None, the number of processors is used.
+        seed: Base seed of the sweep.
+        plot_directory: If set, the plots of every row are exported to this directory
+            with export_plots, named after the row's index and strategy.
+        plot_formats: File formats of the exported plots.
+    Returns:
+        DataFrame with one row per configuration and strategy.
+    """
+    unique = dict()
+    for configuration in configurations:
+        unique.setdefault(tuple(configuration.items()), configuration)
+
+    runners = dict()
+    rows = list()
+    for configuration in unique.values():
+        n_batches = batches
+        if n_batches is None:
+            examples_needed = get_minimum_sample(list(configuration['bandit_returns']), alpha)
+            n_batches = get_number_batches(examples_needed, configuration['batch_size'])
+        for strategy in strategies:
+            key = (strategy, n_batches) + tuple(configuration[p] for p in STRATEGY_PARAMETERS[strategy])
+            if key not in runners:
+                runners[key] = make_runner(strategy, configuration, n_batches, simulations)
+            rows.append((configuration, strategy, key))
+
+    run_parallel(list(runners.values()), workers=workers, seed=seed)
+    summaries = {key: summarize(runner, convergence_share) for key, runner in runners.items()}
+    if plot_directory is not None:
+        export_plots({f'{i:04d}_{strategy}': runners[key] for i, (_, strategy, key) in enumerate(rows)},
+                     plot_directory, formats=plot_formats, workers=workers)
+
+    return pd.DataFrame([{**configuration, 'strategy': strategy, 'batches': runners[key].batches, **summaries[key]}
+                         for configuration, strategy, key in rows])
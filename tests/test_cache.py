@@ -0,0 +1,48 @@
+import numpy as np
+
+from features.algorithms.schedules import Diurnal
+from features.algorithms.split import SplitTestRunner
+from features.cache import ResultCache
+
+RETURNS = [0.01, 0.02]
+
+
+def make_schedule(amplitude: float):
+    """
+    Makes a new function object with returns oscillating by amplitude.
+    """
+    def schedule(batch: int) -> np.ndarray:
+        return np.asarray(RETURNS) * (1 + amplitude * np.sin(batch))
+    return schedule
+
+
+def test_callable_schedules_are_keyed_by_their_returns(tmp_path):
+    """
+    Callable return schedules are keyed by their name and returns, not by
+    their memory address: new function objects with the same returns share
+    a key, and schedules with other returns do not.
+    """
+    cache = ResultCache(str(tmp_path))
+    keys = [cache.key(SplitTestRunner(RETURNS, batches=5, return_schedule=schedule), seed=0)
+            for schedule in (make_schedule(0.5), make_schedule(0.5), make_schedule(0.2))]
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+    assert 'at 0x' not in SplitTestRunner(RETURNS, return_schedule=make_schedule(0.5)).return_schedule.fingerprint(5)
+
+
+def test_cached_results_are_loaded(tmp_path):
+    """
+    Results stored under a key are loaded into a new runner of the same configuration.
+    """
+    cache = ResultCache(str(tmp_path))
+    runner = SplitTestRunner(RETURNS, batches=4, simulations=10, seed=0, return_schedule=Diurnal(RETURNS, period=4))
+    runner.run()
+    key = cache.key(runner, seed=0)
+    cache.store(runner, key)
+
+    loaded = SplitTestRunner(RETURNS, batches=4, simulations=10, return_schedule=Diurnal(RETURNS, period=4))
+    assert cache.key(loaded, seed=0) == key
+    assert cache.load(loaded, key)
+    np.testing.assert_array_equal(loaded.bids, runner.bids)
+    np.testing.assert_array_equal(loaded.clicks, runner.clicks)
+    np.testing.assert_array_equal(loaded.simulation_clicks, runner.simulation_clicks)
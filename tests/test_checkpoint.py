@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from features.algorithms.delay import geometric_delays
+from features.algorithms.engine import StrategyRunner
+from features.algorithms.epsilon import EpsilonGreedyRunner
+from features.algorithms.policies import UCB1Strategy
+from features.algorithms.split import SplitTestRunner
+from features.algorithms.stopping import BestArmProbability, StableBestArm
+from features.algorithms.thompson import ThompsonSamplingRunner
+from features.instrumentation import Instrument
+from features.parallel import run_parallel
+
+RETURNS = [0.01, 0.012, 0.02, 0.015]
+CONFIG = dict(batch_size=1000, batches=12, simulations=40, seed=5)
+RUNNERS = {
+    'split': lambda: SplitTestRunner(RETURNS, **CONFIG),
+    'epsilon': lambda: EpsilonGreedyRunner(RETURNS, delays=geometric_delays(2, 4), stopping_rule=StableBestArm(3), **CONFIG),
+    'thompson': lambda: ThompsonSamplingRunner(RETURNS, sample_size=200, stopping_rule=BestArmProbability(0.9),
+                                               collect_statistics=True, **CONFIG),
+    'ucb1': lambda: StrategyRunner(RETURNS, UCB1Strategy(), **CONFIG),
+}
+
+
+class Interrupt(Instrument):
+    """
+    Instrument that interrupts a run, like a killed process, after a number of batches.
+    """
+
+    def __init__(self, batches: int):
+        self.batches = batches
+
+    def count(self, name: str, n: int=1):
+        if name == 'batches':
+            self.batches -= n
+            if self.batches == 0:
+                raise KeyboardInterrupt
+
+
+def assert_same_results(runner, expected):
+    np.testing.assert_array_equal(runner.bids, expected.bids)
+    np.testing.assert_array_equal(runner.clicks, expected.clicks)
+    np.testing.assert_array_equal(runner.stopping_batches, expected.stopping_batches)
+    np.testing.assert_array_equal(runner.simulation_clicks, expected.simulation_clicks)
+    assert (runner.statistics is None) == (expected.statistics is None)
+    if expected.statistics is not None:
+        for statistic in ('mean', 'variance', 0.5):
+            np.testing.assert_allclose(runner.statistics.frame('clicks', statistic), expected.statistics.frame('clicks', statistic))
+
+
+@pytest.mark.parametrize('name', RUNNERS)
+def test_resume_after_interrupt(name, tmp_path):
+    """
+    A run that is interrupted and resumed from its last checkpoint in a new
+    runner gives the same results as an uninterrupted run. The uninterrupted
+    run is checkpointed too, since split tests without checkpoints draw all
+    batches at once.
+    """
+    expected = RUNNERS[name]()
+    expected.run(checkpoint=str(tmp_path / 'expected.checkpoint'), checkpoint_every=4)
+
+    checkpoint = str(tmp_path / 'run.checkpoint')
+    interrupted = RUNNERS[name]()
+    interrupted.instrument = Interrupt(7)
+    with pytest.raises(KeyboardInterrupt):
+        interrupted.run(checkpoint=checkpoint, checkpoint_every=4)
+
+    resumed = RUNNERS[name]()
+    resumed.resume(checkpoint)
+    assert_same_results(resumed, expected)
+
+
+@pytest.mark.parametrize('name', RUNNERS)
+def test_extend_finished_run(name, tmp_path):
+    """
+    Extending a finished run from its checkpoint gives the same results as
+    running all batches at once.
+    """
+    expected = RUNNERS[name]()
+    expected.run(checkpoint=str(tmp_path / 'expected.checkpoint'))
+
+    checkpoint = str(tmp_path / 'run.checkpoint')
+    short = RUNNERS[name]()
+    short.batches = 5
+    short.bids = short.bids[:5]
+    short.clicks = short.clicks[:5]
+    short.run(checkpoint=checkpoint)
+
+    extended = RUNNERS[name]()
+    extended.resume(checkpoint, batches=CONFIG['batches'])
+    assert_same_results(extended, expected)
+
+
+def test_parallel_worker_count():
+    """
+    The results of run_parallel only depend on the seed, not on the number of workers.
+    """
+    inline = run_parallel([factory() for factory in RUNNERS.values()], workers=1, seed=9, shard_size=15)
+    pooled = run_parallel([factory() for factory in RUNNERS.values()], workers=2, seed=9, shard_size=15)
+    for runner, expected in zip(pooled, inline):
+        assert_same_results(runner, expected)
+
+
+def test_parallel_runs_cannot_be_resumed():
+    """
+    run_parallel does not leave a RunState behind, also not the one of an
+    earlier run of the runner, so resume refuses to continue it.
+    """
+    runner = RUNNERS['thompson']()
+    runner.run()
+    run_parallel([runner], workers=1, seed=9, shard_size=15)
+    assert runner.state is None
+    with pytest.raises(ValueError):
+        runner.resume(batches=20)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from features.algorithms.delay import DelayedFeedback, geometric_delays
+
+
+@pytest.mark.parametrize('delay', [0, 1, 3])
+def test_fixed_delay_releases_after_delay(delay):
+    """
+    With a fixed delay, the positive examples of a batch are released
+    exactly delay batches after they were added.
+    """
+    delays = np.zeros(delay + 1)
+    delays[delay] = 1.
+    feedback = DelayedFeedback(delays, (2, 3))
+    rng = np.random.default_rng(0)
+    batches = [rng.integers(0, 50, (2, 3)) for _ in range(8)]
+    for i, positive_examples in enumerate(batches):
+        feedback.add(positive_examples, rng)
+        expected = batches[i - delay] if i >= delay else np.zeros((2, 3))
+        np.testing.assert_array_equal(feedback.release(), expected)
+
+
+def test_released_positive_examples_follow_delays():
+    """
+    Every positive example is released once, and the share released after
+    each number of batches follows the delays.
+    """
+    delays = geometric_delays(1.5, 4)
+    feedback = DelayedFeedback(delays, (1,))
+    rng = np.random.default_rng(1)
+    feedback.add(np.array([100000]), rng)
+    released = [feedback.release()]
+    for _ in range(len(delays) - 1):
+        feedback.add(np.array([0]), rng)
+        released.append(feedback.release())
+    released = np.concatenate(released)
+    assert released.sum() == 100000
+    np.testing.assert_allclose(released / 100000, delays, atol=0.01)
+    assert not feedback.pending.any()
+
+
+def test_geometric_delays_are_a_distribution():
+    """
+    The truncated geometric delays sum to one and decrease up to the truncated tail.
+    """
+    delays = geometric_delays(2., 6)
+    assert len(delays) == 7
+    assert delays.sum() == pytest.approx(1.)
+    assert (np.diff(delays[:-1]) < 0).all()
+
+
+def test_delays_must_be_a_distribution():
+    """
+    Delays that do not sum to one are rejected.
+    """
+    with pytest.raises(ValueError):
+        DelayedFeedback([0.5, 0.2], (1,))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from features.helpers import sample_required
+
+
+def brute_force_sample_required(p1: float, p2: float, alpha: float) -> int:
+    """
+    Finds the smallest sample size passing the one sided z test by trying every n.
+    """
+    n = np.arange(1, 10 ** 6)
+    p_star = (p1 + p2) / 2
+    z = (p2 - p1) / np.sqrt(p_star * (1 - p_star) * 2. / n)
+    return int(n[np.argmax(1 - stats.norm.cdf(z) < alpha)])
+
+
+@pytest.mark.parametrize('p1, p2, alpha', [(0.01, 0.015, 0.001), (0.01, 0.012, 0.01), (0.1, 0.3, 0.05),
+                                           (0.5, 0.51, 0.01), (0.001, 0.5, 0.01)])
+def test_sample_required_matches_brute_force(p1, p2, alpha):
+    """
+    sample_required is the smallest sample size passing the test.
+    """
+    assert sample_required(p1, p2, alpha) == brute_force_sample_required(p1, p2, alpha)
+
+
+def test_sample_required_known_value():
+    """
+    Two returns of 1% and 1.5% need 9431 examples each at a level of 0.001.
+    """
+    assert sample_required(0.01, 0.015, 0.001) == 9431
+
+
+@pytest.mark.parametrize('p1, p2', [(0.02, 0.01), (0.01, 0.01)])
+def test_sample_required_needs_larger_p2(p1, p2):
+    """
+    The test is one sided, so p2 has to be greater than p1.
+    """
+    with pytest.raises(ValueError):
+        sample_required(p1, p2)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from features.algorithms.epsilon import EpsilonGreedyRunner
+from features.algorithms.outcomes import CommonOutcomes
+from features.algorithms.split import SplitTestRunner
+
+RETURNS = [0.01, 0.03, 0.2]
+
+
+def test_split_draws_give_same_outcomes():
+    """
+    Drawing 300 and then 700 examples gives the same positive examples as
+    drawing 1000 at once, and leaves the streams at the same place.
+    """
+    bandits = np.arange(len(RETURNS))
+    rng = np.random.default_rng(0)
+    split = CommonOutcomes(seed=4).start(5, len(RETURNS), RETURNS)
+    whole = CommonOutcomes(seed=4).start(5, len(RETURNS), RETURNS)
+    replicas = np.arange(5)[:, None]
+
+    positives = split.draw(rng, replicas, bandits, 300, RETURNS) + split.draw(rng, replicas, bandits, 700, RETURNS)
+    np.testing.assert_array_equal(positives, whole.draw(rng, replicas, bandits, 1000, RETURNS))
+    np.testing.assert_array_equal(split.draw(rng, replicas, bandits, 50, RETURNS),
+                                  whole.draw(rng, replicas, bandits, 50, RETURNS))
+
+
+def test_same_seed_gives_strategies_same_outcomes():
+    """
+    Two strategies that give every bandit the same examples see the same
+    positive examples per replica with CommonOutcomes of the same seed,
+    whatever the seeds of their runners, but not with independent draws.
+    """
+    config = dict(batch_size=900, batches=6, simulations=20)
+    split = SplitTestRunner(RETURNS, seed=1, outcomes=CommonOutcomes(seed=7), **config)
+    # Epsilon 1 explores the whole batch, so both strategies give every bandit 300 examples a batch.
+    epsilon = EpsilonGreedyRunner(RETURNS, epsilon=1., seed=2, outcomes=CommonOutcomes(seed=7), **config)
+    independent = SplitTestRunner(RETURNS, seed=1, **config)
+    for runner in (split, epsilon, independent):
+        runner.run()
+
+    np.testing.assert_array_equal(split.bids, epsilon.bids)
+    np.testing.assert_array_equal(split.clicks, epsilon.clicks)
+    np.testing.assert_array_equal(split.simulation_clicks, epsilon.simulation_clicks)
+    assert not np.array_equal(split.simulation_clicks, independent.simulation_clicks)
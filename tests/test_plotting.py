@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from features.plotting import decimate, lttb_indices
+
+
+@pytest.mark.parametrize('rows, n', [(1000, 50), (1000, 3), (10, 9), (101, 100)])
+def test_lttb_keeps_endpoints_and_n_rows(rows, n):
+    """
+    lttb_indices keeps n increasing rows, including the first and the last one.
+    """
+    values = np.random.default_rng(0).random((rows, 2)).cumsum(axis=0)
+    indices = lttb_indices(values, n)
+    assert len(indices) == n
+    assert indices[0] == 0 and indices[-1] == rows - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_spikes():
+    """
+    A single spike spans the largest triangle of its bucket, so it is kept.
+    """
+    values = np.zeros((500, 1))
+    values[123] = 10.
+    assert 123 in lttb_indices(values, 20)
+
+
+@pytest.mark.parametrize('n', [2, 500, 600])
+def test_lttb_keeps_all_rows_if_it_cannot_decimate(n):
+    """
+    Fewer than three rows cannot keep the endpoints and a bucket, and
+    more rows than there are need no decimation, so all rows are kept.
+    """
+    np.testing.assert_array_equal(lttb_indices(np.zeros((500, 1)), n), np.arange(500))
+
+
+def test_decimate_keeps_index():
+    """
+    Decimated DataFrames keep the index of their rows.
+    """
+    df = pd.DataFrame({'a': np.sin(np.arange(300) / 10)}, index=np.arange(300) * 2)
+    for method in ('lttb', 'stride'):
+        decimated = decimate(df, 40, method)
+        assert len(decimated) <= 40
+        pd.testing.assert_frame_equal(decimated, df.loc[decimated.index])
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from features.algorithms.engine import StrategyRunner
+from features.algorithms.policies import SoftmaxStrategy, SuccessiveEliminationStrategy, UCB1Strategy
+
+RETURNS = [0.01, 0.02, 0.05]
+STRATEGIES = {
+    'ucb1': UCB1Strategy,
+    'softmax': SoftmaxStrategy,
+    'successive_elimination': SuccessiveEliminationStrategy,
+}
+
+
+@pytest.mark.parametrize('name', STRATEGIES)
+def test_policy_favours_best_bandit(name):
+    """
+    Every policy spends each batch in full and gives the best bandit the
+    largest share of the examples.
+    """
+    runner = StrategyRunner(RETURNS, STRATEGIES[name](), batch_size=5000, batches=20, simulations=30, seed=0)
+    runner.run()
+    np.testing.assert_array_equal(runner.bids.sum(axis=1), 5000 * 30 * np.arange(1, 21))
+    assert (runner.clicks <= runner.bids).all()
+    assert runner.bids[-1].argmax() == np.argmax(RETURNS)
+    best_bandits, _ = runner.strategy.report(runner, runner.state)
+    assert (best_bandits == np.argmax(RETURNS)).mean() > 0.8
+
+
+def test_successive_elimination_drops_worse_bandits():
+    """
+    Successive elimination keeps the best bandit and drops the clearly worse ones.
+    """
+    runner = StrategyRunner(RETURNS, SuccessiveEliminationStrategy(), batch_size=5000, batches=20, simulations=30, seed=0)
+    runner.run()
+    remaining = runner.state.remaining
+    assert remaining[:, np.argmax(RETURNS)].all()
+    assert not remaining[:, 0].any()
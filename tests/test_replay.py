@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from features.replay import LogCursor, ReplayRunner, TrafficLog
+
+
+def naive_take(bandits: np.ndarray, clicks: np.ndarray, position: int, bandit: int, n: int) -> (int, int, int):
+    """
+    Serves the next n impressions of a bandit by scanning the log row by row.
+    """
+    served = 0
+    served_clicks = 0
+    while served < n and position < len(bandits):
+        if bandits[position] == bandit:
+            served += 1
+            served_clicks += int(clicks[position])
+        position += 1
+    return served, served_clicks, position
+
+
+def test_take_matches_naive_scan(tmp_path):
+    """
+    LogCursor.take serves the same impressions as scanning the log, also
+    across chunks and once a bandit's impressions run out.
+    """
+    rng = np.random.default_rng(0)
+    bandits = rng.choice(4, 5000, p=[0.5, 0.3, 0.15, 0.05])
+    clicks = rng.random(5000) < 0.3
+    TrafficLog.write(str(tmp_path), bandits, clicks)
+    cursor = LogCursor(TrafficLog(str(tmp_path), n_bandits=5, chunk_size=333))
+
+    positions = [0] * 5
+    for _ in range(300):
+        bandit = int(rng.integers(5))
+        n = int(rng.integers(0, 40))
+        served, served_clicks, positions[bandit] = naive_take(bandits, clicks, positions[bandit], bandit, n)
+        assert cursor.take(bandit, n) == (served, served_clicks)
+
+
+def test_sorted_clicks_are_kept_on_disk(tmp_path):
+    """
+    The sorted clicks are memory-mapped from the log's directory, reused by
+    later cursors and removed when a new log is written.
+    """
+    TrafficLog.write(str(tmp_path), [1, 0, 1], [1, 0, 0])
+    log = TrafficLog(str(tmp_path))
+    LogCursor(log)
+    assert isinstance(log.sorted_clicks, np.memmap)
+    np.testing.assert_array_equal(log.sorted_clicks, [0, 1, 0])
+    np.testing.assert_array_equal(log.offsets, [0, 1, 3])
+    assert LogCursor(TrafficLog(str(tmp_path))).take(1, 5) == (2, 1)
+
+    TrafficLog.write(str(tmp_path), [0, 0], [1, 1])
+    assert not os.path.exists(tmp_path / 'sorted_clicks.npy')
+    assert LogCursor(TrafficLog(str(tmp_path))).take(0, 5) == (2, 2)
+
+
+def test_replay_stops_when_log_runs_out(tmp_path):
+    """
+    A replay ends once the log runs out of impressions of a bandit the policy chose.
+    """
+    rng = np.random.default_rng(1)
+    bandits = rng.integers(0, 2, 20000)
+    TrafficLog.write(str(tmp_path), bandits, rng.random(20000) < 0.1)
+    runner = ReplayRunner(TrafficLog(str(tmp_path)), policy='epsilon', batch_size=1000, batches=30, simulations=2, seed=0)
+    runner.run()
+    assert (runner.batches_replayed < 30).all()
+    assert runner.bids[-1].sum() <= 2 * 20000
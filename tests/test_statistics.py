@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from features.algorithms.accumulators import QuantileSketch, StreamingStatistics
+from features.algorithms.thompson import ThompsonSamplingRunner
+
+
+def test_merge_matches_numpy():
+    """
+    Accumulators of shards, filled block by block and merged, give the mean
+    and sample variance of the concatenated values.
+    """
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(-3, 1, (2, 1000, 3))
+    shards = [StreamingStatistics((2, 3)) for _ in range(3)]
+    bounds = [0, 10, 11, 400, 1000]
+    for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        for row in range(2):
+            shards[i % len(shards)].add(row, values[row, start:end])
+    merged = shards[0]
+    for shard in shards[1:]:
+        merged.merge(shard)
+
+    np.testing.assert_array_equal(merged.count, 1000)
+    np.testing.assert_allclose(merged.mean(), values.mean(axis=1))
+    np.testing.assert_allclose(merged.variance(), values.var(axis=1, ddof=1))
+    np.testing.assert_array_equal(merged.minimum, values.min(axis=1))
+    np.testing.assert_array_equal(merged.maximum, values.max(axis=1))
+
+
+def test_merge_of_empty_accumulator():
+    """
+    Merging an empty accumulator keeps the values, and merging into one takes them over.
+    """
+    values = np.random.default_rng(1).random((50, 2))
+    statistics = StreamingStatistics((1, 2))
+    statistics.add(0, values)
+    statistics.merge(StreamingStatistics((1, 2)))
+    empty = StreamingStatistics((1, 2))
+    empty.merge(statistics)
+    for accumulator in (statistics, empty):
+        np.testing.assert_allclose(accumulator.mean()[0], values.mean(axis=0))
+        np.testing.assert_allclose(accumulator.variance()[0], values.var(axis=0, ddof=1))
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.05])
+@pytest.mark.parametrize('q', [0., 0.1, 0.5, 0.9, 0.99, 1.])
+def test_quantile_within_relative_accuracy(relative_accuracy, q):
+    """
+    The quantiles of the sketch are within relative_accuracy of the values
+    np.quantile picks, for values between min_value and max_value.
+    """
+    values = np.exp(np.random.default_rng(2).uniform(np.log(1e-4), 0, (5000, 4)))
+    sketch = QuantileSketch((1, 4), relative_accuracy)
+    sketch.add(0, values)
+    expected = np.quantile(values, q, axis=0, method='lower')
+    np.testing.assert_allclose(sketch.quantile(q)[0], expected, rtol=relative_accuracy)
+
+
+def test_statistics_need_vectorized_runs():
+    """
+    Statistics are only collected by vectorized runs.
+    """
+    with pytest.raises(ValueError):
+        ThompsonSamplingRunner([0.01, 0.02], vectorized=False, collect_statistics=True)
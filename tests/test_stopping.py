@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from features.algorithms.engine import StrategyRunner
+from features.algorithms.policies import UCB1Strategy
+from features.algorithms.split import SplitTestRunner
+from features.algorithms.stopping import BestArmProbability, SequentialTest
+from features.algorithms.thompson import ThompsonSamplingRunner
+
+
+def test_best_arm_probability_wrong_arm_rate():
+    """
+    The posteriors are calibrated when the returns are drawn from the priors,
+    so of the simulations that stop, at most about 1 - threshold pick the
+    wrong bandit.
+    """
+    threshold = 0.9
+    rng = np.random.default_rng(1)
+    stopped = 0
+    wrong = 0
+    for seed in range(40):
+        returns = rng.beta(20, 1980, 2)
+        runner = ThompsonSamplingRunner(list(returns), alpha_priors=[20.] * 2, beta_priors=[1980.] * 2, sample_size=500,
+                                        batches=20, simulations=25, seed=seed, stopping_rule=BestArmProbability(threshold))
+        runner.run()
+        best_bandits, _ = runner.strategy.report(runner, runner.state)
+        stops = runner.stopping_batches >= 0
+        stopped += stops.sum()
+        wrong += (best_bandits[stops] != returns.argmax()).sum()
+    assert stopped > 200
+    assert wrong / stopped < 1 - threshold + 0.03
+
+
+def test_best_arm_probability_uses_updated_posteriors():
+    """
+    A simulation stops on the win probabilities of its posteriors after the
+    batch, not on the ones the batch was allocated with.
+    """
+    runner = ThompsonSamplingRunner([0.012, 0.0125], sample_size=2000, batches=5, simulations=50, seed=0,
+                                    stopping_rule=BestArmProbability(0.9))
+    runner.run()
+    alpha, beta = runner.state.alpha, runner.state.beta
+    samples = np.random.default_rng(0).beta(alpha[:, :, None], beta[:, :, None], alpha.shape + (20000,))
+    probabilities = np.mean(samples.argmax(axis=1) == 1, axis=1)
+    np.testing.assert_allclose(runner.state.probabilities[:, 1], probabilities, atol=0.05)
+
+
+def test_sequential_test_with_single_bandit():
+    """
+    A run with a single bandit has nothing to compare, so it never stops.
+    """
+    runner = SplitTestRunner([0.02], batch_size=1000, batches=5, simulations=10, seed=0, stopping_rule=SequentialTest())
+    runner.run()
+    assert (runner.stopping_batches == -1).all()
+
+
+def test_sequential_test_level_follows_extended_batches(tmp_path):
+    """
+    The level of the test is spread over the batches of the continued run
+    when a run is extended from its checkpoint.
+    """
+    checkpoint = str(tmp_path / 'run.checkpoint')
+    runner = SplitTestRunner([0.01, 0.012, 0.014], batch_size=1000, batches=4, simulations=10, seed=0,
+                             stopping_rule=SequentialTest(0.01))
+    runner.run(checkpoint=checkpoint)
+    assert runner.stopping_rule.level == pytest.approx(0.01 / (2 * 4))
+
+    extended = SplitTestRunner([0.01, 0.012, 0.014], batch_size=1000, batches=4, simulations=10, seed=0,
+                               stopping_rule=SequentialTest(0.01))
+    extended.resume(checkpoint, batches=10)
+    assert extended.stopping_rule.level == pytest.approx(0.01 / (2 * 10))
+
+
+def test_best_arm_probability_needs_win_probabilities():
+    """
+    Strategies that do not report win probabilities cannot be stopped by BestArmProbability.
+    """
+    runner = StrategyRunner([0.01, 0.02], UCB1Strategy(), batches=3, simulations=5, seed=0,
+                            stopping_rule=BestArmProbability(0.9))
+    with pytest.raises(ValueError):
+        runner.run()
@@ -0,0 +1,26 @@
+from features import sweep
+from features.sweep import grid_search, make_configuration, run_sweep
+
+
+def test_sweep_drops_duplicates_and_shares_runs(monkeypatch):
+    """
+    Duplicate configurations give one row per strategy, and configurations
+    that only differ in parameters a strategy does not use share its run.
+    """
+    built = list()
+    original = sweep.make_runner
+
+    def make_runner(strategy, configuration, batches, simulations):
+        built.append(strategy)
+        return original(strategy, configuration, batches, simulations)
+
+    monkeypatch.setattr(sweep, 'make_runner', make_runner)
+    configurations = grid_search([[0.01, 0.02], (0.01, 0.02)], epsilon=(0.1, 0.2), batch_size=(1000,))
+    configurations.append(make_configuration([0.01, 0.02], epsilon=0.1, batch_size=1000))
+    assert len(configurations) == 5
+
+    results = run_sweep(configurations, batches=3, simulations=4, workers=1, seed=0)
+    assert len(results) == 2 * 3
+    assert sorted(built) == ['epsilon', 'epsilon', 'split', 'thompson']
+    split = results[results['strategy'] == 'split']
+    assert split['clicks'].nunique() == 1
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from features.algorithms.bandits import (BetaBandit, DiscountedBetaBandit, DiscountedEpsilonBandit,
+                                         SlidingWindowBetaBandit, SlidingWindowEpsilonBandit)
+from features.algorithms.epsilon import EpsilonGreedyRunner
+from features.algorithms.schedules import Forgetting
+from features.algorithms.thompson import ThompsonSamplingRunner
+
+RETURNS = [0.01, 0.012, 0.02]
+
+
+def test_posteriors_are_priors_plus_totals():
+    """
+    Without forgetting, the posteriors are built from the examples of every
+    batch once, so they equal the priors plus the total examples.
+    """
+    runner = ThompsonSamplingRunner(RETURNS, alpha_priors=[2.] * 3, beta_priors=[50.] * 3, sample_size=200,
+                                    batches=6, simulations=10, seed=3)
+    runner.run()
+    state = runner.state
+    np.testing.assert_array_equal(state.alpha, 2. + state.positive_examples)
+    np.testing.assert_array_equal(state.beta, 50. + state.total_examples - state.positive_examples)
+
+
+def test_sequential_posteriors_are_priors_plus_totals():
+    """
+    The bandits of a sequential run are built from the examples of every batch once too.
+    """
+    runner = ThompsonSamplingRunner(RETURNS, sample_size=200, batches=6, simulations=1, seed=3, vectorized=False)
+    runner.run()
+    arms = runner.test.arms
+    np.testing.assert_array_equal(arms['alpha'], 1. + np.asarray(runner.bandit_positive_examples))
+    np.testing.assert_array_equal(arms['beta'], 1. + np.asarray(runner.bandit_total_examples)
+                                  - np.asarray(runner.bandit_positive_examples))
+
+
+def test_slow_discount_is_close_to_no_forgetting():
+    """
+    A discount close to 1 gives nearly the posteriors of a run without forgetting.
+    """
+    runners = [ThompsonSamplingRunner(RETURNS, sample_size=200, batches=6, simulations=10, seed=3, discount=discount)
+               for discount in (1., 0.999999)]
+    for runner in runners:
+        runner.run()
+    np.testing.assert_allclose(runners[1].state.alpha, runners[0].state.alpha, rtol=1e-4)
+    np.testing.assert_allclose(runners[1].state.beta, runners[0].state.beta, rtol=1e-4)
+
+
+@pytest.mark.parametrize('discount, window', [(0.9, None), (1., 3), (0.9, 3)])
+def test_forgetting_bandits_match_forgetting(discount, window):
+    """
+    The discounted and sliding-window bandits forget like Forgetting does.
+    """
+    rng = np.random.default_rng(0)
+    forgetting = Forgetting(discount, window, alpha=(), beta=(), positive_examples=())
+    forgetting.evidence['alpha'] += 4
+    forgetting.evidence['beta'] += 7
+    forgetting.evidence['positive_examples'] += 4
+    if discount == 1:
+        beta_bandit = SlidingWindowBetaBandit(4, 7, window=window)
+        epsilon_bandit = SlidingWindowEpsilonBandit(4, window=window)
+    else:
+        beta_bandit = DiscountedBetaBandit(4, 7, discount=discount, window=window)
+        epsilon_bandit = DiscountedEpsilonBandit(4, discount=discount, window=window)
+    for _ in range(10):
+        positives, negatives = rng.integers(0, 20, 2)
+        beta_bandit.update(positives, negatives)
+        epsilon_bandit.update(positives)
+        evidence = forgetting.step(alpha=positives, beta=negatives, positive_examples=positives)
+        assert beta_bandit.alpha == pytest.approx(1. + evidence['alpha'])
+        assert beta_bandit.beta == pytest.approx(1. + evidence['beta'])
+        assert epsilon_bandit.get_value() == pytest.approx(evidence['positive_examples'])
+
+
+@pytest.mark.parametrize('runner_class', [ThompsonSamplingRunner, EpsilonGreedyRunner])
+def test_sequential_runs_forget(runner_class):
+    """
+    Sequential runs honour the window: the bandits only hold the examples of
+    the last window batches. EpsilonGreedy explores all of them with epsilon 1.
+    """
+    epsilon = {'epsilon': 1.} if runner_class is EpsilonGreedyRunner else {}
+    runner = runner_class(RETURNS, batch_size=9000, batches=8, simulations=1, seed=2, vectorized=False, window=2,
+                          **epsilon)
+    runner.run()
+    recent_positives = runner.clicks[-1] - runner.clicks[-3]
+    if runner_class is ThompsonSamplingRunner:
+        np.testing.assert_array_equal(runner.test.arms['alpha'], 1. + recent_positives)
+    else:
+        np.testing.assert_array_equal(runner.test.arms['positive_examples'], recent_positives)
+
+
+def test_beta_bandit_samples_without_rng():
+    """
+    BetaBandit.sample falls back to a new generator when no rng is passed.
+    """
+    samples = BetaBandit(3, 5).sample(100)
+    assert samples.shape == (100,)
+    assert ((samples > 0) & (samples < 1)).all()